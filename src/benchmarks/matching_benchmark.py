@@ -0,0 +1,228 @@
+# Labeled benchmark for the company-name matcher: precision/recall at the thresholds the
+# pipeline uses and throughput (pairs/second), on the versioned dataset in benchmarks/data.
+#
+#   python benchmarks/matching_benchmark.py                  # run and compare with the saved baseline
+#   python benchmarks/matching_benchmark.py --save-baseline  # record the current results as the baseline
+#
+# Exits with status 1 when precision or recall drops below the baseline.
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import argparse
+import json
+import os
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DATASET_VERSION = 1
+THRESHOLDS = (100, 90)  # 100: exact/unique match (ticker update); 90: fuzzy candidates worth a review
+SINGLE_TOKEN_THRESHOLD = 3  # Same value as ticker.match_company_names
+TOLERANCE = 1e-9
+
+
+def load_dataset(version=DATASET_VERSION):
+    with open(os.path.join(DATA_DIR, f"matching_labels_v{version}.json"), "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _precision_recall(predictions, expected, threshold):
+    """predictions: [(predicted id or None, confidence)], expected: [id or None]."""
+    tp = fp = 0
+    for (predicted, confidence), truth in zip(predictions, expected):
+        if predicted is None or confidence < threshold:
+            continue
+        if predicted == truth:
+            tp += 1
+        else:
+            fp += 1
+    positives = sum(1 for truth in expected if truth is not None)
+    return {
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 1.0,
+        "recall": round(tp / positives, 4) if positives else 1.0,
+        "true_positives": tp,
+        "false_positives": fp,
+    }
+
+
+def _clear_caches():
+    # Throughput is measured cold: names are normalized again on every run
+    from utils.string_matching_utils import normalize_name
+    normalize_name.cache_clear()
+
+
+def bench_label_and_confidence(dataset, repeat=3):
+    """get_label_and_confidence on the labeled listing/queue pairs, and on every ticker x company pair for throughput."""
+    from utils.string_matching_utils import get_label_and_confidence
+    from ticker import get_count_dict
+
+    pairs = dataset["listing_pairs"]
+    _, count_dict = get_count_dict([p["queue_name"] for p in pairs])
+    predictions, expected = [], []
+    for p in pairs:
+        _, confidence = get_label_and_confidence(p["listing_name"], p["queue_name"], count_dict, SINGLE_TOKEN_THRESHOLD)
+        predictions.append((True, confidence))
+        expected.append(True if p["same_company"] else None)
+    accuracy = {str(t): _precision_recall(predictions, expected, t) for t in THRESHOLDS}
+
+    tickers = [t["ticker_name"] for t in dataset["tickers"]]
+    companies = [c["name"] for c in dataset["companies"]]
+    _, count_dict = get_count_dict(companies)
+    best = float("inf")
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        for ticker_name in tickers:
+            for company_name in companies:
+                get_label_and_confidence(ticker_name, company_name, count_dict, SINGLE_TOKEN_THRESHOLD)
+        best = min(best, time.perf_counter() - start)
+    return {"accuracy": accuracy, "pairs": len(tickers) * len(companies),
+            "pairs_per_second": round(len(tickers) * len(companies) / best)}
+
+
+def bench_ticker_matching(dataset, method, assignment, repeat=3):
+    """ticker.match_company_names against the labeled expected company of every ticker."""
+    from ticker import match_company_names
+
+    tickers = [(t["ticker_code"], t["ticker_name"]) for t in dataset["tickers"]]
+    expected = [t["expected_company_id"] for t in dataset["tickers"]]
+    best, results = float("inf"), None
+    for _ in range(repeat):
+        _clear_caches()
+        companies = [dict(c) for c in dataset["companies"]]
+        start = time.perf_counter()
+        results = match_company_names(tickers, companies, method=method, assignment=assignment)
+        best = min(best, time.perf_counter() - start)
+    predictions = [(r["matched_id"], r["confidence"]) for r in results]
+    pairs = len(tickers) * len(dataset["companies"])
+    return {
+        "accuracy": {str(t): _precision_recall(predictions, expected, t) for t in THRESHOLDS},
+        "pairs": pairs,
+        "pairs_per_second": round(pairs / best),
+        "errors": [{"ticker": r["original_name"], "matched": r["matched_name"], "confidence": r["confidence"],
+                    "expected": truth} for r, truth in zip(results, expected) if r["matched_id"] != truth],
+    }
+
+
+def _listing_queue_match(listings, queue_names, count_dict):
+    # Matching loop of populate_collections.match_company_names (exact name first, then the best
+    # fuzzy candidate, each queue name used once); that function is currently commented out
+    from utils.string_matching_utils import get_label_and_confidence
+
+    candidates = list(queue_names)
+    results = {}
+    for name in listings:
+        if name in candidates:
+            results[name] = (name, 101)
+            candidates.remove(name)
+    for name in listings:
+        if name in results:
+            continue
+        best_source, best_confidence = None, 0
+        for candidate in candidates:
+            _, confidence = get_label_and_confidence(name, candidate, count_dict, SINGLE_TOKEN_THRESHOLD)
+            if confidence == 100 or confidence > best_confidence:
+                best_source, best_confidence = candidate, confidence
+        results[name] = (best_source, best_confidence)
+        if best_source in candidates:
+            candidates.remove(best_source)
+    return results
+
+
+def bench_listing_matching(dataset, repeat=3):
+    """Listing -> queue name matching, as populate_collections does it, on the labeled pairs."""
+    from ticker import get_count_dict
+
+    pairs = dataset["listing_pairs"]
+    listings = list(dict.fromkeys(p["listing_name"] for p in pairs))
+    queue_names = list(dict.fromkeys(p["queue_name"] for p in pairs))
+    truth = {p["listing_name"]: p["queue_name"] for p in pairs if p["same_company"]}
+    _, count_dict = get_count_dict(queue_names)
+    best, results = float("inf"), None
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        results = _listing_queue_match(listings, queue_names, count_dict)
+        best = min(best, time.perf_counter() - start)
+    predictions = [results[name] for name in listings]
+    expected = [truth.get(name) for name in listings]
+    pairs = len(listings) * len(queue_names)
+    return {"accuracy": {str(t): _precision_recall(predictions, expected, t) for t in THRESHOLDS},
+            "pairs": pairs, "pairs_per_second": round(pairs / best)}
+
+
+def run_benchmarks(dataset, repeat=3):
+    results = {
+        "dataset_version": dataset["version"],
+        "get_label_and_confidence": bench_label_and_confidence(dataset, repeat),
+        "populate_collections.match_company_names": bench_listing_matching(dataset, repeat),
+    }
+    for method in ("batch", "index", "scan"):
+        results[f"ticker.match_company_names[{method}]"] = bench_ticker_matching(dataset, method, "greedy", repeat)
+    results["ticker.match_company_names[optimal]"] = bench_ticker_matching(dataset, "batch", "optimal", repeat)
+    return results
+
+
+def compare_with_baseline(results, baseline):
+    """Precision/recall regressions against the baseline, as readable lines."""
+    regressions = []
+    if baseline.get("dataset_version") != results["dataset_version"]:
+        print(f"Baseline is for dataset v{baseline.get('dataset_version')}, not v{results['dataset_version']}: not compared.")
+        return regressions
+    for name, result in results.items():
+        if not isinstance(result, dict) or name not in baseline:
+            continue
+        for threshold, metrics in result["accuracy"].items():
+            before = baseline[name]["accuracy"].get(threshold, {})
+            for metric in ("precision", "recall"):
+                if metric in before and metrics[metric] + TOLERANCE < before[metric]:
+                    regressions.append(f"{name} @{threshold}: {metric} {before[metric]} -> {metrics[metric]}")
+    return regressions
+
+
+def print_report(results, baseline=None):
+    print(f"\nMatching benchmark (dataset v{results['dataset_version']})")
+    print(f"{'matcher':<42} {'thr':>4} {'precision':>9} {'recall':>7} {'pairs/s':>10} {'vs baseline':>12}")
+    for name, result in results.items():
+        if not isinstance(result, dict):
+            continue
+        speed = result["pairs_per_second"]
+        ratio = ""
+        if baseline and name in baseline and baseline[name].get("pairs_per_second"):
+            ratio = f"x{speed / baseline[name]['pairs_per_second']:.2f}"
+        for threshold, metrics in result["accuracy"].items():
+            print(f"{name:<42} {threshold:>4} {metrics['precision']:>9.3f} {metrics['recall']:>7.3f} {speed:>10} {ratio:>12}")
+        for error in result.get("errors", [])[:10]:
+            print(f"    miss: {error['ticker']!r} -> {error['matched']!r} ({error['confidence']}), expected {error['expected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precision/recall and throughput of the company-name matchers.")
+    parser.add_argument("--dataset-version", type=int, default=DATASET_VERSION)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per matcher (the fastest is kept)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(load_dataset(args.dataset_version), repeat=args.repeat)
+    baseline_path = os.path.join(DATA_DIR, f"matching_baseline_v{args.dataset_version}.json")
+    baseline = None
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, ensure_ascii=False, default=str)
+        print(f"Baseline saved to {baseline_path}")
+    elif baseline is not None:
+        regressions = compare_with_baseline(results, baseline)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No accuracy regression against the baseline.")
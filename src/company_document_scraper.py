@@ -115,6 +115,9 @@ def process_company_files(company_name: str, company_id: str):
                         # Important: update the progress bar for every completed future
                         pbar.update(1)
 
+        from utils.parse_pool import format_parse_stats
+        tqdm.write(format_parse_stats())
+
         # Store metadata in the database (if any)
         if all_metadata:
             try:
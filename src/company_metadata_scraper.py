@@ -1,10 +1,10 @@
 def run_company_metadata_pipeline():
     
 
-    from utils.db_utils import get_companies_without_metadata, update_company_metadata
-    pending_companies = get_companies_without_metadata()
+    from utils.db_utils import get_companies_without_metadata, count_companies_without_metadata, update_company_metadata
+    n_pending = count_companies_without_metadata()
 
-    if not pending_companies:
+    if n_pending == 0:
         print("No pending companies to process for metadata.")
         return
 
@@ -44,7 +44,8 @@ def run_company_metadata_pipeline():
     workers = MAX_WORKERS if isinstance(MAX_WORKERS, int) and MAX_WORKERS > 0 else 4
     futures = []
     with ThreadPoolExecutor(max_workers=workers) as executor:
-        for company in pending_companies:
+        # Companies are streamed from the queue cursor: workers start on the first one immediately
+        for company in get_companies_without_metadata():
             futures.append(executor.submit(_process_company, company))
 
         for fut in tqdm(as_completed(futures), total=len(futures), desc="Companies (metadata)"):
@@ -55,9 +56,17 @@ def run_company_metadata_pipeline():
                 processed_error += 1
                 error_companies.append((cid, cname, msg))
 
+    from utils.parse_pool import format_parse_stats
+    print(format_parse_stats())
+
+    # Barrier: metadata/name updates must be visible before the next stage reads the queue
+    from utils.db_utils import flush_company_updates
+    if not flush_company_updates():
+        print("Some metadata/name updates could not be written: rerun the metadata stage.")
+
     # Summary
     print("\nMetadata processing summary:")
-    print(f"  Total companies considered: {len(pending_companies)}")
+    print(f"  Total companies considered: {len(futures)}")
     print(f"  Successfully processed:    {processed_ok}")
     print(f"  Errors:                    {processed_error}")
     if error_companies:
@@ -65,6 +74,12 @@ def run_company_metadata_pipeline():
         for cid, cname, cerr in error_companies:
             print(f"    - {cid} | {cname} | {cerr}")
 
+def company_page_path(company_id) -> str:
+    """Raw storage path of the corporate information page of a company."""
+    import os
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    return os.path.join(RAW_DATA_DIR, PLATFORM, COMPANY_PAGES_FOLDER, f"{company_id}.html")
+
 def get_company_metadata(company_id=None) -> dict:
     from utils.scraping_utils import get_web_page
     
@@ -74,17 +89,285 @@ def get_company_metadata(company_id=None) -> dict:
     html_content = get_web_page(url)
     if (not html_content) or (len(html_content.strip()) == 0):
         raise ValueError(f"Failed to retrieve corporate information page for company ID {company_id}")
+    # Keep the raw page so metadata can be re-parsed offline (see reparse.py)
+    from config.settings import STORE_COMPANY_PAGES
+    if STORE_COMPANY_PAGES:
+        from utils.scraping_utils import store_web_page
+        store_web_page(html_content, company_page_path(company_id))
     # Implements the logic to extract metadata from html_content
     try:
-        metadata = parse_company_metadata(html_content)
+        # Parsing runs in the CPU pool so the metadata threads go back to fetching
+        from utils import parse_pool
+        metadata = parse_pool.parse_company_metadata(html_content)
         if ( not metadata) or (len(metadata) == 0):
             raise ValueError(f"No metadata extracted for company ID {company_id}")
         return metadata
     except Exception as e:
         raise e
 
+# Raw corporate information pages are stored under RAW_DATA_DIR/PLATFORM/COMPANY_PAGES_FOLDER
+COMPANY_PAGES_FOLDER = "_corporate_information"
+
+# Declarative field table for corporate information pages:
+#   (field, element ids in priority order, <dt> label fallback, combine mode)
+# combine modes:
+#   "first" -> text of the first id with text, else the <dd> items after the label joined by spaces
+#   "join"  -> texts of all ids with text joined by spaces, else the joined <dd> items
+#   "lines" -> texts of all ids with text as a list, else the <dd> items as a list
+COMPANY_METADATA_FIELDS = (
+    ("full_company_name", ("ctl07_compFullNameLabel", "ctl07_lblCompName", "ctl07_lblIPOCompanyName"), None, "first"),
+    ("incorporated_in", ("ctl07_incorporatedLabel",), "Incorporated in", "first"),
+    ("incorporated_on", ("ctl07_incorpOnLabel",), "Incorporated on", "first"),
+    ("isin_code", ("ctl07_isinCodeLabel",), "ISIN", "first"),
+    ("registered_office", tuple(f"ctl07_regOffc{i}Label" for i in range(1, 5)), "Registered Office", "lines"),
+    ("telephone", ("ctl07_teleLabel",), "Telephone", "first"),
+    ("fax", ("ctl07_faxLabel",), "Fax", "first"),
+    ("email", ("ctl07_emailLabel",), "Email", "first"),
+    ("secretary", ("ctl07_secretary1Label", "ctl07_secretary2Label"), "Secretary", "join"),
+)
+WEBSITE_LINK_ID = "ctl07_compWebHypLink"
+LAST_UPDATE_IDS = ("ctl07_lblLastUpdatedOn", "ctl07_lblModifyOn")
+LAST_UPDATE_FORMATS = ("%m/%d/%Y %I:%M:%S %p", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S")
+BACKGROUND_ID = "litIPOCompany"
+
+# Elements the index needs (everything else on the page is navigation, scripts and footer)
+_COMPANY_PAGE_IDS = frozenset(
+    [elem_id for _, ids, _, _ in COMPANY_METADATA_FIELDS for elem_id in ids]
+    + [WEBSITE_LINK_ID, BACKGROUND_ID, *LAST_UPDATE_IDS]
+)
+_company_page_strainer = None
+
+
+def _get_company_page_strainer():
+    """Filter keeping only the subtrees `_CompanyPageIndex` reads (built on first use: bs4 is imported lazily)."""
+    global _company_page_strainer
+    if _company_page_strainer is None:
+        import re
+        from bs4.filter import ElementFilter
+        abs_link = re.compile(r"^https?://", re.I)
+
+        class _CompanyPageStrainer(ElementFilter):
+            # Only consulted outside the elements already kept: a kept element keeps its whole subtree
+            def allow_tag_creation(self, nsprefix, name, attrs):
+                if name in ("dl", "dt", "dd") or attrs.get("id") in _COMPANY_PAGE_IDS:
+                    return True
+                if name == "a" and abs_link.search(attrs.get("href") or ""):
+                    return True
+                classes = attrs.get("class")
+                if isinstance(classes, str):
+                    classes = classes.split()
+                return bool(classes) and "announcement-group" in classes
+
+            def allow_string_creation(self, string):
+                return False
+
+        _company_page_strainer = _CompanyPageStrainer()
+    return _company_page_strainer
+
+
+class _CompanyPageIndex:
+    """Elements of a corporate information page indexed in a single traversal."""
+
+    def __init__(self, soup):
+        import re
+        abs_link = re.compile(r"^https?://", re.I)
+
+        self.n_tags = 0
+        self.by_id = {}           # id -> first element with that id (document order)
+        self.first_a_by_id = {}   # id -> first <a> with that id
+        self.dts = []             # (lowercased text, <dt>) in document order
+        self.first_abs_link = None
+        self.groups = []          # elements with class "announcement-group"
+
+        for tag in soup.find_all(True):
+            self.n_tags += 1
+            name = tag.name
+            attrs = tag.attrs
+            elem_id = attrs.get("id")
+            if elem_id is not None:
+                self.by_id.setdefault(elem_id, tag)
+                if name == "a":
+                    self.first_a_by_id.setdefault(elem_id, tag)
+            if name == "dt":
+                self.dts.append((tag.get_text().lower(), tag))
+            elif name == "a" and self.first_abs_link is None:
+                href = attrs.get("href")
+                if href and abs_link.search(href):
+                    self.first_abs_link = tag
+            classes = attrs.get("class")
+            if classes and "announcement-group" in classes:
+                self.groups.append(tag)
+
+    def text_by_id(self, elem_id: str):
+        el = self.by_id.get(elem_id)
+        return el.get_text(strip=True) if el else None
+
+    def dd_list_after_label(self, label_text: str):
+        label_text = label_text.lower()
+        for text, dt in self.dts:
+            if label_text in text:
+                dd = dt.find_next_sibling("dd")
+                if not dd:
+                    return None
+                items = [s.strip() for s in dd.stripped_strings if s.strip()]
+                return items if items else None
+        return None
+
+
+def _resolve_field(index: _CompanyPageIndex, ids, label, mode):
+    if mode == "first":
+        for elem_id in ids:
+            value = index.text_by_id(elem_id)
+            if value:
+                return value
+        items = index.dd_list_after_label(label) if label else None
+        return " ".join(items) if items else None
+
+    values = [v for v in (index.text_by_id(elem_id) for elem_id in ids) if v]
+    if mode == "lines":
+        if not values and label:
+            values = index.dd_list_after_label(label) or []
+        return values or None
+    # "join"
+    if values:
+        return " ".join(values)
+    items = index.dd_list_after_label(label) if label else None
+    return " ".join(items) if items else None
+
+
 def parse_company_metadata(html_content: str) -> dict:
     """
+    Extract the fields of COMPANY_METADATA_FIELDS (plus website, date_of_last_update and
+    background) from an SGX company page. Only the elements the fields come from are built
+    into a tree (the known ids, <dl>/<dt>/<dd>, absolute links, announcement groups); they are
+    visited once to build an id / <dt> label index, and all fields are then resolved from that
+    index with the same fallback order as `_parse_company_metadata_legacy`. Pages without a
+    last-update id (the label text search, empty pages) are parsed in full as before.
+    """
+    from bs4 import BeautifulSoup
+    from datetime import datetime
+    import re
+    from utils.html_parsing_utils import resolve_html_parser
+
+    parser = resolve_html_parser()
+    soup = BeautifulSoup(html_content or "", parser, parse_only=_get_company_page_strainer())
+    index = _CompanyPageIndex(soup)
+
+    # Date of last update: prefer explicit ID, otherwise try to locate the text near the label
+    last_update_text = None
+    for elem_id in LAST_UPDATE_IDS:
+        last_update_text = index.text_by_id(elem_id)
+        if last_update_text:
+            break
+
+    if not last_update_text:
+        # Rare path: full tree, then look for the label text and a nearby span containing the date
+        soup = BeautifulSoup(html_content or "", parser)
+        index = _CompanyPageIndex(soup)
+        if index.n_tags == 0:
+            raise ValueError("Empty or invalid HTML content")
+        label_node = soup.find(string=re.compile(r"Information last updated on", re.I))
+        if label_node:
+            parent = label_node.find_parent()
+            if parent:
+                span = parent.find("span", id=re.compile(r"ctl07_lblLastUpdatedOn", re.I))
+                if span:
+                    last_update_text = span.get_text(strip=True)
+
+    metadata = {
+        field: _resolve_field(index, ids, label, mode)
+        for field, ids, label, mode in COMPANY_METADATA_FIELDS
+    }
+
+    # Website: prefer explicit link ID, otherwise take the first absolute link found
+    website = None
+    link = index.first_a_by_id.get(WEBSITE_LINK_ID)
+    if link and link.get("href"):
+        website = link.get("href").strip()
+    elif index.first_abs_link is not None:
+        website = index.first_abs_link.get("href").strip()
+
+    # Kept from the original parser: pages without a last-update date yield no metadata
+    if not last_update_text:
+        return None
+
+    last_update_date = None
+    for fmt in LAST_UPDATE_FORMATS:
+        try:
+            last_update_date = datetime.strptime(last_update_text, fmt)
+            break
+        except Exception:
+            continue
+    if last_update_date is None:
+        # fallback: keep raw text if it cannot be parsed
+        last_update_date = last_update_text.strip()
+
+    # Background: known id first, then an "announcement-group" whose header says Background
+    background = None
+    el = index.by_id.get(BACKGROUND_ID)
+    if el:
+        try:
+            background = el.get_text(strip=True)
+        except Exception:
+            background = None
+    else:
+        for grp in index.groups:
+            hdr = grp.find(class_="announcement-group-header")
+            if hdr and "background" in hdr.get_text(strip=True).lower():
+                candidate = grp.find(class_="announcement-richtext") or grp.find("dd")
+                if candidate:
+                    try:
+                        background = candidate.get_text(strip=True)
+                    except Exception:
+                        background = None
+                break
+
+    metadata["website"] = website
+    metadata["date_of_last_update"] = last_update_date
+    metadata["background"] = background
+    return metadata
+
+
+def benchmark_company_metadata_parser(html_dir: str, repeat: int = 1) -> dict:
+    """Time `parse_company_metadata` against the legacy parser over stored company pages.
+
+    Every page stored under `html_dir` (plain, compressed or packed, locally or on S3) is
+    parsed by both implementations; results must be identical.
+    Returns {pages, mismatches, fast_seconds, legacy_seconds, speedup}.
+    """
+    import time
+    from utils.page_compression import iter_pages, read_page
+    pages = [(path, read_page(path)) for path in iter_pages(html_dir)]
+
+    def _run(parser):
+        results = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = []
+            for _, html in pages:
+                try:
+                    results.append(parser(html))
+                except Exception as e:
+                    results.append(repr(e))
+        return results, time.perf_counter() - start
+
+    fast_results, fast_seconds = _run(parse_company_metadata)
+    legacy_results, legacy_seconds = _run(_parse_company_metadata_legacy)
+    mismatches = [path for (path, _), a, b in zip(pages, fast_results, legacy_results) if a != b]
+    for path in mismatches:
+        print(f"Metadata parser mismatch: {path}")
+
+    speedup = (legacy_seconds / fast_seconds) if fast_seconds else None
+    print(f"Company metadata parser: {len(pages)} pages x{repeat}, {len(mismatches)} mismatches, "
+          f"single-pass {fast_seconds:.3f}s vs legacy {legacy_seconds:.3f}s"
+          + (f" ({speedup:.1f}x)" if speedup else ""))
+    return {"pages": len(pages), "mismatches": mismatches, "fast_seconds": fast_seconds,
+            "legacy_seconds": legacy_seconds, "speedup": speedup}
+
+
+def _parse_company_metadata_legacy(html_content: str) -> dict:
+    """
+    Reference implementation kept for parity checks and benchmarks.
     Extract the required fields from an SGX company page in a simple, readable way.
     Extracted fields:
       - full_company_name, incorporated_in, incorporated_on, isin_code,
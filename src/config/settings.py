@@ -45,6 +45,7 @@ MAX_FILES_PER_COMPANY = int(os.getenv("MAX_FILES_PER_COMPANY", "20"))  # Max fil
 COMPANY_MAX_PAGES = int(os.getenv("COMPANY_MAX_PAGES", "0"))  # 0 means no limit
 COMPANY_PAGE_SIZE = int(os.getenv("COMPANY_PAGE_SIZE", "10"))
 MAX_COMPANIES = int(os.getenv("MAX_COMPANIES", "0"))  # 0 means no limit
+DELIST_MAX_FRACTION = float(os.getenv("DELIST_MAX_FRACTION", "0.2"))  # Safety cap on the share of queued companies delisted in one sync
 
 
 
@@ -63,7 +64,43 @@ MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
 BACKOFF_FACTOR = int(os.getenv("BACKOFF_FACTOR", "2"))
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10"))  # Timeout for HTTP requests in seconds
 
+# HTML parsing: "auto" uses lxml when installed, otherwise "html.parser"
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
 
+# CPU pool for HTML parsing (0 parses inline in the network threads)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+PARSE_POOL_START_METHOD = os.getenv("PARSE_POOL_START_METHOD", "spawn")  # "spawn" is safe with running threads
+
+# Offline reparse
+STORE_COMPANY_PAGES = str(os.getenv("STORE_COMPANY_PAGES", "true")).lower() in ("1", "true", "yes")  # Keep raw corporate information pages
+REPARSE_WORKERS = int(os.getenv("REPARSE_WORKERS", "0"))  # Processes for reparse.py; 0 means one per CPU core
+
+# Write-behind channel for queue status / company metadata updates
+WRITE_BEHIND_ENABLED = str(os.getenv("WRITE_BEHIND_ENABLED", "true")).lower() in ("1", "true", "yes")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))  # Flush when this many companies are pending
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2"))  # Max seconds an update waits before flush
+
+# Company retry scheduling
+COMPANY_MAX_ATTEMPTS = int(os.getenv("COMPANY_MAX_ATTEMPTS", "5"))  # Failures before a company is dead-lettered
+COMPANY_RETRY_BASE_DELAY = int(os.getenv("COMPANY_RETRY_BASE_DELAY", "3600"))  # Seconds before the first retry (doubles each failure)
+COMPANY_RETRY_MAX_DELAY = int(os.getenv("COMPANY_RETRY_MAX_DELAY", str(7 * 24 * 3600)))  # Max seconds between retries
+
+# Queue readers (server-side cursors)
+QUEUE_READ_BATCH_SIZE = int(os.getenv("QUEUE_READ_BATCH_SIZE", "100"))  # Documents fetched per cursor round trip
+QUEUE_READ_SORT = os.getenv("QUEUE_READ_SORT", "company_id")  # e.g. "company_id", "-updated_at"; empty for natural order
+
+
+# Ticker / company name matching: "batch" (cdist over all cores), "index" (n-gram blocking) or "scan" (pairwise)
+MATCHING_METHOD = os.getenv("MATCHING_METHOD", "batch")
+MATCHING_WORKERS = int(os.getenv("MATCHING_WORKERS", "-1"))  # Scoring threads for "batch"; -1 uses all cores
+# "greedy" (best company per ticker) or "optimal" (1:1: a company contested by several tickers goes to the
+# strongest match, the others are left unmatched and flagged "displaced" instead of taking a worse company)
+TICKER_ASSIGNMENT = os.getenv("TICKER_ASSIGNMENT", "greedy")
+ASSIGNMENT_CANDIDATES = int(os.getenv("ASSIGNMENT_CANDIDATES", "5"))  # Candidate companies kept per ticker for "optimal"
+ASSIGNMENT_MIN_CONFIDENCE = float(os.getenv("ASSIGNMENT_MIN_CONFIDENCE", "50"))  # Pairs at or below this are not candidates
+ASSIGNMENT_EXACT_MAX = int(os.getenv("ASSIGNMENT_EXACT_MAX", "2000"))  # Larger conflict groups are assigned greedily
+STRING_MATCHING_TOKENIZER = os.getenv("STRING_MATCHING_TOKENIZER", "regex")  # "regex" (offline) or "nltk" (word_tokenize)
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "65536"))  # Normalized company/ticker names kept in memory
 
 PROD_MODE = os.getenv("PROD_MODE")  # UAT or PROD
 
@@ -72,17 +109,39 @@ S3_ENABLED = str(os.getenv("S3_ENABLED", "false")).lower() in ("1", "true", "yes
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 S3_BASE_PATH = os.getenv("S3_BASE_PATH")
 S3_REGION = os.getenv("S3_REGION")
-STORAGE_MODE = os.getenv("STORAGE_MODE", "local")
-CLEANUP_LOCAL_FILES = str(os.getenv("CLEANUP_LOCAL_FILES", "false")).lower() in ("1", "true", "yes")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # S3-compatible server (e.g. MinIO: http://localhost:9000); empty for AWS
+S3_MULTIPART_THRESHOLD_MB = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8"))  # Bodies above this are uploaded in parts
+S3_MULTIPART_CHUNKSIZE_MB = int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))  # Parts uploaded in parallel per object
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))  # Connections shared by all upload threads
+STORAGE_MODE = os.getenv("STORAGE_MODE", "local")  # "local", "s3" (S3_ENABLED also selects s3) or "staged" (local staging + background upload)
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "files")  # "files" (one file per object) or "packed" (per-company segments, local only)
+PACKED_SEGMENT_MAX_MB = int(os.getenv("PACKED_SEGMENT_MAX_MB", "256"))  # A new segment is started past this size
+PAGE_COMPRESSION = os.getenv("PAGE_COMPRESSION", "none")  # Raw HTML pages: "none", "gzip" (wp.html.gz) or "zstd" (wp.html.zst)
+PAGE_COMPRESSION_LEVEL = int(os.getenv("PAGE_COMPRESSION_LEVEL", "6"))
+PAGE_ZSTD_DICTIONARY_ID = int(os.getenv("PAGE_ZSTD_DICTIONARY_ID", "0"))  # Trained with utils/page_compression.py; 0 = no dictionary
+FILE_WRITE_WORKERS = int(os.getenv("FILE_WRITE_WORKERS", "2"))  # Threads writing pages to the raw store; 0 = write in the download threads
+FILE_WRITE_QUEUE_SIZE = int(os.getenv("FILE_WRITE_QUEUE_SIZE", "256"))  # Pages waiting to be written before downloads block
+DIRECTORY_CACHE_SIZE = int(os.getenv("DIRECTORY_CACHE_SIZE", "100000"))  # Directories remembered as created (no makedirs for them)
+LOCAL_DISK_BUDGET_MB = int(os.getenv("LOCAL_DISK_BUDGET_MB", "2048"))  # Staged mode: downloads wait while this much is not uploaded yet; 0 = no limit
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))  # Staged mode: background upload threads
 
 # Data storage
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RAW_MANIFEST_ENABLED = str(os.getenv("RAW_MANIFEST_ENABLED", "true")).lower() in ("1", "true", "yes")  # SQLite record of stored objects
+MANIFEST_SKIP_EXISTING = str(os.getenv("MANIFEST_SKIP_EXISTING", "true")).lower() in ("1", "true", "yes")  # Skip downloads already recorded
+GC_WORKERS = int(os.getenv("GC_WORKERS", "8"))  # Company folders walked in parallel by utils/raw_gc.py
+LOCAL_STAGING_DIR = os.getenv("LOCAL_STAGING_DIR") or os.path.join(PROJECT_ROOT, "data", "raw_staging")
 RAW_DATA_DIR = os.getenv("RAW_DATA_DIR")
 if not RAW_DATA_DIR:
-    if S3_ENABLED:
+    if S3_ENABLED or STORAGE_MODE.lower() in ("s3", "staged"):
         RAW_DATA_DIR = f"s3://{S3_BUCKET_NAME}/{S3_BASE_PATH or 'data'}"
     else:
         RAW_DATA_DIR = os.path.join(PROJECT_ROOT, "raw_data_storage")
+# The manifest lives with a local store (deleted together); an S3 store keeps it under data/
+RAW_MANIFEST_PATH = os.getenv("RAW_MANIFEST_PATH") or (
+    os.path.join(PROJECT_ROOT, "data", "raw_manifest.sqlite") if RAW_DATA_DIR.startswith("s3:")
+    else os.path.join(RAW_DATA_DIR, "_manifest", "raw_manifest.sqlite"))
 
 
 
@@ -0,0 +1,41 @@
+# Report and requeue companies that were dead-lettered after too many failed runs.
+#
+# Usage:
+#   python src/dead_letter.py                   -> list dead-lettered companies
+#   python src/dead_letter.py requeue           -> requeue all of them
+#   python src/dead_letter.py requeue 2995 2788 -> requeue only the given company_ids
+
+import sys
+
+
+def print_dead_letter_report():
+    from utils.db_utils import get_dead_letter_companies
+    from config.settings import COMPANY_MAX_ATTEMPTS
+
+    companies = list(get_dead_letter_companies())
+    if not companies:
+        print("No dead-lettered companies.")
+        return companies
+
+    print(f"Dead-lettered companies (>= {COMPANY_MAX_ATTEMPTS} failed attempts): {len(companies)}")
+    for company in companies:
+        last_error_at = company.get("last_error_at")
+        last_error_at = last_error_at.isoformat() if last_error_at else "-"
+        print(f"  - {company.get('company_id')} | {company.get('name')} | attempts={company.get('attempts')} "
+              f"| last_error_at={last_error_at} | {company.get('last_error')}")
+    return companies
+
+
+def _company_id_variants(raw: str):
+    # company_id is stored as it comes from the SGX listing: match numeric ids as int and str
+    return [raw, int(raw)] if raw.isdigit() else [raw]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "requeue":
+        from utils.db_utils import requeue_dead_letter_companies
+        company_ids = [cid for a in args[1:] for cid in _company_id_variants(a)]
+        requeue_dead_letter_companies(company_ids or None)
+    else:
+        print_dead_letter_report()
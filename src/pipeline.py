@@ -32,42 +32,67 @@ def run_pipeline():
         print(f"Error resetting error companies: {e}")
         return    
     
-    from utils.db_utils import get_pending_companies
-    # Collect pending companies and iterate with a progress bar
+    from utils.db_utils import fetch_pending_companies, count_pending_companies, update_company
+    # Read pending companies from the queue batch by batch and iterate with a progress bar
     from tqdm import tqdm
-    pending_companies = list(get_pending_companies())
+    n_pending = count_pending_companies()
 
-    if (not pending_companies) or (len(pending_companies) == 0):
+    if n_pending == 0:
         print("No pending companies to process.")
         return
 
-    for company in tqdm(pending_companies, desc="Processing companies", unit="company"):
-        company_name = company.get("name")
-        company_id = company.get("company_id")
-        if not company_name or not company_id:
-            print(f"Invalid company data: {company}")
-            continue # skip invalid entries
+    seen_ids = set()
+    stuck_ids = set()  # Seen but still pending (invalid entries, status not written): excluded from the next reads
+    with tqdm(total=n_pending, desc="Processing companies", unit="company") as pbar:
+        # One short query per batch (no cursor held across process_company); companies queued mid-run are picked up too
+        while True:
+            batch = fetch_pending_companies(exclude=stuck_ids)
+            if not batch:
+                break
+            for company in batch:
+                company_name = company.get("name")
+                company_id = company.get("company_id")
+                if company_id in seen_ids:
+                    stuck_ids.add(company_id)
+                    continue
+                seen_ids.add(company_id)
+                if pbar.n >= (pbar.total or 0):
+                    pbar.total = pbar.n + 1
+                    pbar.refresh()
 
-        current_company["name"] = company_name
-        current_company["id"] = company_id
+                if not company_name or not company_id:
+                    print(f"Invalid company data: {company}")
+                    pbar.update(1)
+                    continue # skip invalid entries
+
+                current_company["name"] = company_name
+                current_company["id"] = company_id
 
-        try:
-            try:
-                process_company(company_name, company_id)
-            except KeyboardInterrupt:
-                print("Interruption received (Ctrl+C). Marking current company as 'cancelled' and exiting.")
                 try:
-                    from utils.db_utils import update_company
-                    update_company(company_id, status="cancelled", processed=False)
-                except Exception as e:
-                    print(f"Failed to update cancelled status for company {company_name}: {e}")
-                raise  # Rilancia l'eccezione per uscire dal ciclo principale
-            except Exception as e:
-                print(f"Error processing company {company_name}: {e}")
-                update_company(company_id, status="error", processed=False)
-        finally:
-            current_company["name"] = None
-            current_company["id"] = None
+                    try:
+                        process_company(company_name, company_id)
+                    except KeyboardInterrupt:
+                        print("Interruption received (Ctrl+C). Marking current company as 'cancelled' and exiting.")
+                        try:
+                            from utils.db_utils import update_company
+                            update_company(company_id, status="cancelled", processed=False)
+                        except Exception as e:
+                            print(f"Failed to update cancelled status for company {company_name}: {e}")
+                        raise  # Rilancia l'eccezione per uscire dal ciclo principale
+                    except Exception as e:
+                        print(f"Error processing company {company_name}: {e}")
+                        update_company(company_id, status="error", processed=False, error=e)
+                finally:
+                    current_company["name"] = None
+                    current_company["id"] = None
+                    pbar.update(1)
+
+    # Barrier: make sure every queued status update is written before returning
+    from utils.db_utils import flush_company_updates
+    if not flush_company_updates():
+        print("Some company status updates could not be written: check the queue collection.")
+    from utils.storage import flush_storage
+    flush_storage()
         
 def process_company(company_name, company_id):
     from utils.db_utils import update_company
@@ -82,7 +107,7 @@ def process_company(company_name, company_id):
         process_company_files(company_name, company_id)
     except Exception as e:
         print(f"Error processing files for company {company_name}: {e}")
-        update_company(company_id, status="error", processed=False)
+        update_company(company_id, status="error", processed=False, error=e)
         return
     try:
         # update status to 'success' in the database
@@ -104,4 +129,18 @@ if __name__ == "__main__":
                 update_company(cid, status="cancelled", processed=False)
             except Exception as e:
                 print(f"Failed to update cancelled status for company {name}: {e}")
-        print("Interrupted by the user (Ctrl+C).")
\ No newline at end of file
+        print("Interrupted by the user (Ctrl+C).")
+    finally:
+        # Shutdown barrier for the write-behind channel
+        try:
+            from utils.db_utils import close_company_updates
+            close_company_updates()
+        except Exception as e:
+            print(f"Failed to flush pending company updates: {e}")
+        try:
+            from utils.storage import close_storage
+            close_storage()
+        except Exception as e:
+            print(f"Failed to flush pending uploads: {e}")
+        from utils.parse_pool import shutdown_parse_pool
+        shutdown_parse_pool()
\ No newline at end of file
@@ -264,55 +264,106 @@ def match_company_names(listed_company):
     return results
 '''
 
+def compute_company_delta(listed_company_info, queued_companies):
+    """Compare the fetched listing with the queue in a single pass.
+
+    Args:
+        listed_company_info (list): dicts with "company_id" and "listing_name" from the SGX listing.
+        queued_companies (dict): {company_id: listing_name} snapshot of the queue.
+
+    Returns:
+        tuple: (added, removed, changed) where added is a list of listing entries,
+        removed a list of queued company_ids no longer listed, and changed a list of
+        {company_id, listing_name, refresh_metadata} for queued companies whose
+        listing name differs from the stored one.
+    """
+    # Normalize ids as strings for comparison, but keep the stored values for writes
+    queued_by_key = {str(cid).strip(): (cid, name) for cid, name in queued_companies.items()}
+
+    added, changed = [], []
+    listed_keys = set()
+    for entry in listed_company_info:
+        key = str(entry.get("company_id", "")).strip()
+        if not key or key in listed_keys:
+            continue
+        listed_keys.add(key)
+
+        queued = queued_by_key.get(key)
+        if queued is None:
+            added.append(entry)
+            continue
+
+        queued_id, queued_name = queued
+        listing_name = entry.get("listing_name")
+        if listing_name and listing_name != queued_name:
+            changed.append({
+                "company_id": queued_id,
+                "listing_name": listing_name,
+                # A missing stored name is a backfill, not a rename: keep the existing metadata
+                "refresh_metadata": queued_name is not None,
+            })
+
+    removed = [cid for key, (cid, _) in queued_by_key.items() if key not in listed_keys]
+    return added, removed, changed
+
 def populate_company_collections():
-    # Implement the logic to populate the queue with company names
+    # Delta-sync the queue with the SGX corporate-information listing
     from utils.company_metadata_utils import get_company_result_dict
-    company_listed = get_company_result_dict()
+    from config.settings import DELIST_MAX_FRACTION
+    company_listed, listing_status = get_company_result_dict(with_status=True)
     if company_listed:        
-        # Extract and print the list of document company_names for debugging
-        listed_company_info = [{"company_id": doc.get("id", "Unknown Code")} for doc in company_listed]
-        #print(f"Document Company Data: {name_code_dict}")
-        
-        #esclude from the matching algorithm the already queued companies
-        from utils.db_utils import get_queue_company_list 
-        in_queue_company = get_queue_company_list() #returns list of (name, company_id) tuples
-        #print(f"Companies already in queue: {in_queue_company}")
+        listed_company_info = [
+            {"company_id": doc.get("id", "Unknown Code"), "listing_name": doc.get("companyName")}
+            for doc in company_listed
+        ]
         
-        if (in_queue_company) and (len(in_queue_company) > 0):
-            original_count = len(listed_company_info)
-            # normalize and create sets for quick  checks
-            #queued_names = {t[0].strip().lower() for t in in_queue_company}
-            #get all the ids in the queue
-            queued_ids = {str(t).strip() for t in in_queue_company}
+        from utils.db_utils import get_queue_listing_snapshot
+        queued_companies = get_queue_listing_snapshot() #returns {company_id: listing_name}
+        print(f"CHECKING QUEUE COLLECTION TO FOUND EXISTING COMPANIES: Found a total of {len(queued_companies)} companies in the queue collection.")
 
-            #take only those entries whose company_id is not in the queued_ids
-            new_company_info = [
-                entry for entry in listed_company_info
-                if (str(entry.get("company_id", "")).strip() not in queued_ids)
-            ]
-            
-            #count how many were excluded            
-            excluded_count = original_count - len(new_company_info)
-            print(f"Excluding {excluded_count} companies already in queue. Remaining companies to process: {len(new_company_info)}")
-        
-        else:
-            new_company_info = listed_company_info
+        added, removed, changed = compute_company_delta(listed_company_info, queued_companies)
+        print(f"Listing delta: {len(added)} added, {len(removed)} removed, {len(changed)} changed "
+              f"({len(listed_company_info)} listed, {len(queued_companies)} queued).")
 
+        new_company_info = [{"company_id": entry.get("company_id"), "listing_name": entry.get("listing_name")} for entry in added]
 
-        #print(f"Companies to be inserted (confidence >= 90.0): {inserting_company}")
         from utils.db_utils import store_company_queue
         try:
-            #print(name_code_dict)
             store_company_queue(companylist=new_company_info) #populate queue
         except Exception as e:
             print(f"Error storing company queue: {e}")
         
         try:
             from utils.db_utils import store_company_documents
-            #print(name_code_dict)
-            store_company_documents(companylist=new_company_info) #populate uat/prod
+            store_company_documents(companylist=[{"company_id": entry.get("company_id")} for entry in added]) #populate uat/prod
         except Exception as e:
             print(f"Error storing company collections: {e}")
+
+        try:
+            from utils.db_utils import restore_relisted_companies, apply_listing_changes
+            restore_relisted_companies([entry.get("company_id") for entry in added])
+            apply_listing_changes(changed)
+        except Exception as e:
+            print(f"Error applying listing changes: {e}")
+
+        # Only a complete listing can tell which companies were delisted
+        if removed:
+            too_many = queued_companies and (len(removed) / len(queued_companies)) > DELIST_MAX_FRACTION
+            if listing_status["limited"]:
+                print(f"Listing is limited (COMPANY_MAX_PAGES/MAX_COMPANIES): not delisting {len(removed)} companies.")
+            elif not listing_status["complete"]:
+                print(f"Listing is incomplete (failed pages {listing_status['failed_pages']}, "
+                      f"{listing_status['collected']}/{listing_status['expected']} rows): "
+                      f"not delisting {len(removed)} companies.")
+            elif too_many:
+                print(f"Refusing to delist {len(removed)}/{len(queued_companies)} companies "
+                      f"(more than DELIST_MAX_FRACTION={DELIST_MAX_FRACTION}); the listing may be incomplete.")
+            else:
+                try:
+                    from utils.db_utils import move_companies_to_unlisted
+                    move_companies_to_unlisted(removed)
+                except Exception as e:
+                    print(f"Error moving delisted companies: {e}")
     else:
         raise ValueError("No company data retrieved.")
 
@@ -0,0 +1,194 @@
+# Offline reparse of the raw store: re-run the attachment / company metadata parsers over
+# stored pages on all cores, diff the results against MongoDB and download only the
+# attachments that were not known before. No listing traffic is generated.
+#
+# Usage:
+#   python src/reparse.py                      -> attachments + company metadata
+#   python src/reparse.py --attachments        -> announcement pages only
+#   python src/reparse.py --metadata           -> corporate information pages only
+#   python src/reparse.py --from-db            -> take wp.html paths from the files collection
+#   python src/reparse.py --dry-run            -> report differences, change nothing
+
+import argparse
+import os
+import sys
+from multiprocessing import Pool
+
+ANNOUNCEMENT_PAGE = "wp.html"
+REPARSE_CHUNK = 500  # Pages diffed against MongoDB per round trip
+
+
+def _read_page(path: str) -> str:
+    # Logical page path: plain, .gz or .zst objects are decompressed transparently
+    from utils.page_compression import read_page
+    return read_page(path)
+
+
+def _reparse_announcement(path: str):
+    """Worker: return (document_id, page path, attachment URLs or None, error)."""
+    from utils.html_parsing_utils import get_attachments_url_list
+    # Document folders are named {filing_date}_{document_id}
+    document_id = os.path.basename(os.path.dirname(path)).split("_", 1)[-1]
+    try:
+        return document_id, path, get_attachments_url_list(_read_page(path)), None
+    except Exception as e:
+        return document_id, path, None, str(e)
+
+
+def _reparse_company_page(path: str):
+    """Worker: return (company_id, metadata or None, error)."""
+    from company_metadata_scraper import parse_company_metadata
+    company_id = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return company_id, parse_company_metadata(_read_page(path)), None
+    except Exception as e:
+        return company_id, None, str(e)
+
+
+def iter_announcement_pages(from_db: bool = False):
+    """Yield stored announcement page paths, from the raw store or the files collection."""
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    if from_db:
+        from utils.db_utils import iter_stored_files
+        for doc in iter_stored_files({"_id": 0, "file_path": 1}):
+            file_path = doc.get("file_path")
+            if file_path:
+                yield os.path.join(RAW_DATA_DIR, file_path.lstrip("/"))
+        return
+    from utils.page_compression import iter_pages
+    for path in iter_pages(os.path.join(RAW_DATA_DIR, PLATFORM)):
+        if os.path.basename(path) == ANNOUNCEMENT_PAGE:
+            yield path
+
+
+def iter_company_pages():
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    from company_metadata_scraper import COMPANY_PAGES_FOLDER
+    from utils.page_compression import iter_pages
+    yield from iter_pages(os.path.join(RAW_DATA_DIR, PLATFORM, COMPANY_PAGES_FOLDER))
+
+
+def _diff_attachments(results, dry_run: bool, stats: dict) -> None:
+    """Compare a chunk of reparsed pages with MongoDB and fetch the new attachments."""
+    from config.settings import RAW_DATA_DIR
+    from utils.db_utils import get_files_by_document_ids, add_supporting_file_paths
+    from utils.document_worker import attachment_filename
+    from utils.scraping_utils import download_attachment
+    from concurrent.futures import ThreadPoolExecutor
+
+    stored = get_files_by_document_ids([document_id for document_id, _, _, _ in results])
+    to_download = []  # (document_id, url, absolute path, relative path)
+    for document_id, path, urls, error in results:
+        if error:
+            stats["errors"] += 1
+            continue
+        doc = stored.get(document_id)
+        if doc is None:
+            stats["not_in_db"] += 1
+            continue
+        known = set(doc.get("supporting_file_paths") or [])
+        document_folder = os.path.dirname(path)
+        for url in urls or []:
+            att_path = os.path.join(document_folder, attachment_filename(url))
+            relative_att_path = os.path.relpath(att_path, RAW_DATA_DIR)
+            if relative_att_path not in known:
+                to_download.append((document_id, url, att_path, relative_att_path))
+
+    stats["new_attachments"] += len(to_download)
+    if dry_run or not to_download:
+        for document_id, url, _, _ in to_download:
+            print(f"  [dry-run] {document_id}: new attachment {url}")
+        return
+
+    def _download(item):
+        document_id, url, att_path, relative_att_path = item
+        try:
+            download_attachment(url, att_path)
+            return document_id, relative_att_path
+        except Exception as e:
+            print(f"Error downloading attachment {url}: {e}")
+            return document_id, None
+
+    new_paths = {}
+    from config.settings import MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for document_id, relative_att_path in executor.map(_download, to_download):
+            if relative_att_path:
+                new_paths.setdefault(document_id, []).append(relative_att_path)
+                stats["downloaded"] += 1
+    add_supporting_file_paths(new_paths)
+
+
+def reparse_attachments(pool, from_db: bool = False, dry_run: bool = False) -> dict:
+    from tqdm import tqdm
+    stats = {"pages": 0, "errors": 0, "not_in_db": 0, "new_attachments": 0, "downloaded": 0}
+    chunk = []
+    results = pool.imap_unordered(_reparse_announcement, iter_announcement_pages(from_db), chunksize=64)
+    for result in tqdm(results, desc="Reparsing announcement pages", unit="page"):
+        stats["pages"] += 1
+        chunk.append(result)
+        if len(chunk) >= REPARSE_CHUNK:
+            _diff_attachments(chunk, dry_run, stats)
+            chunk = []
+    if chunk:
+        _diff_attachments(chunk, dry_run, stats)
+    print(f"Attachment reparse: {stats}")
+    return stats
+
+
+def reparse_company_metadata(pool, dry_run: bool = False) -> dict:
+    from tqdm import tqdm
+    from utils.db_utils import get_company_metadata_snapshot, update_company_metadata, flush_company_updates
+
+    stats = {"pages": 0, "errors": 0, "changed": 0}
+    parsed = []
+    for company_id, metadata, error in tqdm(pool.imap_unordered(_reparse_company_page, iter_company_pages(), chunksize=16),
+                                            desc="Reparsing company pages", unit="page"):
+        stats["pages"] += 1
+        if error or not metadata:
+            stats["errors"] += 1
+            continue
+        parsed.append((company_id, metadata))
+
+    # company_id comes from the file name: look it up both as str and int
+    ids = [cid for company_id, _ in parsed for cid in ([company_id, int(company_id)] if company_id.isdigit() else [company_id])]
+    stored = get_company_metadata_snapshot(ids)
+    for company_id, metadata in parsed:
+        key = int(company_id) if company_id.isdigit() and int(company_id) in stored else company_id
+        current = stored.get(key) or {}
+        if all(current.get(field) == value for field, value in metadata.items()):
+            continue
+        stats["changed"] += 1
+        if dry_run:
+            print(f"  [dry-run] company {company_id}: metadata changed")
+            continue
+        # Keep fields added by other stages (e.g. ticker code) and overwrite the parsed ones
+        update_company_metadata(key, {**current, **metadata})
+
+    if not flush_company_updates():
+        print("Some metadata updates could not be written: rerun the reparse.")
+    print(f"Company metadata reparse: {stats}")
+    return stats
+
+
+def main(argv=None):
+    from config.settings import REPARSE_WORKERS
+
+    parser = argparse.ArgumentParser(description="Re-run parsers over the raw page store and sync MongoDB.")
+    parser.add_argument("--attachments", action="store_true", help="reparse announcement pages only")
+    parser.add_argument("--metadata", action="store_true", help="reparse corporate information pages only")
+    parser.add_argument("--from-db", action="store_true", help="take announcement pages from the files collection")
+    parser.add_argument("--dry-run", action="store_true", help="report differences without writing or downloading")
+    parser.add_argument("--workers", type=int, default=REPARSE_WORKERS, help="parser processes (0 = one per core)")
+    args = parser.parse_args(argv)
+
+    do_all = not (args.attachments or args.metadata)
+    with Pool(processes=args.workers or os.cpu_count()) as pool:
+        if do_all or args.attachments:
+            reparse_attachments(pool, from_db=args.from_db, dry_run=args.dry_run)
+        if do_all or args.metadata:
+            reparse_company_metadata(pool, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
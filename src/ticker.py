@@ -37,10 +37,15 @@ def get_count_dict(company_list):
     #print(count_dict)
     return company_list, count_dict
 
-def match_company_names(ticker_list, company_list):
+def match_company_names(ticker_list, company_list, method=None, assignment=None, match_store=None):
     #This function match (1:1)  every company in company_list with a unique ticker object(ticker_code, ticker_name) 
-    from utils.string_matching_utils import get_label_and_confidence
-    import re
+    # method: "batch" (matrix scoring), "index" (blocking index) or "scan" (every pair); all give the same result
+    # assignment: "greedy" (best company per ticker) or "optimal" (global 1:1 assignment, see assign_tickers)
+    # match_store: utils.match_store.MatchStore; only pairs with new/renamed tickers or companies are scored
+    from utils.string_matching_utils import normalize_name
+    from config.settings import MATCHING_METHOD, TICKER_ASSIGNMENT
+    method = method or MATCHING_METHOD
+    assignment = assignment or TICKER_ASSIGNMENT
     
     results = []
     
@@ -49,68 +54,277 @@ def match_company_names(ticker_list, company_list):
     
     company_names = [company.get("name") for company in company_list]
     
-    count_dict = get_count_dict(company_names)
+    _, count_dict = get_count_dict(company_names)
     if (count_dict is None) or (len(count_dict) == 0):
         print("Count dictionary is empty. Cannot perform matching.")
         return results
     
-    from tqdm import tqdm
+    # Normalize every official name once instead of once per (ticker, company) pair
+    normalized_companies = []
+    for company in company_list:
+        if company.get("name") is None:
+            continue
+        try:
+            normalized_companies.append((company, normalize_name(company.get("name"), official=True)))
+        except Exception:
+            continue
+
+    normalized_tickers = []
+    for ticker in to_match:
+        try:
+            normalized_tickers.append(normalize_name(ticker[1]) if ticker[1] is not None else None)
+        except Exception:
+            normalized_tickers.append(None)
+
     SINGLE_TOKEN_THRESHOLD = 3
-    if to_match:
-        for ticker in tqdm(to_match, desc="String matching", unit="company"):
-            ticker_name = ticker[1]
-            best_match = None
-            best_confidence = 0
-            for company in company_list:
-                try:
-                    company_name = company.get("name")
-                    company_id = company.get("company_id")
+    stored = None
+    if match_store is not None:
+        stored = _scores_from_store(match_store, normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD)
+    if assignment == "optimal":
+        candidates = None
+        if stored is not None:
+            from config.settings import ASSIGNMENT_CANDIDATES, ASSIGNMENT_MIN_CONFIDENCE
+            candidates = [_top_stored(scores, ASSIGNMENT_CANDIDATES, ASSIGNMENT_MIN_CONFIDENCE) for scores in stored if scores is not None]
+        return assign_tickers(to_match, normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD, candidates)
 
-                    label, confidence = get_label_and_confidence(entity_name=ticker_name, official_name=company_name, count_dict=count_dict, SINGLE_TOKEN_THRESHOLD=SINGLE_TOKEN_THRESHOLD)
+    if stored is not None:
+        scores = _score_stored(stored)
+    else:
+        if method not in _SCORERS:
+            raise ValueError(f"Unknown matching method {method!r}: expected one of {sorted(_SCORERS)}")
+        scores = _SCORERS[method](normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD)
+
+    for ticker, score in zip(to_match, scores):
+        company, confidence = _select_best(normalized_companies, score)
+        results.append({
+            "original_name": ticker[1],
+            "matched_name": company.get("name") if company else None,
+            "matched_id": company.get("company_id") if company else None,
+            "confidence": confidence if company else 0.0,
+            "ticker_code": ticker[0]
+        })
+    return results
+
+
+# Scorers: one (confidence, positions of the companies with that confidence) per ticker,
+# (0, []) when nothing scores above 0 or the ticker name is unusable
+
+def _select_best(normalized_companies, score):
+    """Company picked for a ticker: the last perfect match, otherwise the first best score (legacy scan order)."""
+    confidence, positions = score
+    if not positions:
+        return None, 0.0
+    return normalized_companies[positions[-1] if confidence == 100 else positions[0]][0], confidence
+
+
+def _score_scan(normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD):
+    """Every (ticker, company) pair."""
+    from tqdm import tqdm
+    from utils.string_matching_utils import get_label_and_confidence_normalized
+    scores = []
+    for normalized_ticker in tqdm(normalized_tickers, desc="String matching", unit="company"):
+        best, positions = 0, []
+        if normalized_ticker is not None:
+            for position, (_, normalized_company) in enumerate(normalized_companies):
+                try:
+                    _, confidence = get_label_and_confidence_normalized(normalized_ticker, normalized_company, count_dict, SINGLE_TOKEN_THRESHOLD)
                 except Exception:
                     # If the helper fails for a candidate, skip it
                     continue
-                if confidence is None:
-                    continue
-                if confidence == 100 or confidence == 100.0:
-                    best_match_name = company_name
-                    best_match_id = company_id
-                    best_confidence = confidence
+                if confidence is None or confidence <= 0 or confidence < best:
                     continue
-                if confidence > best_confidence:
-                    best_confidence = confidence
-                    best_match_name = company_name
-                    best_match_id = company_id
-                    
-            if best_match_name is None:
-                best_match_name = None
-                best_match_id = None
-                best_confidence = 0.0
-                
-            results.append({
-                "original_name": ticker_name,
-                "matched_name": best_match_name,
-                "matched_id": best_match_id ,
-                "confidence": best_confidence,
-                "ticker_code": ticker[0]
-            })
-            
+                if confidence > best:
+                    best, positions = confidence, []
+                positions.append(position)
+        scores.append((best, positions))
+    return scores
 
-            
-            #remove the company name from company_list and update count_dict
-            if best_match in company_list and best_confidence == 100:
-                company_list.remove(best_match)
-                tokens = re.findall(r"\w+", (best_match or "").lower())
-                for tok in tokens:
-                    if tok in count_dict:
-                        count_dict[tok] -= 1
-                        if count_dict[tok] <= 0:
-                            del count_dict[tok]
-            
 
+def _score_index(normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD):
+    """Only the companies sharing a token block with the ticker (see utils/candidate_index.py)."""
+    from utils.candidate_index import CandidateIndex
+    index = CandidateIndex([normalized for _, normalized in normalized_companies], count_dict)
+    scores = [(0, []) if normalized is None else index.search(normalized, SINGLE_TOKEN_THRESHOLD)
+              for normalized in normalized_tickers]
+    print(f"Blocking index: scored {index.stats['scored']} of {index.stats['brute_force_equivalent']} pairs.")
+    return scores
+
+
+def _score_batch(normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD):
+    """Matrix scoring of all tickers against all companies (see utils/matching_engine.py)."""
+    from utils.matching_engine import best_matches
+    from config.settings import MATCHING_WORKERS
+    positions = [i for i, normalized in enumerate(normalized_tickers) if normalized is not None]
+    scored = best_matches([normalized_tickers[i] for i in positions],
+                          [normalized for _, normalized in normalized_companies],
+                          count_dict, SINGLE_TOKEN_THRESHOLD, workers=MATCHING_WORKERS)
+    scores = [(0, [])] * len(normalized_tickers)
+    for position, score in zip(positions, scored):
+        scores[position] = score
+    return scores
+
+
+def _score_stored(stored):
+    """Scores read back from the match store (see _scores_from_store)."""
+    scores = []
+    for ticker_scores in stored:
+        best = max((confidence for _, confidence in ticker_scores or []), default=0)
+        scores.append((best, sorted(p for p, c in ticker_scores if c == best)) if best > 0 else (0, []))
+    return scores
+
+
+_SCORERS = {"scan": _score_scan, "index": _score_index, "batch": _score_batch}
+
+
+def _scores_from_store(match_store, normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD):
+    """Per ticker: [(company position, confidence)] of the stored candidates (None for unusable names)."""
+    from utils.matching_engine import score_block
+    from config.settings import MATCHING_WORKERS
+
+    companies = {company.get("company_id"): normalized for company, normalized in normalized_companies}
+    match_store.sync([t for t in normalized_tickers if t is not None], companies,
+                     lambda queries, candidates: score_block(queries, candidates, workers=MATCHING_WORKERS))
+    print(f"Match store: {match_store.stats}")
+
+    position_by_id = {company.get("company_id"): position for position, (company, _) in enumerate(normalized_companies)}
+    return [None if ticker is None else
+            [(position_by_id[company_id], confidence)
+             for company_id, confidence in match_store.confidences(ticker, count_dict, SINGLE_TOKEN_THRESHOLD)]
+            for ticker in normalized_tickers]
+
+
+def _top_stored(scores, k, min_confidence):
+    # Same selection as matching_engine.top_candidates: the k best above min_confidence, ties included
+    ranked = sorted(((p, c) for p, c in scores if c > min_confidence), key=lambda pc: (-pc[1], pc[0]))
+    if len(ranked) > k:
+        cutoff = ranked[k - 1][1]
+        ranked = [(p, c) for p, c in ranked if c >= cutoff]
+    return ranked
+
+
+def assign_tickers(tickers, normalized_tickers, normalized_companies, count_dict, SINGLE_TOKEN_THRESHOLD, candidates=None):
+    """1:1 ticker -> company assignment over the top candidates of every ticker (see utils/assignment.py).
+
+    Same result records as the greedy matcher plus "margin" (confidence minus the best
+    alternative), "displaced" (its top candidates went to stronger tickers: left unmatched)
+    and "conflict".
+    """
+    from utils.matching_engine import top_candidates
+    from utils.assignment import solve_assignment, assignment_report
+    from config.settings import ASSIGNMENT_CANDIDATES, ASSIGNMENT_MIN_CONFIDENCE, ASSIGNMENT_EXACT_MAX, MATCHING_WORKERS
+
+    positions = [i for i, normalized in enumerate(normalized_tickers) if normalized is not None]
+    if candidates is None:
+        candidates = top_candidates([normalized_tickers[i] for i in positions],
+                                    [normalized for _, normalized in normalized_companies],
+                                    count_dict, SINGLE_TOKEN_THRESHOLD, k=ASSIGNMENT_CANDIDATES,
+                                    min_confidence=ASSIGNMENT_MIN_CONFIDENCE, workers=MATCHING_WORKERS)
+
+    # Keys are (ticker code, ticker name) and company_id so the result does not depend on list order
+    company_by_id = {company.get("company_id"): company for company, _ in normalized_companies}
+    edges = []
+    for ticker_position, ticker_candidates in zip(positions, candidates):
+        row = (tickers[ticker_position][0], tickers[ticker_position][1])
+        for company_position, confidence in ticker_candidates:
+            edges.append((row, normalized_companies[company_position][0].get("company_id"), confidence))
+
+    matched, stats = solve_assignment(edges, exact_max=ASSIGNMENT_EXACT_MAX)
+    report = assignment_report(edges, matched)
+
+    results = []
+    for ticker in tickers:
+        row = (ticker[0], ticker[1])
+        company = company_by_id.get(matched.get(row)) if row in matched else None
+        details = report.get(row, {})
+        confidence = details.get("confidence", 0.0) if company else 0.0
+        results.append({
+            "original_name": ticker[1],
+            "matched_name": company.get("name") if company else None,
+            "matched_id": company.get("company_id") if company else None,
+            "confidence": int(confidence) if float(confidence).is_integer() else confidence,
+            "ticker_code": ticker[0],
+            "margin": details.get("margin", 0.0),
+            "displaced": details.get("displaced", False),
+            "conflict": details.get("conflict", False),
+        })
+
+    displaced = sum(1 for r in results if r["displaced"])
+    conflicts = sum(1 for r in results if r["conflict"])
+    print(f"Optimal assignment: {len(matched)}/{len(tickers)} tickers assigned | {conflicts} in conflict over a company, "
+          f"{displaced} left unmatched (top candidate taken) | components={stats['components']} "
+          f"(exact {stats['exact']}, greedy {stats['greedy']}, largest {stats['largest_component']})")
     return results
 
-def process_ticker_matching():
+
+def match_tickers(ticker_list, company_list, identifier_index=None, match_store=None):
+    """Resolve tickers by exact identifier first, fuzzy-match only the leftovers.
+
+    Tickers whose code is found in `identifier_index` (stock code / ISIN / IBM code)
+    get confidence 100 and match_source "identifier:<kind>"; the remaining tickers are
+    matched by name against the companies not already claimed by an identifier.
+    """
+    if identifier_index is None:
+        results = match_company_names(ticker_list, company_list, match_store=match_store)
+        for r in results:
+            r["match_source"] = "fuzzy"
+        return results
+
+    company_by_id = {company.get("company_id"): company for company in company_list}
+    resolved, leftovers = {}, []
+    for position, ticker in enumerate(ticker_list):
+        company_id, kind = identifier_index.resolve(ticker[0])
+        company = company_by_id.get(company_id)
+        if company is None:
+            leftovers.append(position)
+            continue
+        resolved[position] = {
+            "original_name": ticker[1],
+            "matched_name": company.get("name"),
+            "matched_id": company_id,
+            "confidence": 100,
+            "ticker_code": ticker[0],
+            "match_source": f"identifier:{kind}",
+        }
+
+    claimed = {r["matched_id"] for r in resolved.values()}
+    remaining_companies = [company for company in company_list if company.get("company_id") not in claimed]
+    print(f"Identifier join: {len(resolved)}/{len(ticker_list)} tickers resolved exactly, "
+          f"{len(leftovers)} left for name matching against {len(remaining_companies)} companies.")
+
+    fuzzy = match_company_names([ticker_list[p] for p in leftovers], remaining_companies, match_store=match_store) if leftovers else []
+    if len(fuzzy) != len(leftovers):  # nothing left to match against
+        fuzzy = [{"original_name": ticker_list[p][1], "matched_name": None, "matched_id": None,
+                  "confidence": 0.0, "ticker_code": ticker_list[p][0]} for p in leftovers]
+    for position, r in zip(leftovers, fuzzy):
+        r["match_source"] = "fuzzy"
+        resolved[position] = r
+    return [resolved[position] for position in range(len(ticker_list))]
+
+
+def compare_matching_results(ticker_list, company_list, method="batch"):
+    """Run `method` and the full-scan matcher on the same input and report the differences."""
+    blocked = match_company_names(ticker_list, list(company_list), method=method)
+    brute = match_company_names(ticker_list, list(company_list), method="scan")
+    differences = [(a, b) for a, b in zip(blocked, brute)
+                   if (a["matched_id"], a["confidence"]) != (b["matched_id"], b["confidence"])]
+    print(f"{method} vs full scan: {len(differences)} differences over {len(brute)} tickers.")
+    for a, b in differences[:20]:
+        print(f"  - {a['ticker_code']} {a['original_name']}: {method}={a['matched_id']} ({a['confidence']}) "
+              f"full={b['matched_id']} ({b['confidence']})")
+    return differences
+
+MATCH_STORE_FILE = "ticker_match_store.json"
+MATCHING_ALGORITHM_VERSION = "1"  # Bump when normalization/scoring changes: stored scores are then discarded
+
+
+def get_match_store():
+    from config.settings import PROJECT_ROOT, STRING_MATCHING_TOKENIZER, ASSIGNMENT_CANDIDATES
+    from utils.match_store import MatchStore
+    version = f"{MATCHING_ALGORITHM_VERSION}:{STRING_MATCHING_TOKENIZER}"
+    return MatchStore(os.path.join(PROJECT_ROOT, "data", MATCH_STORE_FILE), version, keep=max(5, ASSIGNMENT_CANDIDATES))
+
+
+def process_ticker_matching(match_store=None, use_identifiers=True):
         tickers = scrape_sgx_ticker_list()
         
         #print the length of the ticker list
@@ -123,8 +337,18 @@ def process_ticker_matching():
         print(f"Total companies to match: {len(companies)}")
         
 
-        results = match_company_names(tickers, companies)
+        identifier_index = None
+        if use_identifiers:
+            try:
+                from utils.identifier_index import build_identifier_index
+                identifier_index = build_identifier_index()
+            except Exception as e:
+                print(f"Identifier index unavailable, falling back to name matching only: {e}")
+
+        results = match_tickers(tickers, companies, identifier_index=identifier_index, match_store=match_store)
         print(f"Total matched companies: {len(results)}")
+        if match_store is not None:
+            match_store.save()
         #print (results)
         
         from config.settings import PROJECT_ROOT 
@@ -159,18 +383,15 @@ def process_ticker_matching():
 if __name__    == "__main__":
 
         from config.settings import PROJECT_ROOT 
-        import csv
         data_dir = os.path.join(PROJECT_ROOT, "data")
         os.makedirs(data_dir, exist_ok=True)
 
         filename = "matched_tickers.json"
         outfile = os.path.join(data_dir, filename)
 
-        if not os.path.exists(outfile):
-            print(f"{outfile} not found. Starting process_ticker_matching()...")
-            process_ticker_matching()
-        else:
-            print(f"File already exists: {outfile}")
+        # Incremental run: only new/renamed tickers and companies are scored, the rest comes from the match store
+        match_store = get_match_store()
+        process_ticker_matching(match_store=match_store)
 
         # Count how many objects in the JSON file have "confidence" == 100
         try:
@@ -179,21 +400,12 @@ if __name__    == "__main__":
                 
                 perfect_matches = [item for item in data if item.get("confidence") == 100 or item.get("confidence") == 100.0]
                 print(f"Correct matches (confidence == 100): {len(perfect_matches)} / {len(data)} .")
-                
-                from utils.db_utils import add_ticker_info 
-                for match in perfect_matches:
-                    try:
-                        ticker_code = match.get("ticker_code")
-                        ticker_name = match.get("original_name")
-                        company_id = match.get("matched_id")
-                        if ticker_code and company_id:
-                            add_ticker_info(company_id=company_id, ticker_code=ticker_code, ticker_name=ticker_name)
-                    except Exception as e:
-                        print(f"Error updating ticker info for company_id {company_id}, ticker_code {ticker_code}: {e}")
+
+                # One projected read and one bulk_write per collection; companies whose
+                # stored code/trading name already match are skipped on the DB side
+                from utils.db_utils import apply_ticker_info_bulk
+                to_apply = [(m.get("matched_id"), m.get("ticker_code"), m.get("original_name"))
+                            for m in perfect_matches if m.get("ticker_code") and m.get("matched_id")]
+                apply_ticker_info_bulk(to_apply)
         except Exception as e:
             print(f"Error reading {outfile}: {e}")
-        
-        
-        
-        
-        
@@ -0,0 +1,202 @@
+"""One-to-one assignment of tickers to companies that never trades a stronger match for weaker ones.
+
+Candidate pairs (ticker, company, confidence) form a sparse bipartite graph.
+Every ticker only keeps its top candidates (the pairs at its best confidence):
+a ticker is never moved to a worse company to make room for another one.
+Tickers are then assigned level by level, highest confidence first: at each
+level the tickers of that level get as many of their top candidates as
+possible among the companies still free (maximum matching per connected
+component: exactly, with shortest augmenting paths on the sparse graph, up
+to `exact_max` nodes per side, above that with a greedy pass). A ticker whose
+top candidates all went to stronger (or equally strong) tickers stays
+unassigned and is reported as displaced.
+
+Rows and columns are ordered by their keys before solving, so the result does
+not depend on the order of the input lists.
+"""
+
+import heapq
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+Edge = Tuple[Hashable, Hashable, float]  # (ticker key, company key, confidence)
+
+ASSIGNMENT_EXACT_MAX = 2000  # Max rows/cols of a component solved exactly
+
+
+def _solve_exact(component: List[Edge]) -> Dict[Hashable, Hashable]:
+    """Maximum-weight bipartite matching by successive shortest augmenting paths.
+
+    Dijkstra with node potentials on the sparse residual graph; stops when the
+    best augmenting path no longer increases the total confidence.
+    """
+    rows = sorted({e[0] for e in component}, key=str)
+    cols = sorted({e[1] for e in component}, key=str)
+    n, m = len(rows), len(cols)
+    row_id = {row: i for i, row in enumerate(rows)}
+    col_id = {col: n + j for j, col in enumerate(cols)}
+    sink = n + m
+    adjacency: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+    weight: Dict[Tuple[int, int], float] = {}
+    for row, col, score in sorted(component, key=lambda e: (str(e[0]), str(e[1]))):
+        r, c = row_id[row], col_id[col]
+        adjacency[r].append((c, score))
+        weight[(r, c)] = score
+
+    # Initial potentials: shortest distances in the (acyclic) starting graph
+    h = [0.0] * (n + m + 1)
+    for r in range(n):
+        for c, score in adjacency[r]:
+            h[c] = min(h[c], -score)
+    h[sink] = min(h[n:sink], default=0.0)
+
+    match_row = [-1] * n
+    match_col = [-1] * (n + m)
+    inf = float("inf")
+    while True:
+        dist = [inf] * (n + m + 1)
+        prev = [-1] * (n + m + 1)
+        heap = []
+        for r in range(n):
+            if match_row[r] < 0:
+                dist[r] = -h[r]
+                heap.append((dist[r], r))
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u == sink:
+                break  # everything closer than the sink is final
+            if d > dist[u]:
+                continue
+            if u < n:
+                for c, score in adjacency[u]:
+                    if match_row[u] == c:
+                        continue
+                    nd = d - score + h[u] - h[c]
+                    if nd < dist[c]:
+                        dist[c], prev[c] = nd, u
+                        heapq.heappush(heap, (nd, c))
+            elif match_col[u] >= 0:
+                r = match_col[u]
+                nd = d + weight[(r, u)] + h[u] - h[r]
+                if nd < dist[r]:
+                    dist[r], prev[r] = nd, u
+                    heapq.heappush(heap, (nd, r))
+            else:
+                nd = d + h[u] - h[sink]
+                if nd < dist[sink]:
+                    dist[sink], prev[sink] = nd, u
+                    heapq.heappush(heap, (nd, sink))
+
+        if dist[sink] == inf or dist[sink] + h[sink] >= 0:
+            break  # no augmenting path left that adds confidence
+        # Capping at the sink distance keeps every reduced cost non-negative
+        cap = dist[sink]
+        for v in range(n + m + 1):
+            h[v] += min(dist[v], cap)
+        c = prev[sink]
+        while c >= 0:
+            r = prev[c]
+            previous_col = match_row[r]
+            match_row[r], match_col[c] = c, r
+            c = prev[r] if previous_col >= 0 else -1
+
+    return {rows[r]: cols[match_row[r] - n] for r in range(n) if match_row[r] >= 0}
+
+
+def _solve_greedy(edges: List[Edge]) -> Dict[Hashable, Hashable]:
+    matched, taken = {}, set()
+    for row, col, _ in sorted(edges, key=lambda e: (-e[2], str(e[0]), str(e[1]))):
+        if row not in matched and col not in taken:
+            matched[row] = col
+            taken.add(col)
+    return matched
+
+
+def _components(edges: Sequence[Edge]) -> List[List[Edge]]:
+    parent: Dict[tuple, tuple] = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for row, col, _ in edges:
+        a, b = find(("r", row)), find(("c", col))
+        if a != b:
+            parent[a] = b
+    groups: Dict[tuple, List[Edge]] = {}
+    for edge in edges:
+        groups.setdefault(find(("r", edge[0])), []).append(edge)
+    return list(groups.values())
+
+
+def solve_assignment(edges: Sequence[Edge], exact_max: int = ASSIGNMENT_EXACT_MAX) -> Tuple[Dict[Hashable, Hashable], dict]:
+    """One-to-one assignment of every row to one of its top columns, strongest rows first.
+
+    Returns ({row: col}, stats). Rows without an assigned column are absent.
+    """
+    weights: Dict[Tuple[Hashable, Hashable], float] = {}
+    for row, col, score in edges:
+        if score > weights.get((row, col), 0):
+            weights[(row, col)] = score
+    best: Dict[Hashable, float] = {}
+    for (row, _), score in weights.items():
+        best[row] = max(best.get(row, 0), score)
+    # Top candidates only, grouped by the confidence of their row
+    levels: Dict[float, List[Edge]] = {}
+    for (row, col), score in weights.items():
+        if score == best[row]:
+            levels.setdefault(score, []).append((row, col, score))
+
+    matched: Dict[Hashable, Hashable] = {}
+    taken = set()
+    stats = {"components": 0, "exact": 0, "greedy": 0, "largest_component": 0}
+    for level in sorted(levels, reverse=True):
+        free = [edge for edge in levels[level] if edge[1] not in taken]
+        for component in _components(free):
+            rows = sorted({e[0] for e in component}, key=str)
+            cols = sorted({e[1] for e in component}, key=str)
+            stats["components"] += 1
+            stats["largest_component"] = max(stats["largest_component"], max(len(rows), len(cols)))
+            if len(rows) == 1 or len(cols) == 1:
+                assigned = _solve_greedy(component)
+                stats["exact"] += 1
+            elif max(len(rows), len(cols)) <= exact_max:
+                assigned = _solve_exact(component)
+                stats["exact"] += 1
+            else:
+                assigned = _solve_greedy(component)
+                stats["greedy"] += 1
+            matched.update(assigned)
+            taken.update(assigned.values())
+    return matched, stats
+
+
+def assignment_report(edges: Sequence[Edge], matched: Dict[Hashable, Hashable]) -> Dict[Hashable, dict]:
+    """Per row: assigned confidence, margin over the best alternative, and whether its top choice was contested."""
+    by_row: Dict[Hashable, List[Tuple[Hashable, float]]] = {}
+    for row, col, score in edges:
+        by_row.setdefault(row, []).append((col, score))
+    top_choice_rows: Dict[Hashable, int] = {}
+    for row, options in by_row.items():
+        best = max(score for _, score in options)
+        for col, score in options:
+            if score == best:
+                top_choice_rows[col] = top_choice_rows.get(col, 0) + 1
+
+    report = {}
+    for row, options in by_row.items():
+        col = matched.get(row)
+        scores = dict(options)
+        assigned = scores.get(col, 0.0) if col is not None else 0.0
+        others = [score for c, score in options if c != col]
+        best = max(score for _, score in options)
+        report[row] = {
+            "confidence": assigned,
+            "margin": assigned - max(others, default=0.0),
+            "displaced": assigned < best,  # lost its best candidate to another ticker
+            "conflict": any(top_choice_rows.get(c, 0) > 1 for c, score in options if score == best),
+        }
+    return report
@@ -0,0 +1,228 @@
+"""Candidate blocking for fuzzy company-name matching.
+
+Instead of scoring a query name against every candidate, the index keeps
+inverted postings of the candidates' character n-grams and tokens, ranks the
+candidates that share them (rare tokens from `count_dict` weigh more) and
+scores only a short list with `fuzz.partial_ratio`.
+
+The result is the same as the brute-force scan: every candidate that was not
+scored is bounded by a character-overlap upper bound of partial_ratio
+(2*overlap / (len(shorter) + overlap)), and any candidate whose bound can
+still reach the best confidence found so far is scored as well.
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from thefuzz import fuzz
+
+from utils.string_matching_utils import NormalizedName, count_score
+
+NGRAM_SIZE = 3
+SHORTLIST_SIZE = 32        # Candidates scored from the postings before applying the bound
+_BOUND_EPSILON = 1e-9      # Float slack so the bound never rounds below the real score
+
+
+def _ngrams(key: str, n: int = NGRAM_SIZE) -> set:
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+
+class CandidateIndex:
+    """Blocking index over normalized official names.
+
+    `candidates` is a sequence of NormalizedName; search results refer to
+    positions in that sequence, so callers keep their own payload list.
+    """
+
+    def __init__(self, candidates: Sequence[NormalizedName], count_dict: Dict[str, int],
+                 ngram_size: int = NGRAM_SIZE, shortlist_size: int = SHORTLIST_SIZE):
+        self.candidates = list(candidates)
+        self.count_dict = count_dict
+        self.ngram_size = ngram_size
+        self.shortlist_size = shortlist_size
+
+        self._by_key: Dict[str, List[int]] = {}
+        self._gram_postings: Dict[str, List[int]] = {}
+        self._token_postings: Dict[str, List[int]] = {}
+        alphabet: Dict[str, int] = {}
+        char_counts = []
+        for position, candidate in enumerate(self.candidates):
+            self._by_key.setdefault(candidate.key, []).append(position)
+            for gram in _ngrams(candidate.key, ngram_size):
+                self._gram_postings.setdefault(gram, []).append(position)
+            for token in set(candidate.tokens):
+                self._token_postings.setdefault(token, []).append(position)
+            counts = Counter(candidate.key)
+            for char in counts:
+                alphabet.setdefault(char, len(alphabet))
+            char_counts.append(counts)
+
+        # Character histograms of all keys, used to bound partial_ratio without computing it
+        self._alphabet = alphabet
+        self._histograms = np.zeros((len(self.candidates), max(1, len(alphabet))), dtype=np.int32)
+        for position, counts in enumerate(char_counts):
+            for char, count in counts.items():
+                self._histograms[position, alphabet[char]] = count
+        self._lengths = np.array([len(c.key) for c in self.candidates], dtype=np.int32)
+
+        self.stats = {"queries": 0, "scored": 0, "brute_force_equivalent": 0}
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def _shortlist(self, query: NormalizedName) -> List[int]:
+        """Candidates sharing n-grams/tokens with the query, best-ranked first."""
+        weights: Dict[int, float] = {}
+        for gram in _ngrams(query.key, self.ngram_size):
+            postings = self._gram_postings.get(gram)
+            if not postings:
+                continue
+            weight = 1.0 / len(postings)
+            for position in postings:
+                weights[position] = weights.get(position, 0.0) + weight
+        for token in set(query.tokens):
+            postings = self._token_postings.get(token)
+            if not postings:
+                continue
+            # Rarity as tracked for the confidence rules: a token seen once weighs 1
+            weight = 1.0 / max(1, self.count_dict.get(token, len(postings)))
+            for position in postings:
+                weights[position] = weights.get(position, 0.0) + weight
+        ranked = sorted(weights, key=weights.get, reverse=True)
+        return ranked[:self.shortlist_size]
+
+    def _upper_bounds(self, query: NormalizedName) -> np.ndarray:
+        """Rounded upper bound of partial_ratio(query, candidate) for every candidate."""
+        query_hist = np.zeros(self._histograms.shape[1], dtype=np.int32)
+        for char, count in Counter(query.key).items():
+            column = self._alphabet.get(char)
+            if column is not None:
+                query_hist[column] = count
+        overlap = np.minimum(self._histograms, query_hist).sum(axis=1)
+        shorter = np.minimum(self._lengths, len(query.key))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bound = np.where(overlap > 0, 200.0 * overlap / (shorter + overlap), 0.0)
+        return np.round(bound + _BOUND_EPSILON)
+
+    def _confidence(self, query: NormalizedName, position: int, entity_score: int) -> Tuple[int, float]:
+        # Same rules as string_matching_utils.get_label_and_confidence_normalized
+        candidate = self.candidates[position]
+        if query.key == candidate.key:
+            return 1, 100
+        score = fuzz.partial_ratio(query.key, candidate.key)
+        if score != 100:
+            return 0, score
+        return (1, 100) if entity_score else (0, score * 0.5)
+
+    def search(self, query: NormalizedName, SINGLE_TOKEN_THRESHOLD) -> Tuple[float, List[int]]:
+        """Best confidence for `query` and the candidate positions reaching it (in order).
+
+        Returns (0, []) when no candidate scores above 0, like the brute-force scan.
+        """
+        self.stats["queries"] += 1
+        self.stats["brute_force_equivalent"] += len(self.candidates)
+        if not self.candidates:
+            return 0, []
+
+        entity_score = count_score(query, self.count_dict, SINGLE_TOKEN_THRESHOLD)
+        scores: Dict[int, float] = {}
+
+        def _score(position):
+            if position not in scores:
+                scores[position] = self._confidence(query, position, entity_score)[1]
+
+        for position in self._by_key.get(query.key, []):
+            scores[position] = 100
+        if len(query.key) >= self.ngram_size:
+            for position in self._shortlist(query):
+                _score(position)
+        best = max(scores.values(), default=0)
+
+        # Everything the short list did not settle: score whatever could still tie or beat the best
+        bounds = self._upper_bounds(query)
+        for position in np.flatnonzero(bounds >= max(best, 1)):
+            _score(int(position))
+        self.stats["scored"] += len(scores)
+
+        best = max(scores.values(), default=0)
+        if best <= 0:
+            return 0, []
+        return best, sorted(p for p, score in scores.items() if score == best)
+
+
+def _synthetic_names(count: int, seed: int = 7) -> List[str]:
+    import random
+    rng = random.Random(seed)
+    syllables = ["sin", "ga", "po", "re", "tek", "mar", "ine", "ven", "tur", "ka", "lo", "pa", "cif", "ic",
+                 "ori", "ent", "del", "ta", "su", "mo", "ha", "an", "zen", "kor", "lin", "vis", "tra", "nex"]
+    suffixes = ["Holdings Ltd", "Group Limited", "Corporation Ltd", "Industries Ltd", "Resources Ltd",
+                "Technologies Ltd", "REIT", "Trust", "Bhd", "Pte Ltd"]
+    words = ["Pacific", "Asia", "Global", "Marine", "Energy", "Capital", "Land", "Food", "Logistics", "Health"]
+    names = set()
+    while len(names) < count:
+        head = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+        middle = f" {rng.choice(words)}" if rng.random() < 0.5 else ""
+        names.add(f"{head}{middle} {rng.choice(suffixes)}")
+    return sorted(names)
+
+
+def _benchmark_scaling(sizes=(700, 5000, 20000), queries: int = 200, check_parity: bool = True):
+    """Compare brute force, blocked and batched matching on synthetic issuer universes of growing size."""
+    import random
+    import re
+    import time
+    from utils.string_matching_utils import normalize_name, get_label_and_confidence_normalized
+
+    SINGLE_TOKEN_THRESHOLD = 3
+    for size in sizes:
+        names = _synthetic_names(size)
+        count_dict: Dict[str, int] = {}
+        for name in names:
+            for token in re.findall(r"\w+", name.lower()):
+                count_dict[token] = count_dict.get(token, 0) + 1
+        candidates = [normalize_name(name, official=True) for name in names]
+
+        rng = random.Random(size)
+        # Tickers look like shortened official names; a few are unrelated
+        sample = [rng.choice(names).rsplit(" ", 1)[0].upper() if rng.random() < 0.8 else _synthetic_names(1, rng.randint(0, 10**6))[0]
+                  for _ in range(queries)]
+        normalized_queries = [normalize_name(q) for q in sample]
+
+        start = time.perf_counter()
+        index = CandidateIndex(candidates, count_dict)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        blocked = [index.search(q, SINGLE_TOKEN_THRESHOLD) for q in normalized_queries]
+        blocked_seconds = time.perf_counter() - start
+
+        from utils.matching_engine import best_matches
+        start = time.perf_counter()
+        batched = best_matches(normalized_queries, candidates, count_dict, SINGLE_TOKEN_THRESHOLD)
+        batch_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        brute = []
+        for q in normalized_queries:
+            scores = [get_label_and_confidence_normalized(q, c, count_dict, SINGLE_TOKEN_THRESHOLD)[1] for c in candidates]
+            best = max(scores, default=0)
+            brute.append((best, [p for p, s in enumerate(scores) if s == best]) if best > 0 else (0, []))
+        brute_seconds = time.perf_counter() - start
+
+        mismatches = sum(1 for a, b, c in zip(blocked, batched, brute) if not a == b == c) if check_parity else "-"
+        scored = index.stats["scored"] / max(1, index.stats["queries"])
+        print(f"candidates={size:>6} queries={queries} | brute force {brute_seconds:.2f}s | "
+              f"index build {build_seconds:.2f}s + search {blocked_seconds:.2f}s | batch {batch_seconds:.2f}s | "
+              f"scored/query {scored:.1f} | mismatches {mismatches}")
+
+
+if __name__ == "__main__":
+    _benchmark_scaling()
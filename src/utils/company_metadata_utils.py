@@ -12,8 +12,13 @@ from utils.http_requests_utils import get_headers
 from utils.scraping_utils import get_search_results, extract_documents_list 
 
 
-def get_company_result_dict():
-    # Implement the logic to get the company's metadata
+def get_company_result_dict(with_status=False):
+    """Companies of the corporate information listing.
+
+    With `with_status` returns (documents, status): status["complete"] is False when
+    a page failed or came back empty, or fewer rows were collected than the listing
+    announces, so callers must not treat a missing company as delisted.
+    """
     # Search in corporate information page
     results = get_search_results(periodstart=PERIOD_START, periodend=PERIOD_END, url=CORPORATEINFO_URL, pagesize=COMPANY_PAGE_SIZE)
 
@@ -21,9 +26,13 @@ def get_company_result_dict():
         print("Failed to retrieve search results or missing metadata.")
         raise ValueError("Invalid search results")
     
-    n_pages =  results.get("meta", {}).get("totalPages", 1) # Total number of pages
+    meta = results.get("meta", {})
+    n_pages = meta.get("totalPages", 1) # Total number of pages
+    # Rows announced by the API; without a total every page but the last must be full
+    expected = meta.get("totalItems") or meta.get("totalCount") or (max(n_pages - 1, 0) * COMPANY_PAGE_SIZE + 1)
 
     all_documents = []
+    failed_pages = []
 
     # Collect all documents from all pages
     for page_num in range(min(n_pages, COMPANY_MAX_PAGES) if COMPANY_MAX_PAGES > 0 else n_pages):
@@ -37,6 +46,7 @@ def get_company_result_dict():
 
         if not response:
             print(f"Failed to retrieve search results for company search on page {page_num + 1}")
+            failed_pages.append(page_num + 1)
             continue
 
         doc_list = extract_documents_list(response)
@@ -52,11 +62,25 @@ def get_company_result_dict():
             #print(f"Total documents collected so far: {len(all_documents)}")
         else:
             print(f"No documents found on page {page_num + 1}")
+            failed_pages.append(page_num + 1)
             continue
         
     print(f"Total documents collected: {len(all_documents)}")
-    
-    return all_documents[:MAX_COMPANIES] if MAX_COMPANIES > 0 else all_documents
+
+    documents = all_documents[:MAX_COMPANIES] if MAX_COMPANIES > 0 else all_documents
+    if not with_status:
+        return documents
+    limited = COMPANY_MAX_PAGES > 0 or MAX_COMPANIES > 0
+    status = {
+        "complete": not failed_pages and not limited and len(all_documents) >= expected,
+        "failed_pages": failed_pages,
+        "expected": expected,
+        "collected": len(all_documents),
+        "limited": limited,
+    }
+    if not status["complete"]:
+        print(f"Company listing incomplete: {status}")
+    return documents, status
     
 
 
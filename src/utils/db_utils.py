@@ -5,11 +5,17 @@ SRC_PATH = ROOT_PATH / "src"
 sys.path.append(str(ROOT_PATH))
 sys.path.append(str(SRC_PATH))
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.errors import BulkWriteError
 import datetime
 from datetime import datetime, timezone
+import atexit
+import threading
 from config.settings import MONGODB_URI, MONGODB_DATABASE, COMPANIES_QUEUE_COLLECTION, PUBLIC_DOCUMENTS_COLLECTION, COMPANIES_UAT_COLLECTION, COMPANIES_PROD_COLLECTION, PROD_MODE 
+from config.settings import UNLISTED_COMPANIES_COLLECTION
+from config.settings import WRITE_BEHIND_ENABLED, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL
+from config.settings import QUEUE_READ_BATCH_SIZE, QUEUE_READ_SORT
+from config.settings import COMPANY_MAX_ATTEMPTS, COMPANY_RETRY_BASE_DELAY, COMPANY_RETRY_MAX_DELAY
 
 print(f"Using MongoDB service at { MONGODB_URI }")
 print(f"Using database: { MONGODB_DATABASE  }")
@@ -17,6 +23,7 @@ print(f"Using queue collection: {COMPANIES_QUEUE_COLLECTION }")
 print(f"Using files collection: { PUBLIC_DOCUMENTS_COLLECTION }")
 print(f"Using company collection [UAT]: { COMPANIES_UAT_COLLECTION }")
 print(f"Using company collection [PROD]: { COMPANIES_PROD_COLLECTION }")
+print(f"Using unlisted companies collection: { UNLISTED_COMPANIES_COLLECTION }")
 
 def create_indexes(db):
     """Create indexes for MongoDB collections."""
@@ -49,6 +56,10 @@ def create_indexes(db):
         db[COMPANIES_UAT_COLLECTION].create_index(
             [("company_id", 1)], unique=True, background=True
         )
+
+        db[UNLISTED_COMPANIES_COLLECTION].create_index(
+            [("company_id", 1)], unique=True, background=True
+        )
         #db[COMPANIES_UAT_COLLECTION].create_index(
         #    [("name", 1)], unique=True, background=True
         #)
@@ -66,6 +77,112 @@ def connect_mongo(uri=None, db_name=None):
 db = connect_mongo()
 create_indexes(db)
 
+# Status transitions that must be persisted before the caller moves on
+STATUS_CRITICAL = ("success", "error", "cancelled")
+
+# Companies that failed COMPANY_MAX_ATTEMPTS times are parked here until requeued
+DEAD_LETTER_STATUS = "dead_letter"
+
+# Write-behind channel shared by all worker threads (created on first use)
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+def get_write_behind():
+    """Return the shared write-behind writer, starting it on first use."""
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                from utils.write_behind import WriteBehindWriter
+                _write_behind = WriteBehindWriter(
+                    get_db=lambda: db if db is not None else connect_mongo(),
+                    batch_size=WRITE_BEHIND_BATCH_SIZE,
+                    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                )
+    return _write_behind
+
+def enqueue_company_update(collection_name, company_id, update, flush=False):
+    """Queue an update for a company document; write synchronously if write-behind is disabled."""
+    if not WRITE_BEHIND_ENABLED:
+        result = (db if db is not None else connect_mongo())[collection_name].update_one({"company_id": company_id}, update)
+        if result.matched_count == 0:
+            print(f"No company found with company_id {company_id} in {collection_name}.")
+        return
+    writer = get_write_behind()
+    writer.enqueue(collection_name, company_id, update)
+    if flush:
+        writer.flush()
+
+def flush_company_updates(timeout=None):
+    """Barrier: wait until every queued company update has been written.
+
+    Returns False when some updates queued by this thread could not be written
+    (see WriteBehindWriter.flush).
+    """
+    if _write_behind is not None:
+        return _write_behind.flush(timeout=timeout)
+    return True
+
+def close_company_updates(timeout=None):
+    """Flush pending company updates and stop the background writer."""
+    global _write_behind
+    if _write_behind is not None:
+        _write_behind.close(timeout=timeout)
+        _write_behind = None
+
+atexit.register(close_company_updates)
+
+def get_company_doc_collections():
+    """Return the configured UAT/PROD company collections, each exactly once."""
+    targets = [COMPANIES_UAT_COLLECTION]
+    if PROD_MODE and COMPANIES_PROD_COLLECTION not in targets:
+        targets.append(COMPANIES_PROD_COLLECTION)
+    return targets
+
+def fan_out_company_update(company_id, update, include_queue=False, flush=False):
+    """Apply one logical company update to every target collection exactly once.
+
+    Updates go through the write-behind channel, which writes one bulk per
+    collection; `include_queue` also targets the queue collection.
+    """
+    targets = get_company_doc_collections()
+    if include_queue:
+        targets = [COMPANIES_QUEUE_COLLECTION] + targets
+    for coll in targets:
+        enqueue_company_update(coll, company_id, update)
+    if flush:
+        flush_company_updates()
+    return targets
+
+def fan_out_company_write(write_fn, collections=None):
+    """Run `write_fn(collection)` once per target collection, in parallel.
+
+    Returns a dict {collection_name: (result, error)} so callers can report
+    per-collection outcomes consistently with `report_fan_out`.
+    """
+    targets = list(dict.fromkeys(collections or get_company_doc_collections()))
+    database = db if db is not None else connect_mongo()
+
+    def _run(name):
+        try:
+            return name, (write_fn(database[name]), None)
+        except Exception as e:
+            return name, (None, e)
+
+    if len(targets) == 1:
+        return dict([_run(targets[0])])
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        return dict(executor.map(_run, targets))
+
+def report_fan_out(results, action):
+    """Print one line per collection for a fan-out write."""
+    for name, (result, error) in results.items():
+        if error is not None:
+            print(f"[{name}] {action} failed: {error}")
+        else:
+            print(f"[{name}] {action}: {result}")
+
 def store_metadata_batch(metadata_list: list) -> None:
     """Store a batch of metadata documents in the database."""
     global db  # Use the global db object
@@ -269,68 +386,321 @@ def store_company_documents(companylist):
         print("No companies to store.")
         return
 
+    from datetime import datetime, timezone
+    current_timestamp = datetime.now(timezone.utc)  # Get the current UTC timestamp
+
+    def _insert(collection):
+        # Each collection gets its own copies: insert_many adds _id to the documents it is given
+        docs = [dict(company, processed=False, updated_at=current_timestamp) for company in companylist]
+        print(f"Passed {len(docs)} entries to the inserting function for {collection.name}.")
+        try:
+            result = collection.insert_many(docs, ordered=False)
+            return f"inserted {len(result.inserted_ids)} companies"
+        except BulkWriteError as bwe:
+            #print(f"Bulk write error details: {bwe.details}")
+            duplicate_count = sum(1 for error in bwe.details.get("writeErrors", []) if error.get("code") == 11000)
+            added_count = len(docs) - duplicate_count
+            return f"inserted {added_count} companies, skipped {duplicate_count} already existing"
+
+    report_fan_out(fan_out_company_write(_insert), "insert companies")
+
+
+def get_queue_listing_snapshot():
+    # Return {company_id: listing_name} for every company in the queue (projected read)
     db = connect_mongo()
     if db is None:
         raise ValueError("Database connection error.")
 
-    for coll in [COMPANIES_UAT_COLLECTION , COMPANIES_PROD_COLLECTION if PROD_MODE else COMPANIES_UAT_COLLECTION ]:
-        print(f"Passed {len(companylist)} entries to the inserting function for {coll}.")
-        
-        collection = db[coll]
-        from datetime import datetime, timezone
-        current_timestamp = datetime.now(timezone.utc)  # Get the current UTC timestamp
+    collection = db[COMPANIES_QUEUE_COLLECTION]
+    cursor = collection.find({}, {"_id": 0, "company_id": 1, "listing_name": 1}, batch_size=QUEUE_READ_BATCH_SIZE)
+    return {doc.get("company_id"): doc.get("listing_name") for doc in cursor}
 
-        for company in companylist:
-            company["processed"] = False
-            company["updated_at"] = current_timestamp
-            
-            
+def apply_listing_changes(changed):
+    """Record new listing names for queued companies in one bulk write.
 
-        try:
-            result = collection.insert_many(companylist, ordered=False)
-            print(f"Inserted {len(result.inserted_ids)} companies into the {coll} collection.")
-        except BulkWriteError as bwe:
-            #print(f"Bulk write error details: {bwe.details}")
-            duplicate_count = sum(1 for error in bwe.details.get("writeErrors", []) if error.get("code") == 11000)
-            added_count = len(companylist) - duplicate_count
-            if added_count > 0:
-                print(f"Inserted {added_count} new companies into the {coll} collection.")
-            if duplicate_count > 0:
-                print(f"{duplicate_count} companies already exist in the {coll} collection. Skipping duplicates.")
-        except Exception as e:
-            print(f"Error inserting companies: {e}")
+    `changed` is a list of dicts {company_id, listing_name, refresh_metadata};
+    when refresh_metadata is True the company is rescheduled for the metadata stage.
+    """
+    if not changed:
+        return 0
+    from pymongo import UpdateOne
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
 
+    current_timestamp = datetime.now(timezone.utc)
+    ops = []
+    for entry in changed:
+        fields = {"listing_name": entry.get("listing_name"), "updated_at": current_timestamp}
+        if entry.get("refresh_metadata"):
+            fields["processed_company_metadata"] = False
+        ops.append(UpdateOne({"company_id": entry.get("company_id")}, {"$set": fields}))
+    result = db[COMPANIES_QUEUE_COLLECTION].bulk_write(ops, ordered=False)
+    print(f"Updated listing name for {result.modified_count} companies in the queue.")
+    return result.modified_count
+
+def move_companies_to_unlisted(company_ids):
+    """Move delisted companies from the queue to the unlisted collection in bulk.
+
+    The queue documents are copied (with `unlisted_at`) into
+    UNLISTED_COMPANIES_COLLECTION and deleted from the queue, so they are no
+    longer scheduled; UAT/PROD documents are kept and flagged `delisted`.
+    """
+    if not company_ids:
+        return 0
+    from pymongo import ReplaceOne
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    queue_coll = db[COMPANIES_QUEUE_COLLECTION]
+    unlisted_coll = db[UNLISTED_COMPANIES_COLLECTION]
+    current_timestamp = datetime.now(timezone.utc)
+
+    ops = []
+    moved_ids = []
+    for doc in queue_coll.find({"company_id": {"$in": list(company_ids)}}, {"_id": 0}):
+        doc["unlisted_at"] = current_timestamp
+        ops.append(ReplaceOne({"company_id": doc.get("company_id")}, doc, upsert=True))
+        moved_ids.append(doc.get("company_id"))
+    if not ops:
+        return 0
+
+    unlisted_coll.bulk_write(ops, ordered=False)
+    result = queue_coll.delete_many({"company_id": {"$in": moved_ids}})
+    print(f"Moved {result.deleted_count} delisted companies to {UNLISTED_COMPANIES_COLLECTION}.")
+
+    report_fan_out(
+        fan_out_company_write(lambda coll: coll.update_many(
+            {"company_id": {"$in": moved_ids}},
+            {"$set": {"delisted": True, "delisted_at": current_timestamp}},
+        ).modified_count),
+        "flag delisted companies",
+    )
+    return result.deleted_count
 
-def get_pending_companies():
-    # Implement the logic to retrieve pending companies from the database
+def restore_relisted_companies(company_ids):
+    # Companies that reappear in the listing are dropped from the unlisted collection
+    if not company_ids:
+        return 0
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    result = db[UNLISTED_COMPANIES_COLLECTION].delete_many({"company_id": {"$in": list(company_ids)}})
+    if result.deleted_count > 0:
+        print(f"Removed {result.deleted_count} relisted companies from {UNLISTED_COMPANIES_COLLECTION}.")
+        fan_out_company_write(lambda coll: coll.update_many(
+            {"company_id": {"$in": list(company_ids)}},
+            {"$set": {"delisted": False}, "$unset": {"delisted_at": ""}},
+        ))
+    return result.deleted_count
+
+
+def iter_stored_files(projection=None, batch_size=None, query=None):
+    # Stream documents of the files collection (file_path / supporting_file_paths by default)
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    cursor = db[PUBLIC_DOCUMENTS_COLLECTION].find(
+        query or {},
+        projection or {"_id": 0, "document_id": 1, "company_id": 1, "file_path": 1, "supporting_file_paths": 1},
+        batch_size=batch_size or QUEUE_READ_BATCH_SIZE,
+    )
+    try:
+        for doc in cursor:
+            yield doc
+    finally:
+        cursor.close()
+
+def iter_file_issuers(batch_size=None):
+    # Stream {company_id, issuers} of the announcements that carry issuer identifiers
+    return iter_stored_files({"_id": 0, "company_id": 1, "issuers": 1}, batch_size=batch_size,
+                             query={"issuers.0": {"$exists": True}})
+
+def iter_company_identifiers(batch_size=None):
+    # Stream company_id with the ISIN of the corporate information page from the first company collection
+    # (metadata.code is not an identifier: it is written by the ticker name matching)
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    cursor = db[get_company_doc_collections()[0]].find(
+        {"metadata.isin_code": {"$nin": [None, ""]}},
+        {"_id": 0, "company_id": 1, "metadata.isin_code": 1},
+        batch_size=batch_size or QUEUE_READ_BATCH_SIZE,
+    )
+    try:
+        for doc in cursor:
+            yield doc
+    finally:
+        cursor.close()
+
+def get_files_by_document_ids(document_ids):
+    # Return {document_id: files doc (file_path, supporting_file_paths)} for the given ids
+    if not document_ids:
+        return {}
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    cursor = db[PUBLIC_DOCUMENTS_COLLECTION].find(
+        {"document_id": {"$in": list(document_ids)}},
+        {"_id": 0, "document_id": 1, "file_path": 1, "supporting_file_paths": 1},
+    )
+    return {doc.get("document_id"): doc for doc in cursor}
+
+def add_supporting_file_paths(new_paths_by_document):
+    """Append newly downloaded attachment paths to files documents in one bulk write.
+
+    `new_paths_by_document` is {document_id: [relative paths]}; existing (possibly null)
+    supporting_file_paths are kept and the new paths appended.
+    """
+    if not new_paths_by_document:
+        return 0
+    from pymongo import UpdateOne
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    current_timestamp = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"document_id": document_id},
+            [{"$set": {
+                "supporting_file_paths": {"$concatArrays": [{"$ifNull": ["$supporting_file_paths", []]}, list(paths)]},
+                "updated_at": current_timestamp,
+            }}],
+        )
+        for document_id, paths in new_paths_by_document.items() if paths
+    ]
+    if not ops:
+        return 0
+    result = db[PUBLIC_DOCUMENTS_COLLECTION].bulk_write(ops, ordered=False)
+    print(f"Added supporting files to {result.modified_count} documents in {PUBLIC_DOCUMENTS_COLLECTION}.")
+    return result.modified_count
+
+def get_company_metadata_snapshot(company_ids):
+    # Return {company_id: metadata} from the first company collection (UAT)
+    if not company_ids:
+        return {}
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    cursor = db[get_company_doc_collections()[0]].find(
+        {"company_id": {"$in": list(company_ids)}},
+        {"_id": 0, "company_id": 1, "metadata": 1},
+    )
+    return {doc.get("company_id"): doc.get("metadata") for doc in cursor}
+
+
+def _parse_sort(sort):
+    # Accept "field", "-field" or "field1,-field2" as well as a pymongo sort list
+    if not sort:
+        return None
+    if isinstance(sort, str):
+        keys = []
+        for field in sort.split(","):
+            field = field.strip()
+            if not field:
+                continue
+            if field.startswith("-"):
+                keys.append((field[1:], DESCENDING))
+            else:
+                keys.append((field.lstrip("+"), ASCENDING))
+        return keys or None
+    return list(sort)
+
+def iter_queue_companies(query, projection=None, batch_size=None, sort=None):
+    """Stream queue documents matching `query` through a server-side cursor.
+
+    Only the fields in `projection` are fetched, documents are pulled from the
+    server `batch_size` at a time, and the generator yields as soon as the first
+    batch arrives, so memory does not depend on the size of the queue.
+    """
     db = connect_mongo()
     if db is None:
         raise ValueError("Database connection error.")
 
     collection = db[COMPANIES_QUEUE_COLLECTION]
+    cursor = collection.find(query, projection, batch_size=batch_size or QUEUE_READ_BATCH_SIZE)
+    sort_keys = _parse_sort(QUEUE_READ_SORT if sort is None else sort)
+    if sort_keys:
+        cursor = cursor.sort(sort_keys)
+    try:
+        for doc in cursor:
+            yield doc
+    finally:
+        cursor.close()
+
+def count_queue_companies(query):
+    """Count queue documents matching `query` (used for progress bars)."""
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+    try:
+        return db[COMPANIES_QUEUE_COLLECTION].count_documents(query)
+    except Exception as e:
+        print(f"Error counting companies in the queue: {e}")
+        return None
+
+PENDING_PROJECTION = {"_id": 0, "company_id": 1, "name": 1}
+
+def pending_query(now=None):
+    # Pending companies whose retry backoff (if any) has expired
+    now = now or datetime.now(timezone.utc)
+    return {
+        "status": "pending",
+        "$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}],
+    }
+
+def get_pending_companies(batch_size=None, sort=None):
+    # Stream pending companies (company_id and name only) from the queue
     try:
-        pending_companies = list(collection.find({"status": "pending"}))
-        print(f"Retrieved {len(pending_companies)} pending companies from the queue collection.")
-        return pending_companies
+        yield from iter_queue_companies(pending_query(), PENDING_PROJECTION, batch_size=batch_size, sort=sort)
     except Exception as e:
         print(f"Error retrieving pending companies: {e}")
-        return []
-    
-#This function returns all the company in the queue
-def get_companies_to_ticker():
-    # Implement the logic to retrieve pending companies from the database
+
+def fetch_pending_companies(limit=None, exclude=None, sort=None):
+    """One batch of pending companies (company_id and name only), read without keeping a cursor open.
+
+    For callers doing long work per company: fetch the next batch once the current one is
+    done instead of holding a cursor across it (idle cursors are killed by the server).
+    `exclude`: company ids to skip (e.g. seen ones that are still pending).
+    """
     db = connect_mongo()
     if db is None:
         raise ValueError("Database connection error.")
+    query = pending_query()
+    if exclude:
+        query["company_id"] = {"$nin": list(exclude)}
+    try:
+        cursor = db[COMPANIES_QUEUE_COLLECTION].find(query, PENDING_PROJECTION).limit(limit or QUEUE_READ_BATCH_SIZE)
+        sort_keys = _parse_sort(QUEUE_READ_SORT if sort is None else sort)
+        if sort_keys:
+            cursor = cursor.sort(sort_keys)
+        return list(cursor)
+    except Exception as e:
+        print(f"Error retrieving pending companies: {e}")
+        return []
 
-    collection = db[COMPANIES_QUEUE_COLLECTION]
+def count_pending_companies():
+    return count_queue_companies(pending_query())
+    
+#This function returns all the company in the queue
+def get_companies_to_ticker(batch_size=None, sort=None):
+    # Stream companies with metadata (company_id and name only) from the queue
     try:
-        companies = list(collection.find({"processed_company_metadata": True}))
-        print(f"Retrieved {len(companies)} companies from the queue collection.")
-        return companies
+        yield from iter_queue_companies(
+            {"processed_company_metadata": True},
+            {"_id": 0, "company_id": 1, "name": 1},
+            batch_size=batch_size,
+            sort=sort,
+        )
     except Exception as e:
         print(f"Error retrieving companies: {e}")
-        return []
     
     
 def reset_error_companies():
@@ -344,6 +714,8 @@ def reset_error_companies():
     current_timestamp = datetime.now(timezone.utc)  # Get the current UTC timestamp
 
     try:
+        # Failed companies keep their attempts/next_attempt_at, so they are only
+        # picked up again once their backoff expires; dead-lettered ones stay put.
         result = collection.update_many(
             {"status": {"$in": ["error", "cancelled", "running"]}},
             {"$set": {
@@ -352,24 +724,99 @@ def reset_error_companies():
             }}
         )
         print(f"Reset {result.modified_count} companies to 'pending' status.")
+        deferred = collection.count_documents({"status": "pending", "next_attempt_at": {"$gt": current_timestamp}})
+        if deferred > 0:
+            print(f"{deferred} pending companies are waiting for their retry backoff to expire.")
     except Exception as e:
         print(f"Error resetting error companies: {e}")
         raise e    
 
-def get_companies_without_metadata():
-    # Implement the logic to retrieve companies without metadata from the database
+def record_company_failure(company_id, error=None, num_filings=None):
+    """Mark a company as failed, counting the attempt and scheduling the next one.
+
+    The retry delay grows exponentially (COMPANY_RETRY_BASE_DELAY * 2^(attempts-1),
+    capped at COMPANY_RETRY_MAX_DELAY); after COMPANY_MAX_ATTEMPTS failures the
+    company is moved to the DEAD_LETTER_STATUS and no longer scheduled.
+    Runs as a single atomic pipeline update on the queue document.
+    """
     db = connect_mongo()
     if db is None:
         raise ValueError("Database connection error.")
 
-    collection = db[COMPANIES_QUEUE_COLLECTION]
+    current_timestamp = datetime.now(timezone.utc)
+    base_ms = int(COMPANY_RETRY_BASE_DELAY * 1000)
+    max_ms = int(COMPANY_RETRY_MAX_DELAY * 1000)
+    fields = {
+        "processed": False,
+        "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, 1]},
+        "last_error": str(error)[:1000] if error else None,
+        "last_error_at": current_timestamp,
+        "updated_at": current_timestamp,
+    }
+    if num_filings is not None:
+        fields["num_filings"] = int(num_filings)
+
+    result = db[COMPANIES_QUEUE_COLLECTION].update_one(
+        {"company_id": company_id},
+        [
+            {"$set": fields},
+            {"$set": {
+                "status": {"$cond": [{"$gte": ["$attempts", COMPANY_MAX_ATTEMPTS]}, DEAD_LETTER_STATUS, "error"]},
+                "next_attempt_at": {"$add": [
+                    current_timestamp,
+                    {"$min": [max_ms, {"$multiply": [base_ms, {"$pow": [2, {"$subtract": ["$attempts", 1]}]}]}]},
+                ]},
+            }},
+        ],
+    )
+    if result.matched_count == 0:
+        print(f"No company found with company_id {company_id} in queue.")
+    return result.matched_count > 0
+
+def get_dead_letter_companies():
+    # Stream dead-lettered companies with their failure details
+    yield from iter_queue_companies(
+        {"status": DEAD_LETTER_STATUS},
+        {"_id": 0, "company_id": 1, "name": 1, "attempts": 1, "last_error": 1, "last_error_at": 1},
+    )
+
+def requeue_dead_letter_companies(company_ids=None):
+    """Put dead-lettered companies (all, or only `company_ids`) back to 'pending' with a fresh attempt budget."""
+    db = connect_mongo()
+    if db is None:
+        raise ValueError("Database connection error.")
+
+    query = {"status": DEAD_LETTER_STATUS}
+    if company_ids:
+        query["company_id"] = {"$in": list(company_ids)}
+    result = db[COMPANIES_QUEUE_COLLECTION].update_many(
+        query,
+        {"$set": {
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": None,
+            "updated_at": datetime.now(timezone.utc)
+        }}
+    )
+    print(f"Requeued {result.modified_count} dead-lettered companies.")
+    return result.modified_count
+
+WITHOUT_METADATA_QUERY = {"processed_company_metadata": False}
+
+def get_companies_without_metadata(batch_size=None, sort=None):
+    # Stream companies without metadata (company_id only) from the queue
     try:
-        companies = list(collection.find({"processed_company_metadata": False}))
-        print(f"Retrieved {len(companies)} companies without metadata from the queue collection.")
-        return companies
+        yield from iter_queue_companies(
+            WITHOUT_METADATA_QUERY,
+            {"_id": 0, "company_id": 1},
+            batch_size=batch_size,
+            sort=sort,
+        )
     except Exception as e:
         print(f"Error retrieving companies without metadata: {e}")
-        return []
+
+def count_companies_without_metadata():
+    return count_queue_companies(WITHOUT_METADATA_QUERY)
 
 def get_queue_company_list():
     # Return list of (company_id) pairs for companies in the queue
@@ -387,17 +834,14 @@ def get_queue_company_list():
         print(f"Error retrieving companies from the queue: {e}")
         return []
 
-def update_company(company_id, processed=False, status="success"):
+def update_company(company_id, processed=False, status="success", error=None):
     # Implement the logic to update the company status in the database and update UAT collection
     db = connect_mongo()
     if db is None:
         raise ValueError("Database connection error.")
 
-    queue_coll = db[COMPANIES_QUEUE_COLLECTION]
     docs_coll = db[PUBLIC_DOCUMENTS_COLLECTION]
     
-    company_doc_coll = [ db[COMPANIES_UAT_COLLECTION] , db[COMPANIES_PROD_COLLECTION] if PROD_MODE else db[COMPANIES_UAT_COLLECTION] ]
-    
     from datetime import datetime, date, timezone
     current_timestamp = datetime.now(timezone.utc)  # Get the current UTC timestamp
 
@@ -405,21 +849,35 @@ def update_company(company_id, processed=False, status="success"):
         # Count number of documents in PUBLIC_DOCUMENTS_COLLECTION for this company_id
         num_filings = docs_coll.count_documents({"company_id": company_id})
 
-        # Update queue collection
-        result = queue_coll.update_one(
-            {"company_id": company_id},
-            {"$set": {
-                "processed": processed,
-                "status": status,
-                "updated_at": current_timestamp,
-                "num_filings": int(num_filings)
-            }}
-        )
-        if result.matched_count > 0:
+        if status == "error":
+            # Failures count towards the retry budget: write pending updates first, then record atomically
+            flush_company_updates()
+            record_company_failure(company_id, error=error, num_filings=num_filings)
             print(f"Updated company {company_id} in queue to status '{status}'")
-        else:
-            print(f"No company found with company_id {company_id} in queue.")
             return
+
+        queue_fields = {
+            "processed": processed,
+            "status": status,
+            "updated_at": current_timestamp,
+            "num_filings": int(num_filings)
+        }
+        if status == "success":
+            # A successful run clears the retry state
+            queue_fields.update({"attempts": 0, "next_attempt_at": None})
+
+        if status in STATUS_CRITICAL:
+            # Written now, after the pending updates: the caller moves on once the status is persisted
+            if not flush_company_updates():
+                print(f"Some pending updates could not be written before company {company_id} status '{status}'.")
+            result = db[COMPANIES_QUEUE_COLLECTION].update_one({"company_id": company_id}, {"$set": queue_fields})
+            if result.matched_count == 0:
+                print(f"No company found with company_id {company_id} in queue.")
+                return
+        else:
+            # Update queue collection (through the write-behind channel)
+            enqueue_company_update(COMPANIES_QUEUE_COLLECTION, company_id, {"$set": queue_fields})
+        print(f"Updated company {company_id} in queue to status '{status}'")
         
         if ( status != "success" ):
             # If not successful, skip updating UAT/PROD collections
@@ -465,62 +923,37 @@ def update_company(company_id, processed=False, status="success"):
             s3_path = "/".join(s3_path.split('/')[:3]) + "/"
 
         # Update UAT/PROD company collection: set processed and latest_filing_date (and updated_at)
-        for coll in company_doc_coll:
-            company_doc_result = coll.update_one(
-            {"company_id": company_id},
+        # 'success' is status-critical: wait until UAT/PROD are written
+        fan_out_company_update(
+            company_id,
             {"$set": {
                 "processed": processed,
                 "latest_filing_date": latest_filing_date_str,
                 "updated_at": current_timestamp,
                 "s3_path": s3_path,
                 "num_filings": int(num_filings)
-            }}
+            }},
         )
-        if company_doc_result.matched_count > 0:
-            print(f"Updated company_id {company_id} in UAT/PROD collection: processed={processed}, latest_filing_date={latest_filing_date_str}.")
-            print ("#" * 80)
-        else:
-            print(f"No company found with company_id {company_id} in UAT collection.")
+        if not flush_company_updates():
+            raise RuntimeError("UAT/PROD updates could not be written")
+        print(f"Updated company_id {company_id} in UAT/PROD collection: processed={processed}, latest_filing_date={latest_filing_date_str}.")
+        print ("#" * 80)
 
     except Exception as e:
         print(f"Error updating company status for company_id {company_id}: {e}")
         
 def add_company_name(company_id, company_name):
     # Implement the logic to add company_name for the company in the queue collection
-    db = connect_mongo()
-    if db is None:
-        raise ValueError("Database connection error.")
-
-    queue_coll = db[COMPANIES_QUEUE_COLLECTION]
     try:
-        # Update queue collection
-        result = queue_coll.update_one(
-            {"company_id": company_id},
+        # Update queue and prod/uat collections (through the write-behind channel)
+        fan_out_company_update(
+            company_id,
             {"$set": {
                 "name": company_name,
                 "updated_at": datetime.now(timezone.utc)
-            }}
+            }},
+            include_queue=True,
         )
-        if result.matched_count > 0:
-            #print(f"Added/Updated company_name for company_id {company_id} in queue to '{company_name}'")
-            pass
-        else:
-            print(f"No company found with company_id {company_id} in queue to add/update name.")
-            
-        #Update prod/uat
-        for coll in [ db[COMPANIES_UAT_COLLECTION] , db[COMPANIES_PROD_COLLECTION] if PROD_MODE else db[COMPANIES_UAT_COLLECTION] ]:
-            company_doc_result = coll.update_one(
-                {"company_id": company_id},
-                {"$set": {
-                    "name": company_name,
-                    "updated_at": datetime.now(timezone.utc)
-                }}
-            )
-            if company_doc_result.matched_count > 0:
-                #print(f"Added/Updated company_name for company_id {company_id} in {coll.name} to '{company_name}'")
-                pass
-            else:
-                print(f"No company found with company_id {company_id} in {coll.name} to add/update name.")
         
     except Exception as e:
         print(f"Error adding/updating company name for company_id {company_id}: {e}")
@@ -529,98 +962,129 @@ def update_company_metadata(company_id, metadata):
     """
     Update the company document in UAT/PROD collection by appending metadata,
     and set processed_company_metadata=True in the queue collection.
+    Updates go through the write-behind channel; call flush_company_updates()
+    when they must be visible to readers.
     """
-    db = connect_mongo()
-    if db is None:
-        raise ValueError("Database connection error.")
-
-    # Choose UAT and PROD collections
-    collections = [db[COMPANIES_UAT_COLLECTION]]
-    if PROD_MODE:
-        collections.append(db[COMPANIES_PROD_COLLECTION])
-
     # Update metadata in UAT/PROD collections
-    for coll in collections:
-        result = coll.update_one(
-            {"company_id": company_id},
-            {"$set": {"metadata": metadata}}
-        )
-        if result.matched_count > 0:
-            #print(f"Appended metadata to company_id {company_id} in {coll.name}.")
-            pass
-        else:
-            print(f"No company found with company_id {company_id} in {coll.name}.")
+    fan_out_company_update(company_id, {"$set": {"metadata": metadata}})
 
     # Update processed_company_metadata in queue collection
-    queue_coll = db[COMPANIES_QUEUE_COLLECTION]
     from datetime import datetime, timezone
 
-    queue_result = queue_coll.update_one(
-        {"company_id": company_id},
+    enqueue_company_update(
+        COMPANIES_QUEUE_COLLECTION,
+        company_id,
         {"$set": {
             "processed_company_metadata": True,
             "metadata_updated_at": datetime.now(timezone.utc)
         }}
     )
-    if queue_result.matched_count > 0:
-        #print(f"Set processed_company_metadata=True for company_id {company_id} in queue.")
-        pass
-    else:
-        print(f"No company found with company_id {company_id} in queue.")
         
         
         
 
 def add_ticker_info(company_id, ticker_code, ticker_name):
     # Add/update ticker_code and ticker_name for the company in queue and UAT/PROD collections
-    db = connect_mongo()
-    if db is None:
-        raise ValueError("Database connection error.")
-
     updated_at = datetime.now(timezone.utc)
 
     # Update queue collection so the queue reflects ticker info
-    queue_coll = db[COMPANIES_QUEUE_COLLECTION]
     try:
-        qres = queue_coll.update_one(
-            {"company_id": company_id},
+        enqueue_company_update(
+            COMPANIES_QUEUE_COLLECTION,
+            company_id,
             {"$set": {"metadata_updated_at": updated_at}}
         )
-        if qres.matched_count > 0:
-            print(f"Added/Updated metadata_updated_at for company_id {company_id}")
-        else:
-            print(f"No company found with company_id {company_id} in queue to add/update ticker.")
     except Exception as e:
         print(f"Error updating ticker in queue for company_id {company_id}: {e}")
 
     # Update UAT and optionally PROD collections
-    for coll in [db[COMPANIES_UAT_COLLECTION], db[COMPANIES_PROD_COLLECTION] if PROD_MODE else db[COMPANIES_UAT_COLLECTION]]:
-        try:
-            res = coll.update_one(
-                {"company_id": company_id},
-                {"$set": {
-                    "metadata.code": ticker_code,
-                    "metadata.trading_name": ticker_name
-                }}
+    try:
+        targets = fan_out_company_update(
+            company_id,
+            {"$set": {
+                "metadata.code": ticker_code,
+                "metadata.trading_name": ticker_name
+            }}
+        )
+        print(f"Queued ticker for company_id {company_id} in {', '.join(targets)}: {ticker_code} / {ticker_name}")
+    except Exception as e:
+        print(f"Error updating ticker in UAT/PROD for company_id {company_id}: {e}")
+
+
+def apply_ticker_info_bulk(matches):
+    """Write ticker code / trading name for many companies at once.
+
+    `matches` is an iterable of (company_id, ticker_code, ticker_name). Current values
+    are read with one projected query per collection and only differing companies
+    are written, as one bulk_write per collection. Returns {collection: (result, error)}
+    like fan_out_company_write, plus the queue collection.
+    """
+    from pymongo import UpdateOne
+
+    wanted = {}
+    for company_id, ticker_code, ticker_name in matches:
+        if company_id is not None and ticker_code:
+            wanted[company_id] = (ticker_code, ticker_name)
+    if not wanted:
+        print("No ticker info to apply.")
+        return {}
+
+    updated_at = datetime.now(timezone.utc)
+    changed_ids = set()
+    changed_lock = threading.Lock()
+
+    def _apply(collection):
+        current, no_metadata = {}, set()
+        for doc in collection.find({"company_id": {"$in": list(wanted)}},
+                                   {"_id": 0, "company_id": 1, "metadata.code": 1, "metadata.trading_name": 1}):
+            metadata = doc.get("metadata")
+            if not isinstance(metadata, dict):
+                no_metadata.add(doc.get("company_id"))  # dotted $set cannot create fields inside a null metadata
+                metadata = {}
+            current[doc.get("company_id")] = (metadata.get("code"), metadata.get("trading_name"))
+        to_update = [company_id for company_id, value in wanted.items()
+                     if company_id in current and current[company_id] != value]
+        missing = len(wanted) - len(current)
+        if not to_update:
+            return f"0 updated, {len(current)} already up to date, {missing} not found"
+        with changed_lock:
+            changed_ids.update(to_update)
+        ops = [UpdateOne({"company_id": company_id},
+                         {"$set": {"metadata": {"code": wanted[company_id][0], "trading_name": wanted[company_id][1]}}}
+                         if company_id in no_metadata else
+                         {"$set": {"metadata.code": wanted[company_id][0], "metadata.trading_name": wanted[company_id][1]}})
+               for company_id in to_update]
+        result = collection.bulk_write(ops, ordered=False)
+        return f"{result.modified_count} updated, {len(current) - len(ops)} already up to date, {missing} not found"
+
+    # Flush pending write-behind updates first so they cannot overwrite these values afterwards
+    if not flush_company_updates():
+        print("Some pending company updates could not be written before applying ticker info.")
+    results = fan_out_company_write(_apply)
+
+    if changed_ids:
+        def _touch_queue(collection):
+            result = collection.bulk_write(
+                [UpdateOne({"company_id": company_id}, {"$set": {"metadata_updated_at": updated_at}})
+                 for company_id in changed_ids],
+                ordered=False,
             )
-            if res.matched_count > 0:
-                print(f"Added/Updated ticker for company_id {company_id} in {coll.name}: {ticker_code} / {ticker_name}")
-            else:
-                print(f"No company found with company_id {company_id} in {coll.name} to add/update ticker.")
-        except Exception as e:
-            print(f"Error updating ticker in {coll.name} for company_id {company_id}: {e}")
+            return f"{result.modified_count} marked metadata_updated_at"
+        results.update(fan_out_company_write(_touch_queue, [COMPANIES_QUEUE_COLLECTION]))
 
+    report_fan_out(results, "apply ticker info")
+    return results
 
     
     
 
-__all__ = ["db", "connect_mongo", "store_metadata_batch", "get_pending_companies"]
+__all__ = ["db", "connect_mongo", "store_metadata_batch", "get_pending_companies", "enqueue_company_update", "flush_company_updates", "close_company_updates", "apply_ticker_info_bulk"]
 
 
 if __name__ == "__main__":
     
     # Test retrieving pending companies
-    pending_companies = get_pending_companies()
+    pending_companies = list(get_pending_companies())
     print(f"Pending companies: {len(pending_companies)}")
     
     update_company(2995, processed=True, status="success")
@@ -5,24 +5,40 @@ from pathlib import Path
 
 # Adding the 'src' directory to PYTHONPATH to run this file directly
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-print(str(Path(__file__).resolve().parent.parent))
 
 from config.settings import RAW_DATA_DIR
 
 def reset_data_folder():
+    """Delete everything under RAW_DATA_DIR (local store). For selective deletes use utils/raw_gc.py."""
     data_folder = RAW_DATA_DIR
     print(f"Resetting data folder at: {data_folder}")
     data_folder = Path(data_folder)
     if data_folder.exists() and data_folder.is_dir():
+        from config.settings import RAW_MANIFEST_PATH
+        manifest_folder = Path(RAW_MANIFEST_PATH).parent
         for item in data_folder.iterdir():
+            if item == manifest_folder:
+                continue  # Open by this process: cleared below instead
             if item.is_file() or item.is_symlink():
                 item.unlink()
             elif item.is_dir():
                 shutil.rmtree(item)
         print(f"Contents of the folder '{data_folder}' have been deleted.")
+        from utils.file_writer import forget_directories
+        forget_directories()
+        from utils.manifest import get_manifest
+        manifest = get_manifest()
+        if manifest is not None:
+            manifest.clear()  # Nothing is stored any more: nothing may be skipped on the next run
     else:
         print(f"The folder '{data_folder}' does not exist.")
 
-# Example usage:
-reset_data_folder()
-
+if __name__ == "__main__":
+    # Only when run as a script: importing this module must never wipe the raw store
+    import argparse
+    parser = argparse.ArgumentParser(description="Delete the whole raw store (see utils/raw_gc.py for selective deletes).")
+    parser.add_argument("--yes", action="store_true", help="confirm the deletion of everything under RAW_DATA_DIR")
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error(f"this deletes everything under {RAW_DATA_DIR}: pass --yes to confirm")
+    reset_data_folder()
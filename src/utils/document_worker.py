@@ -3,11 +3,19 @@ from datetime import datetime, timezone
 import os
 
 
+def attachment_filename(att_url: str) -> str:
+    """Local file name for an attachment URL (as returned by get_attachments_url_list)."""
+    att_filename = "_".join(att_url.split("/")[-1].split("_")[1:])
+    for x, y in [("%20", "_"), (":", "_"), ("?", "_"), ("&", "_"), ("=", "_")]:
+        att_filename = att_filename.replace(x, y)
+    return att_filename
+
+
 def process_document(document: dict, company_id: str) -> bool:
     """Process a single document: fetch its web page, store it, and download attachments."""
     try:
         # Importa funzioni necessarie localmente per evitare dipendenze circolari
-        from utils.scraping_utils import store_web_page, get_attachments_url_list, download_attachment, store_metadata_debug, get_web_page, get_document_metadata
+        from utils.scraping_utils import store_web_page, download_attachment, store_metadata_debug, get_web_page, get_document_metadata
 
         # Build document metadata dictionary
         metadata = get_document_metadata(document)
@@ -17,8 +25,6 @@ def process_document(document: dict, company_id: str) -> bool:
         if not url:
             raise ValueError("Document URL is missing")
 
-        wp = get_web_page(url)
-
         company_name = metadata.get("company_name")
         company_name_no_space = "_".join(company_name.replace(" ", "_").split())
         category_name = metadata.get("category_name").upper()
@@ -50,25 +56,35 @@ def process_document(document: dict, company_id: str) -> bool:
         from utils.path_utils import convert_path_to_linux_format
         metadata["file_path"] = convert_path_to_linux_format(relative_path)
 
-        try:
-            store_web_page(wp, wp_path)
-        except Exception as e:
-            print(f"Error storing web page: {e}")   
-            return
+        # Announcement pages do not change: a page recorded in the manifest is read back instead of fetched
+        from utils.manifest import already_stored
+        wp = None
+        if already_stored(wp_path):
+            from utils.page_compression import read_page
+            try:
+                wp = read_page(wp_path)
+            except FileNotFoundError:
+                wp = None
+        if wp is None:
+            wp = get_web_page(url)
+            try:
+                store_web_page(wp, wp_path)
+            except Exception as e:
+                print(f"Error storing web page: {e}")   
+                return
 
         filing_date_str_with_scores = filing_date.strftime("%Y-%m-%d")
         metadata["file_name"] = f"{category_name} - {company_name} [{filing_date_str_with_scores}]"
 
-        att_list = get_attachments_url_list(wp)
+        # Parsing runs in the CPU pool; this thread only waits for the URL list
+        from utils.parse_pool import parse_attachments
+        att_list = parse_attachments(wp)
         import concurrent.futures
 
         if att_list and len(att_list) > 0:
             def process_attachment(att):
                 try:
-                    att_filename = "_".join(att.split("/")[-1].split("_")[1:])
-                    for x, y in [("%20", "_"), (":", "_"), ("?", "_"), ("&", "_"), ("=", "_")]:
-                        att_filename = att_filename.replace(x, y)
-                    att_path = os.path.join(document_folder, att_filename)
+                    att_path = os.path.join(document_folder, attachment_filename(att))
                     download_attachment(att, att_path)
 
                     relative_att_path = os.path.relpath(att_path, RAW_DATA_DIR)
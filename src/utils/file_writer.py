@@ -0,0 +1,131 @@
+"""Dedicated executor for raw-store writes, and a cache of created directories.
+
+Download threads hand finished pages (announcement pages, corporate
+information pages, metadata dumps) to a small pool of writer threads instead
+of writing them themselves, and go back to the network. The queue is bounded
+(FILE_WRITE_QUEUE_SIZE writes): when the disk falls behind, `submit` blocks
+and the downloads slow down instead of piling pages up in memory. `flush()`
+is a barrier: it returns once every write submitted before the call is done.
+
+Attachments are not queued: they are streamed from the HTTP response to the
+backend, so their write is the download itself.
+
+`ensure_directory` replaces `os.makedirs(..., exist_ok=True)` in the local
+backends: directories created (or found) once are remembered, so the
+following writes in the same document folder do no metadata syscall at all,
+and a new folder whose parent is known costs a single `mkdir`.
+"""
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Directories known to exist, most recently used last
+_directories: "OrderedDict[str, None]" = OrderedDict()
+_directories_lock = threading.Lock()
+
+
+def _directory_known(path: str) -> bool:
+    with _directories_lock:
+        if path in _directories:
+            _directories.move_to_end(path)
+            return True
+    return False
+
+
+def _remember_directory(path: str) -> None:
+    from config.settings import DIRECTORY_CACHE_SIZE
+    with _directories_lock:
+        _directories[path] = None
+        _directories.move_to_end(path)
+        while len(_directories) > DIRECTORY_CACHE_SIZE:
+            _directories.popitem(last=False)
+
+
+def ensure_directory(path: str) -> None:
+    """`os.makedirs(path, exist_ok=True)`, skipped for directories already created by this process."""
+    if not path or _directory_known(path):
+        return
+    parent = os.path.dirname(path)
+    if parent and parent != path and _directory_known(parent):
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            forget_directories(parent)  # Removed since it was cached
+            os.makedirs(path, exist_ok=True)
+    else:
+        os.makedirs(path, exist_ok=True)
+        if parent and parent != path:
+            _remember_directory(parent)  # Siblings created next (other document folders) need a single mkdir
+    _remember_directory(path)
+
+
+def forget_directories(prefix: Optional[str] = None) -> None:
+    """Drop cached directories (all, or those under `prefix`) after they were deleted."""
+    with _directories_lock:
+        if prefix is None:
+            _directories.clear()
+            return
+        prefix = prefix.rstrip(os.sep)
+        for path in [p for p in _directories if p == prefix or p.startswith(prefix + os.sep)]:
+            del _directories[path]
+
+
+class FileWriteExecutor:
+    """Writer threads consuming a bounded queue of write callables."""
+
+    def __init__(self, workers: int = 2, max_pending: int = 256):
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, max_pending))
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.errors = 0
+        self._threads = [threading.Thread(target=self._run, name=f"file-writer-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable, *args) -> None:
+        """Queue `fn(*args)`; blocks while the queue is full."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("File writer is closed")
+            self._pending += 1
+        self._queue.put((fn, args))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every write submitted before this call is done."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish the queued writes and stop the writer threads."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                print(f"File writer: error in {getattr(fn, '__name__', fn)}: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
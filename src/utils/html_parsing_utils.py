@@ -0,0 +1,114 @@
+"""Lightweight HTML parsing helpers shared by the scrapers.
+
+This module only depends on BeautifulSoup and the settings, so it can be
+imported (e.g. by worker processes) without opening a MongoDB connection.
+"""
+
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from config.settings import HTML_PARSER, ATTACHMENTS_BASE_URL
+
+
+def resolve_html_parser(parser: str = HTML_PARSER) -> str:
+    """Return the BeautifulSoup parser to use ("auto" prefers lxml when installed)."""
+    if parser != "auto":
+        return parser
+    try:
+        import lxml  # noqa: F401 - optional dependency
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+# Only the attachment list is needed from an announcement page: parse just that subtree
+ATTACHMENT_LIST_CLASS = "announcement-attachment-list"
+
+
+def _has_attachment_list_class(value) -> bool:
+    # At parse time the class attribute may still be the raw string ("a b"), so split it
+    # ourselves to match the same elements as find("dl", class_=...) on a full tree.
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return ATTACHMENT_LIST_CLASS in classes or value == ATTACHMENT_LIST_CLASS
+
+
+_ATTACHMENT_LIST_STRAINER = SoupStrainer("dl", class_=_has_attachment_list_class)
+
+
+_HTML_PARSER = resolve_html_parser()
+
+
+def _extract_attachment_urls(attachment_list, html_content: str) -> Optional[list]:
+    """Build the attachment URL list from a parsed `dl.announcement-attachment-list` element."""
+    if not attachment_list:
+        #print("No attachment list found in the HTML content.")
+        return None
+
+    attachment_links = attachment_list.find_all("a", href=True)
+    attachments = []
+
+    for link in attachment_links:
+        attachment_url = link["href"]
+        # Skip links that use JavaScript popups or are not direct file links
+        if "JavaScript:window.open" in link.get("onClick", "") or attachment_url.startswith("#") or "#" in attachment_url:
+            continue
+        # Check if the URL is relative and prepend the base URL if necessary
+        if attachment_url.startswith("/"):
+            attachment_url = f"{ATTACHMENTS_BASE_URL}{attachment_url}"
+
+        # Format the URL to match the desired format
+        formatted_url = attachment_url.replace("/FileOpen/", "").replace("?App=Announcement&FileID=", "_")
+        attachments.append(formatted_url)
+
+    if not attachments:
+        #print("No attachment links found in the HTML content.")
+        return None
+
+    # Check if the HTML content contains the specific string
+    if "if you are unable to view the above file, please click the link below" in html_content:
+        if len(attachments) == 2:
+            attachments.pop(0)
+    #print(f"Attachment URLs extracted: {len(attachments)}")
+    
+    ### DEBUGGING OUTPUT
+    #for url in attachments:
+    #    print(f"Attachment URL: {url}")
+    ###
+    
+    return attachments
+
+
+def get_attachments_url_list(html_content: Optional[str]) -> Optional[list]:
+    """Fetch attachment URLs from the provided HTML content and return them in the desired format.
+
+    Only the `dl.announcement-attachment-list` subtree is parsed (SoupStrainer), and pages
+    that do not mention the list class are not parsed at all.
+    """
+    try:
+        if not html_content:
+            print("No HTML content provided to extract the attachment URL.")
+            raise Exception("HTML content is required")
+
+        # Cheap pre-check: without the class name there cannot be an attachment list
+        if ATTACHMENT_LIST_CLASS not in html_content:
+            return None
+
+        soup = BeautifulSoup(html_content, _HTML_PARSER, parse_only=_ATTACHMENT_LIST_STRAINER)
+        attachment_list = soup.find("dl", class_=ATTACHMENT_LIST_CLASS)
+        return _extract_attachment_urls(attachment_list, html_content)
+    
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return None
+
+
+def _get_attachments_url_list_full_parse(html_content: Optional[str]) -> Optional[list]:
+    """Reference implementation: full-document parse. Kept for parity checks."""
+    if not html_content:
+        return None
+    soup = BeautifulSoup(html_content, "html.parser")
+    attachment_list = soup.find("dl", class_=ATTACHMENT_LIST_CLASS)
+    return _extract_attachment_urls(attachment_list, html_content)
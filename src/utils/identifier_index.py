@@ -0,0 +1,111 @@
+"""Exact identifier index: ISIN / stock code / IBM code -> company_id.
+
+Built from two sources already in MongoDB:
+  - company metadata: `metadata.isin_code` (corporate information page);
+  - announcement issuers stored in the files collection: each announcement
+    downloaded for a company carries `issuers[].isin_code/stock_code/ibm_code`.
+
+Announcements can name several issuers, so issuer identifiers are attributed
+by weighted vote (1/len(issuers) per announcement) and only kept when one
+company clearly wins. A stock code is also resolved through the ISIN it was
+announced with when its own vote is inconclusive.
+
+`metadata.code` is not used: it is the ticker code written by earlier name
+matching runs, so feeding it back would turn past fuzzy matches (wrong ones
+included) into "identifier" matches.
+"""
+
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+ISSUER_KEYS = ("isin_code", "stock_code", "ibm_code")
+MIN_VOTE_SHARE = 0.6  # Share of the votes the winning company needs for an issuer identifier
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip().upper()
+    return value or None
+
+
+class IdentifierIndex:
+    def __init__(self, min_vote_share: float = MIN_VOTE_SHARE):
+        self.min_vote_share = min_vote_share
+        self.by_key: Dict[str, Dict[str, Hashable]] = {key: {} for key in ISSUER_KEYS}
+        # identifier kind -> identifier -> company_id -> votes
+        self._votes: Dict[str, Dict[str, Dict[Hashable, float]]] = {key: {} for key in ISSUER_KEYS}
+        self._stock_to_isin: Dict[str, Dict[str, float]] = {}
+        self._metadata: Dict[str, Dict[str, Hashable]] = {"isin_code": {}}
+
+    def add_company_metadata(self, company_id, metadata: dict) -> None:
+        isin = _clean((metadata or {}).get("isin_code"))
+        if isin:
+            self._metadata["isin_code"][isin] = company_id
+
+    def add_announcement_issuers(self, company_id, issuers: Iterable[dict]) -> None:
+        issuers = [i for i in (issuers or []) if isinstance(i, dict)]
+        if not issuers or company_id is None:
+            return
+        weight = 1.0 / len(issuers)
+        for issuer in issuers:
+            for key in ISSUER_KEYS:
+                value = _clean(issuer.get(key))
+                if value:
+                    votes = self._votes[key].setdefault(value, {})
+                    votes[company_id] = votes.get(company_id, 0.0) + weight
+            stock, isin = _clean(issuer.get("stock_code")), _clean(issuer.get("isin_code"))
+            if stock and isin:
+                isins = self._stock_to_isin.setdefault(stock, {})
+                isins[isin] = isins.get(isin, 0.0) + weight
+
+    def _winner(self, votes: Dict[Hashable, float]) -> Optional[Hashable]:
+        total = sum(votes.values())
+        company_id, best = max(votes.items(), key=lambda kv: kv[1])
+        return company_id if total and best / total >= self.min_vote_share else None
+
+    def build(self) -> "IdentifierIndex":
+        """Resolve the votes; metadata identifiers take precedence over announcement votes."""
+        for key in ISSUER_KEYS:
+            resolved = {}
+            for value, votes in self._votes[key].items():
+                winner = self._winner(votes)
+                if winner is not None:
+                    resolved[value] = winner
+            resolved.update(self._metadata.get(key, {}))
+            self.by_key[key] = resolved
+        # Stock codes whose own vote was inconclusive: go through their most announced ISIN
+        for stock, isins in self._stock_to_isin.items():
+            if stock in self.by_key["stock_code"]:
+                continue
+            isin = self._winner(isins)
+            if isin and isin in self.by_key["isin_code"]:
+                self.by_key["stock_code"][stock] = self.by_key["isin_code"][isin]
+        return self
+
+    def resolve(self, identifier) -> Tuple[Optional[Hashable], Optional[str]]:
+        """(company_id, identifier kind) for a ticker / ISIN / IBM code, or (None, None)."""
+        value = _clean(identifier)
+        if not value:
+            return None, None
+        for key in ("stock_code", "isin_code", "ibm_code"):
+            company_id = self.by_key[key].get(value)
+            if company_id is not None:
+                return company_id, key
+        return None, None
+
+    def sizes(self) -> Dict[str, int]:
+        return {key: len(values) for key, values in self.by_key.items()}
+
+
+def build_identifier_index() -> IdentifierIndex:
+    """Identifier index from company ISINs and the issuers stored with announcements."""
+    from utils.db_utils import iter_company_identifiers, iter_file_issuers
+
+    index = IdentifierIndex()
+    for doc in iter_company_identifiers():
+        index.add_company_metadata(doc.get("company_id"), doc.get("metadata"))
+    for doc in iter_file_issuers():
+        index.add_announcement_issuers(doc.get("company_id"), doc.get("issuers"))
+    index.build()
+    print(f"Identifier index: {index.sizes()}")
+    return index
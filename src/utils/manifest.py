@@ -0,0 +1,282 @@
+"""Manifest of the objects stored in the raw store (SQLite).
+
+store_web_page and download_attachment record every object they write: its
+logical path relative to RAW_DATA_DIR (`file_path` / `supporting_file_paths`
+in MongoDB, without the leading slash), size, SHA-256 of the logical content and
+time. Before downloading, the workers ask the manifest instead of the
+network or the filesystem, so a resumed run only fetches what is missing.
+
+The manifest is a local SQLite file (WAL, one connection shared by the
+download threads under a lock) whatever the storage backend: inside a local
+RAW_DATA_DIR (so the two are deleted together), under data/ for an S3 store.
+It records the store root it was built for and is cleared when RAW_DATA_DIR
+changes, and a skip is only taken when the object still exists. It is a cache:
+`--rebuild` recreates it from the raw store, `--scrub` checks stored objects
+against it, and `--reconcile` compares it with the files collection.
+
+  python src/utils/manifest.py --rebuild
+  python src/utils/manifest.py --scrub [--limit N]
+  python src/utils/manifest.py --reconcile
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    path      TEXT PRIMARY KEY,  -- logical path relative to RAW_DATA_DIR, "/" separated
+    size      INTEGER NOT NULL,  -- bytes of the logical content
+    sha256    TEXT NOT NULL,
+    stored_at REAL NOT NULL      -- unix time
+)
+"""
+META_SCHEMA = "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+LOOKUP_CHUNK = 500  # Paths per IN (...) query
+
+
+def relative_path(path: str) -> str:
+    """Manifest key of an absolute raw-store path: "/"-separated, relative to RAW_DATA_DIR, no leading slash.
+
+    MongoDB stores `file_path` with a leading slash and `supporting_file_paths` without one.
+    """
+    from config.settings import RAW_DATA_DIR
+    from utils.path_utils import convert_path_to_linux_format
+    return convert_path_to_linux_format(os.path.relpath(path, RAW_DATA_DIR)).lstrip("/")
+
+
+class HashingReader(io.RawIOBase):
+    """Reader over a stream computing the size and SHA-256 of what goes through it."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size) if size is not None and size >= 0 else self._stream.read()
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class Manifest:
+    def __init__(self, path: str, root: Optional[str] = None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: no fsync per recorded object
+        self._conn.execute(SCHEMA)
+        self._conn.execute(META_SCHEMA)
+        if root is not None:
+            self._check_root(root)
+
+    def _check_root(self, root: str) -> None:
+        """The manifest describes one raw store: records made for another RAW_DATA_DIR are dropped."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if row is not None and row[0] != root:
+            print(f"Manifest {self.path} was built for {row[0]}, not {root}: clearing it.")
+            self.clear()
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (root,))
+
+    def record(self, path: str, size: int, sha256: str, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                               (relative_path(path), size, sha256, stored_at or time.time()))
+
+    def record_bytes(self, path: str, data: bytes) -> None:
+        self.record(path, len(data), hashlib.sha256(data).hexdigest())
+
+    def get(self, path: str) -> Optional[Tuple[int, str, float]]:
+        """(size, sha256, stored_at) of a recorded object, or None."""
+        with self._lock:
+            return self._conn.execute("SELECT size, sha256, stored_at FROM objects WHERE path = ?",
+                                      (relative_path(path),)).fetchone()
+
+    def has(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def existing(self, relative_paths: Iterable[str]) -> set:
+        """The subset of `relative_paths` (manifest keys) that is recorded."""
+        relative_paths = list(relative_paths)
+        found = set()
+        with self._lock:
+            for start in range(0, len(relative_paths), LOOKUP_CHUNK):
+                chunk = relative_paths[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT path FROM objects WHERE path IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def forget(self, relative_paths: Iterable[str]) -> int:
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM objects WHERE path = ?", ((p,) for p in relative_paths))
+            return cursor.rowcount
+
+    def iter_objects(self, prefix: str = "") -> Iterator[Tuple[str, int, str, float]]:
+        """(path, size, sha256, stored_at) rows, optionally under a relative path prefix."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, sha256, stored_at FROM objects WHERE path >= ? AND path < ? ORDER BY path",
+                (prefix, prefix + "\uffff")).fetchall()
+        return iter(rows)
+
+    def latest_stored_at(self, prefix: str) -> Optional[float]:
+        """Most recent `stored_at` of the objects under a relative path prefix, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(stored_at) FROM objects WHERE path >= ? AND path < ?",
+                                     (prefix, prefix + "\uffff")).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {"objects": count, "bytes": size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM objects")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> Optional[Manifest]:
+    """Shared manifest, or None when RAW_MANIFEST_ENABLED is off."""
+    global _manifest
+    from config.settings import RAW_MANIFEST_ENABLED, RAW_MANIFEST_PATH, RAW_DATA_DIR
+    if not RAW_MANIFEST_ENABLED:
+        return None
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = Manifest(RAW_MANIFEST_PATH, root=RAW_DATA_DIR)
+    return _manifest
+
+
+def already_stored(path: str) -> bool:
+    """True when the manifest records `path`, the object is still in the store and MANIFEST_SKIP_EXISTING is on.
+
+    The existence check (one stat or HEAD) catches a store wiped or recreated behind
+    the manifest's back; the stale record is dropped so the object is downloaded again.
+    """
+    from config.settings import MANIFEST_SKIP_EXISTING
+    manifest = get_manifest()
+    if not (MANIFEST_SKIP_EXISTING and manifest is not None and manifest.has(path)):
+        return False
+    from utils.page_compression import is_page, page_exists
+    from utils.storage import get_storage
+    if page_exists(path) if is_page(path) else get_storage().exists(path):
+        return True
+    manifest.forget([relative_path(path)])
+    return False
+
+
+def rebuild(manifest: Manifest) -> dict:
+    """Record every object of the raw store (one full walk; afterwards the writers keep it current)."""
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    from utils.page_compression import iter_pages, read_page, is_page
+    from utils.storage import get_storage
+    storage = get_storage()
+    stats = {"pages": 0, "attachments": 0}
+    root = os.path.join(RAW_DATA_DIR, PLATFORM)
+    manifest.clear()
+    for path in storage.list_files(root):
+        if is_page(path):
+            continue
+        manifest.record_bytes(path, storage.read_bytes(path))
+        stats["attachments"] += 1
+    for path in iter_pages(root):
+        manifest.record_bytes(path, read_page(path).encode("utf-8"))
+        stats["pages"] += 1
+    print(f"Manifest rebuilt: {stats} -> {manifest.stats()}")
+    return stats
+
+
+def scrub(manifest: Manifest, limit: int = 0) -> dict:
+    """Re-read recorded objects and compare size and hash; lists missing and corrupted ones."""
+    from config.settings import RAW_DATA_DIR
+    from utils.page_compression import is_page, read_page
+    from utils.storage import get_storage
+    storage = get_storage()
+    stats = {"checked": 0, "missing": [], "corrupted": []}
+    for path, size, sha256, _ in manifest.iter_objects():
+        full_path = os.path.join(RAW_DATA_DIR, *path.split("/"))
+        try:
+            data = read_page(full_path).encode("utf-8") if is_page(path) else storage.read_bytes(full_path)
+        except FileNotFoundError:
+            stats["missing"].append(path)
+            continue
+        stats["checked"] += 1
+        if len(data) != size or hashlib.sha256(data).hexdigest() != sha256:
+            stats["corrupted"].append(path)
+        if limit and stats["checked"] >= limit:
+            break
+    print(f"Manifest scrub: {stats['checked']} checked, {len(stats['missing'])} missing, "
+          f"{len(stats['corrupted'])} corrupted")
+    for path in (stats["missing"] + stats["corrupted"])[:50]:
+        print(f"  - {path}")
+    return stats
+
+
+def reconcile(manifest: Manifest) -> dict:
+    """Compare the files collection with the manifest: referenced but not stored, stored but not referenced."""
+    from utils.db_utils import iter_stored_files
+    referenced = set()
+    for doc in iter_stored_files():
+        for path in [doc.get("file_path")] + list(doc.get("supporting_file_paths") or []):
+            if path:
+                referenced.add(path.lstrip("/"))
+    stored = {path for path, _, _, _ in manifest.iter_objects()}
+    result = {"referenced": len(referenced), "stored": len(stored),
+              "missing": sorted(referenced - stored), "unreferenced": sorted(stored - referenced)}
+    print(f"Manifest reconcile: {len(referenced)} referenced, {len(stored)} stored, "
+          f"{len(result['missing'])} referenced but not stored, {len(result['unreferenced'])} stored but not referenced")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Raw store manifest tools.")
+    parser.add_argument("--rebuild", action="store_true", help="record every object of the raw store")
+    parser.add_argument("--scrub", action="store_true", help="check stored objects against their size and hash")
+    parser.add_argument("--reconcile", action="store_true", help="compare with the files collection")
+    parser.add_argument("--limit", type=int, default=0, help="max objects checked by --scrub")
+    args = parser.parse_args()
+
+    manifest = get_manifest()
+    if manifest is None:
+        sys.exit("RAW_MANIFEST_ENABLED is off")
+    if args.rebuild:
+        rebuild(manifest)
+    if args.scrub:
+        scrub(manifest, limit=args.limit)
+    if args.reconcile:
+        reconcile(manifest)
+    print(f"Manifest {manifest.path}: {manifest.stats()}")
@@ -0,0 +1,123 @@
+"""Persistent store of ticker -> company match scores.
+
+Raw pair scores (partial_ratio of the normalized keys, plus whether the keys
+are identical) are kept per normalized ticker name, so a run only scores the
+pairs involving new or renamed tickers/companies. The count-score rule is
+applied when the scores are read, because it depends on the whole company list.
+
+For each ticker name the store keeps every candidate with a raw score of 100
+and the best `keep` other candidates (ties included): enough to rebuild both
+the best match and the top candidates of the optimal assignment. When one of
+the kept candidates disappears the ticker name is rescored in full.
+
+A different `version` (matching algorithm / tokenizer) discards the stored
+scores.
+"""
+
+import json
+import os
+from typing import Callable, Dict, Hashable, List, Sequence, Tuple
+
+from utils.string_matching_utils import NormalizedName, count_score
+
+Candidate = Tuple[Hashable, int, bool]  # (company_id, raw partial_ratio, identical keys)
+
+
+class MatchStore:
+    def __init__(self, path: str, version: str, keep: int = 5):
+        self.path = path
+        self.version = version
+        self.keep = keep
+        self.companies: Dict[Hashable, str] = {}       # company_id -> normalized key the scores were computed with
+        self.tickers: Dict[str, List[Candidate]] = {}  # normalized ticker key -> kept candidates
+        self.stats = {"scored_pairs": 0, "full_rescore": 0, "partial_rescore": 0, "cached": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except Exception as e:
+            print(f"Match store {self.path} unreadable, starting empty: {e}")
+            return
+        if data.get("version") != self.version:
+            print(f"Match store version {data.get('version')} != {self.version}: rescoring every ticker.")
+            return
+        self.companies = {company_id: key for company_id, key in data.get("companies", [])}
+        self.tickers = {key: [tuple(c) for c in candidates] for key, candidates in data.get("tickers", {}).items()}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "version": self.version,
+                "companies": [[company_id, key] for company_id, key in self.companies.items()],
+                "tickers": {key: [list(c) for c in candidates] for key, candidates in self.tickers.items()},
+            }, fh, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _trim(self, candidates: List[Candidate]) -> List[Candidate]:
+        perfect = [c for c in candidates if c[2] or c[1] == 100]
+        others = sorted((c for c in candidates if not (c[2] or c[1] == 100) and c[1] > 0),
+                        key=lambda c: (-c[1], str(c[0])))
+        if len(others) > self.keep:
+            cutoff = others[self.keep - 1][1]
+            others = [c for c in others if c[1] >= cutoff]
+        return perfect + others
+
+    def sync(self, tickers: Sequence[NormalizedName], companies: Dict[Hashable, NormalizedName],
+             score_fn: Callable[[List[str], List[str]], list]) -> None:
+        """Bring the stored scores up to date for these tickers and companies.
+
+        score_fn(query_keys, candidate_keys) returns the raw partial_ratio matrix.
+        """
+        current = {company_id: normalized.key for company_id, normalized in companies.items()}
+        changed_ids = [cid for cid, key in current.items() if self.companies.get(cid) != key]
+        gone = {cid for cid, key in self.companies.items() if current.get(cid) != key}
+
+        full, partial = [], []
+        for key in dict.fromkeys(t.key for t in tickers):
+            kept = self.tickers.get(key)
+            if kept is None or any(c[0] in gone for c in kept):
+                full.append(key)
+            elif changed_ids:
+                partial.append(key)
+            else:
+                self.stats["cached"] += 1
+
+        all_ids = list(current)
+        for keys, company_ids, stat in ((full, all_ids, "full_rescore"), (partial, changed_ids, "partial_rescore")):
+            if not keys or not company_ids:
+                continue
+            company_keys = [current[cid] for cid in company_ids]
+            scores = score_fn(keys, company_keys)
+            self.stats["scored_pairs"] += len(keys) * len(company_ids)
+            self.stats[stat] += len(keys)
+            for row, key in enumerate(keys):
+                new = [(cid, int(scores[row][col]), key == company_keys[col]) for col, cid in enumerate(company_ids)]
+                base = [] if stat == "full_rescore" else [c for c in self.tickers.get(key, []) if c[0] not in gone]
+                self.tickers[key] = self._trim(base + new)
+
+        # Keep only what the current inputs need
+        wanted = {t.key for t in tickers}
+        self.tickers = {key: candidates for key, candidates in self.tickers.items() if key in wanted}
+        self.companies = current
+
+    def confidences(self, ticker: NormalizedName, count_dict, SINGLE_TOKEN_THRESHOLD) -> List[Tuple[Hashable, float]]:
+        """(company_id, confidence) of the kept candidates, with the 100/count-score rule applied."""
+        entity_score = None
+        result = []
+        for company_id, raw, identical in self.tickers.get(ticker.key, []):
+            if identical:
+                confidence = 100
+            elif raw == 100:
+                if entity_score is None:
+                    entity_score = count_score(ticker, count_dict, SINGLE_TOKEN_THRESHOLD)
+                confidence = 100 if entity_score else raw * 0.5
+            else:
+                confidence = raw
+            result.append((company_id, confidence))
+        return result
@@ -0,0 +1,91 @@
+"""Batched fuzzy scoring of query x candidate name matrices.
+
+`rapidfuzz.process.cdist` computes partial_ratio for a whole block of
+normalized keys in native code across all cores (it releases the GIL, so the
+worker threads run in parallel without pickling the candidate list into a
+process pool). Queries are scored in row blocks to bound memory, and the raw
+scores go through the same rules as get_label_and_confidence_normalized:
+equal keys -> 100, a partial_ratio of 100 -> 100 or 50 depending on the
+count score of the query name, otherwise the rounded partial_ratio.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz as rf_fuzz
+from rapidfuzz.process import cdist
+
+from utils.string_matching_utils import NormalizedName, count_score
+
+QUERY_BLOCK_SIZE = 256  # Rows scored per cdist call (256 x 50k float64 ~ 100MB)
+
+
+def score_block(query_keys: Sequence[str], candidate_keys: Sequence[str], workers: int = -1) -> np.ndarray:
+    """partial_ratio of every (query, candidate) pair, rounded like thefuzz (int(round(score)))."""
+    scores = cdist(query_keys, candidate_keys, scorer=rf_fuzz.partial_ratio, dtype=np.float64, workers=workers)
+    return np.round(scores).astype(np.int16)
+
+
+def confidence_block(queries: Sequence[NormalizedName], candidates: Sequence[NormalizedName],
+                     candidate_keys: Sequence[str], count_dict: Dict[str, int], SINGLE_TOKEN_THRESHOLD,
+                     workers: int = -1) -> np.ndarray:
+    """Confidence matrix (queries x candidates) with the 100/count-score rule applied."""
+    confidence = score_block([q.key for q in queries], candidate_keys, workers=workers).astype(np.float64)
+    candidate_keys = np.asarray(candidate_keys, dtype=object)
+    for row, query in enumerate(queries):
+        perfect = confidence[row] == 100
+        if perfect.any() and count_score(query, count_dict, SINGLE_TOKEN_THRESHOLD) == 0:
+            confidence[row, perfect] = 50.0
+        # Identical keys are a match whatever the count score (and even when both are empty)
+        confidence[row, candidate_keys == query.key] = 100
+    return confidence
+
+
+def best_matches(queries: Sequence[NormalizedName], candidates: Sequence[NormalizedName],
+                 count_dict: Dict[str, int], SINGLE_TOKEN_THRESHOLD,
+                 block_size: int = QUERY_BLOCK_SIZE, workers: int = -1) -> List[Tuple[float, List[int]]]:
+    """For every query: (best confidence, candidate positions reaching it), or (0, []) when nothing scores.
+
+    Same result as CandidateIndex.search or a full pairwise scan.
+    """
+    results: List[Tuple[float, List[int]]] = []
+    if not candidates:
+        return [(0, []) for _ in queries]
+    candidate_keys = [c.key for c in candidates]
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        confidence = confidence_block(block, candidates, candidate_keys, count_dict, SINGLE_TOKEN_THRESHOLD, workers)
+        best = confidence.max(axis=1)
+        for row in range(len(block)):
+            if best[row] <= 0:
+                results.append((0, []))
+                continue
+            value = float(best[row])
+            results.append((int(value) if value.is_integer() else value,
+                            np.flatnonzero(confidence[row] == best[row]).tolist()))
+    return results
+
+
+def top_candidates(queries: Sequence[NormalizedName], candidates: Sequence[NormalizedName],
+                   count_dict: Dict[str, int], SINGLE_TOKEN_THRESHOLD, k: int = 5, min_confidence: float = 0,
+                   block_size: int = QUERY_BLOCK_SIZE, workers: int = -1) -> List[List[Tuple[int, float]]]:
+    """For every query, up to `k` (candidate position, confidence) pairs above `min_confidence`, best first.
+
+    Every candidate tied with the k-th score is kept, so the list does not depend on candidate order.
+    """
+    results: List[List[Tuple[int, float]]] = []
+    if not candidates:
+        return [[] for _ in queries]
+    candidate_keys = [c.key for c in candidates]
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        confidence = confidence_block(block, candidates, candidate_keys, count_dict, SINGLE_TOKEN_THRESHOLD, workers)
+        for row in confidence:
+            if k < len(row):
+                cutoff = np.partition(row, len(row) - k)[len(row) - k]
+                positions = np.flatnonzero((row >= cutoff) & (row > min_confidence))
+            else:
+                positions = np.flatnonzero(row > min_confidence)
+            ranked = sorted(positions.tolist(), key=lambda p: (-row[p], p))
+            results.append([(p, float(row[p])) for p in ranked])
+    return results
@@ -0,0 +1,131 @@
+"""Tokenizer and stopwords for company-name matching, without NLTK downloads.
+
+The default "regex" tokenizer is a port of the rules of NLTK's
+NLTKWordTokenizer (what `nltk.word_tokenize` applies to each sentence), so
+company names give the same tokens without importing nltk or fetching the
+punkt models. The only difference with `word_tokenize` is that the text is not
+split into sentences first: a name is a single line. ENGLISH_STOPWORDS is the
+NLTK English stopwords list.
+
+STRING_MATCHING_TOKENIZER=nltk switches back to `nltk.word_tokenize` and the
+NLTK stopwords corpus; the resources are downloaded once, only if missing.
+"""
+
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, FrozenSet, List
+
+ENGLISH_STOPWORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves
+he him his himself she she's her hers herself it it's its itself they them their theirs themselves
+what which who whom this that that'll these those am is are was were be been being have has had
+having do does did doing a an the and but if or because as until while of at by for with about
+against between into through during before after above below to from up down in out on off over
+under again further then once here there when where why how all any both each few more most other
+some such no nor not only own same so than too very s t can will just don don't should should've
+now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn
+hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn
+shouldn't wasn wasn't weren weren't won won't wouldn wouldn't
+""".split())
+
+# Rules of nltk.tokenize.destructive.NLTKWordTokenizer, applied in the same order
+_STARTING_QUOTES = [
+    (re.compile("([«“‘„]|[`]+)", re.U), r" \1 "),
+    (re.compile(r"^\""), r"``"),
+    (re.compile(r"(``)"), r" \1 "),
+    (re.compile(r"([ \(\[{<])(\"|\'{2})"), r"\1 `` "),
+    (re.compile(r"(?i)(\')(?!re|ve|ll|m|t|s|d|n)(\w)\b", re.U), r"\1 \2"),
+]
+_PUNCTUATION = [
+    (re.compile(r'([^\.])(\.)([\]\)}>"\'' "»”’ " r"]*)\s*$", re.U), r"\1 \2 \3 "),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+    (re.compile(r"([:,])$"), r" \1 "),
+    (re.compile(r"\.{2,}", re.U), r" \g<0> "),
+    (re.compile(r"[;@#$%&]"), r" \g<0> "),
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r"\1 \2\3 "),
+    (re.compile(r"[?!]"), r" \g<0> "),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r"[*]", re.U), r" \g<0> "),
+]
+_PARENS_BRACKETS = (re.compile(r"[\]\[\(\)\{\}\<\>]"), r" \g<0> ")
+_DOUBLE_DASHES = (re.compile(r"--"), r" -- ")
+_ENDING_QUOTES = [
+    (re.compile("([»”’])", re.U), r" \1 "),
+    (re.compile(r"''"), " '' "),
+    (re.compile(r'"'), " '' "),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+]
+_CONTRACTIONS = [re.compile(pattern) for pattern in (
+    r"(?i)\b(can)(?#X)(not)\b",
+    r"(?i)\b(d)(?#X)('ye)\b",
+    r"(?i)\b(gim)(?#X)(me)\b",
+    r"(?i)\b(gon)(?#X)(na)\b",
+    r"(?i)\b(got)(?#X)(ta)\b",
+    r"(?i)\b(lem)(?#X)(me)\b",
+    r"(?i)\b(more)(?#X)('n)\b",
+    r"(?i)\b(wan)(?#X)(na)(?=\s)",
+    r"(?i) ('t)(?#X)(is)\b",
+    r"(?i) ('t)(?#X)(was)\b",
+)]
+
+
+def regex_tokenize(text: str) -> List[str]:
+    """Tokens of a single-line text, as NLTK's word tokenizer splits them."""
+    for regexp, substitution in _STARTING_QUOTES:
+        text = regexp.sub(substitution, text)
+    for regexp, substitution in _PUNCTUATION:
+        text = regexp.sub(substitution, text)
+    regexp, substitution = _PARENS_BRACKETS
+    text = regexp.sub(substitution, text)
+    regexp, substitution = _DOUBLE_DASHES
+    text = regexp.sub(substitution, text)
+    text = " " + text + " "
+    for regexp, substitution in _ENDING_QUOTES:
+        text = regexp.sub(substitution, text)
+    for regexp in _CONTRACTIONS:
+        text = regexp.sub(r" \1 \2 ", text)
+    return text.split()
+
+
+_nltk_lock = threading.Lock()
+
+
+def _ensure_nltk_resource(path: str, package: str) -> None:
+    import nltk
+    try:
+        nltk.data.find(path)
+    except LookupError:
+        print(f"NLTK resource {package} not found locally, downloading it once...")
+        nltk.download(package, quiet=True)
+
+
+@lru_cache(maxsize=1)
+def _nltk_word_tokenize() -> Callable[[str], List[str]]:
+    with _nltk_lock:
+        _ensure_nltk_resource("tokenizers/punkt_tab/english/", "punkt_tab")
+        from nltk.tokenize import word_tokenize
+        return word_tokenize
+
+
+@lru_cache(maxsize=1)
+def _nltk_stopwords() -> FrozenSet[str]:
+    with _nltk_lock:
+        _ensure_nltk_resource("corpora/stopwords", "stopwords")
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words("english"))
+
+
+def get_tokenizer(mode: str = "regex") -> Callable[[str], List[str]]:
+    """Word tokenizer for `mode` ("regex" or "nltk"); nltk is only imported when asked for."""
+    if mode == "nltk":
+        return _nltk_word_tokenize()
+    return regex_tokenize
+
+
+def get_stop_words(mode: str = "regex") -> FrozenSet[str]:
+    if mode == "nltk":
+        return _nltk_stopwords()
+    return ENGLISH_STOPWORDS
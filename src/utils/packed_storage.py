@@ -0,0 +1,514 @@
+"""Packed raw layout: one set of append-only segment files per company folder.
+
+With STORAGE_LAYOUT=packed the objects under
+RAW_DATA_DIR/{PLATFORM}/{company folder}/... (pages, attachments, corporate
+information pages) are appended to `segment-NNNNNN.pack` files in the company
+folder instead of being written as one file (and a few directories) each.
+Every append is recorded in the folder's `index.log`, one JSON line per object:
+
+    [member path, segment number, offset, length]    (length -1 marks a deletion)
+
+The last line for a member wins. Data is written before its index line, so a
+crash can leave unreferenced bytes in a segment (reclaimed by compaction) but
+never an index entry pointing at missing data. A torn last line left by a crash
+is cut off before the next append, so it cannot swallow the following entry.
+
+PackedStorage has the same interface as the other backends, so callers keep
+using logical paths (`.../{date}_{doc_id}/wp.html`) and the `file_path` stored in
+MongoDB does not change. Objects outside company folders (CSS, compression
+dictionaries) stay plain files.
+
+Appends, deletes and compactions of a folder hold an exclusive lock on its
+`index.lock` file (flock, where available), so `--compact` or utils/raw_gc.py
+can run while the pipeline writes. Readers take no lock: they pick up new
+objects, and segments replaced by a compaction, by reloading the index.
+
+  python src/utils/packed_storage.py --stats             # objects, segments, files per layout
+  python src/utils/packed_storage.py --pack-existing     # move a plain-file store into segments
+  python src/utils/packed_storage.py --compact [FOLDER]  # rewrite segments without dead records
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+INDEX_FILE = "index.log"
+LOCK_FILE = "index.lock"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".pack"
+UNPACKED_FOLDERS = {"_layouts"}  # Served as plain files (stylesheets referenced by the stored pages)
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # Streamed bodies above this are spooled to a temporary file before the append
+
+Entry = Tuple[int, int, int]  # (segment number, offset, length)
+
+
+class _Group:
+    """Index and current segment of one company folder."""
+
+    def __init__(self, folder: str, lock: threading.Lock):
+        self.folder = folder
+        self.lock = lock  # Shared by every _Group loaded for this folder (cache evictions included)
+        self.entries: Dict[str, Entry] = {}
+        self.signature: Optional[Tuple[int, int]] = None
+        self.segment = 0
+        self.segment_size = 0
+        self.load()
+
+    def segment_path(self, number: int) -> str:
+        return os.path.join(self.folder, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def load(self) -> None:
+        """(Re)read the index; a torn last line from a crash is ignored."""
+        entries: Dict[str, Entry] = {}
+        index_path = os.path.join(self.folder, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        member, segment, offset, length = json.loads(line)
+                    except ValueError:
+                        continue
+                    if length < 0:
+                        entries.pop(member, None)
+                    else:
+                        entries[member] = (segment, offset, length)
+        self.entries = entries
+        self.signature = self._index_signature()
+        segments = [int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in self._segment_names()]
+        self.segment = max(segments, default=0)
+        self.segment_size = os.path.getsize(self.segment_path(self.segment)) if segments else 0
+
+    def _segment_names(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return [name for name in os.listdir(self.folder)
+                if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+
+    def _index_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.folder, INDEX_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def index_changed(self) -> bool:
+        """True when another writer appended to (or compacted) the index since it was read."""
+        return self._index_signature() != self.signature
+
+    @contextmanager
+    def locked(self):
+        """Exclusive access to the folder: the thread lock, plus an flock shared with other processes."""
+        from utils.file_writer import ensure_directory, forget_directories
+        with self.lock:
+            if fcntl is None:
+                ensure_directory(self.folder)
+                yield
+                return
+            lock_path = os.path.join(self.folder, LOCK_FILE)
+            while True:
+                ensure_directory(self.folder)
+                try:
+                    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+                except FileNotFoundError:
+                    forget_directories(self.folder)  # Removed since it was cached
+                    continue
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    if os.stat(lock_path).st_ino == os.fstat(fd).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                os.close(fd)  # The folder was dropped by a compaction meanwhile: lock the new one
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _repair_index(self) -> None:
+        """Cut a torn last line (no trailing newline, left by a crash) so the next line stays parseable."""
+        index_path = os.path.join(self.folder, INDEX_FILE)
+        try:
+            fh = open(index_path, "rb+")
+        except FileNotFoundError:
+            return
+        with fh:
+            end = fh.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            fh.seek(end - 1)
+            if fh.read(1) == b"\n":
+                return
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                fh.seek(start)
+                newline = fh.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            print(f"Packed index {index_path}: dropping a torn last line ({end - position} bytes)")
+            fh.truncate(position)
+
+    def _append_index(self, member: str, entry: Entry) -> None:
+        line = json.dumps([member, *entry], ensure_ascii=False) + "\n"
+        with open(os.path.join(self.folder, INDEX_FILE), "a", encoding="utf-8") as fh:
+            fh.write(line)
+        self.signature = self._index_signature()
+
+    def append(self, member: str, stream: BinaryIO, segment_max_bytes: int) -> int:
+        with self.locked():
+            self._repair_index()
+            if self.index_changed():
+                self.load()  # Written by another process or through another (evicted) cache entry
+            if self.segment == 0 or self.segment_size >= segment_max_bytes:
+                self.segment, self.segment_size = self.segment + 1, 0
+            with open(self.segment_path(self.segment), "ab") as fh:
+                offset = fh.tell()
+                shutil.copyfileobj(stream, fh, 1024 * 1024)
+                length = fh.tell() - offset
+            self.segment_size = offset + length
+            self._append_index(member, (self.segment, offset, length))
+            self.entries[member] = (self.segment, offset, length)
+            return length
+
+    def delete(self, member: str) -> None:
+        self.delete_many([member])
+
+    def delete_many(self, members) -> int:
+        """Tombstone several members with one index append; returns how many were live."""
+        if not self.index_changed() and not any(member in self.entries for member in members):
+            return 0
+        with self.locked():
+            self._repair_index()
+            if self.index_changed():
+                self.load()
+            live = [member for member in dict.fromkeys(members) if member in self.entries]
+            if not live:
+                return 0
+            lines = "".join(json.dumps([member, 0, 0, -1], ensure_ascii=False) + "\n" for member in live)
+            with open(os.path.join(self.folder, INDEX_FILE), "a", encoding="utf-8") as fh:
+                fh.write(lines)
+            self.signature = self._index_signature()
+            for member in live:
+                del self.entries[member]
+            return len(live)
+
+    def read(self, member: str) -> Optional[bytes]:
+        entry = self.entries.get(member)
+        if entry is None:
+            return None
+        segment, offset, length = entry
+        try:
+            with open(self.segment_path(segment), "rb") as fh:
+                fh.seek(offset)
+                return fh.read(length)
+        except FileNotFoundError:
+            return None  # Segment removed by a compaction: the caller reloads the index
+
+
+class PackedStorage:
+    """Storage backend packing each company folder into segments; other paths go to `base`."""
+
+    scheme = "packed"
+
+    def __init__(self, base, root: str, segment_max_mb: int = 256, cached_groups: int = 256):
+        self.base = base
+        self.root = os.path.abspath(root)
+        self.segment_max_bytes = segment_max_mb * 1024 * 1024
+        self.cached_groups = cached_groups
+        self._groups: "OrderedDict[str, _Group]" = OrderedDict()
+        self._groups_lock = threading.Lock()
+        self._folder_locks: Dict[str, threading.Lock] = {}
+
+    def _locate(self, path: str) -> Tuple[Optional[str], Optional[str]]:
+        """(company folder, member path inside it), or (None, None) for paths stored as plain files."""
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        parts = relative.replace("\\", "/").split("/")
+        if len(parts) < 3 or parts[0] == ".." or parts[1] in UNPACKED_FOLDERS:
+            return None, None
+        return os.path.join(self.root, parts[0], parts[1]), "/".join(parts[2:])
+
+    def _group(self, folder: str) -> _Group:
+        with self._groups_lock:
+            group = self._groups.get(folder)
+            if group is not None:
+                self._groups.move_to_end(folder)
+                return group
+            lock = self._folder_locks.setdefault(folder, threading.Lock())
+        group = _Group(folder, lock)  # Index read outside the lock
+        with self._groups_lock:
+            group = self._groups.setdefault(folder, group)
+            self._groups.move_to_end(folder)
+            while len(self._groups) > self.cached_groups:
+                self._groups.popitem(last=False)
+        return group
+
+    def write_bytes(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        import io
+        self.write_stream(path, io.BytesIO(data), content_type)
+
+    def write_text(self, path: str, text: str) -> None:
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def write_stream(self, path: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        folder, member = self._locate(path)
+        if folder is None:
+            return self.base.write_stream(path, stream, content_type)
+        # Download first, append after: the folder lock is never held while the network is read
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            shutil.copyfileobj(stream, spool, 1024 * 1024)
+            spool.seek(0)
+            return self._group(folder).append(member, spool, self.segment_max_bytes)
+
+    def read_bytes(self, path: str) -> bytes:
+        folder, member = self._locate(path)
+        if folder is None:
+            return self.base.read_bytes(path)
+        group = self._group(folder)
+        data = group.read(member)
+        if data is None and group.index_changed():
+            group.load()  # Appended by another process since the index was read
+            data = group.read(member)
+        if data is None:
+            raise FileNotFoundError(path)
+        return data
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def exists(self, path: str) -> bool:
+        folder, member = self._locate(path)
+        if folder is None:
+            return self.base.exists(path)
+        group = self._group(folder)
+        if member not in group.entries and group.index_changed():
+            group.load()
+        return member in group.entries
+
+    def size(self, path: str) -> int:
+        folder, member = self._locate(path)
+        if folder is None:
+            return self.base.size(path)
+        if not self.exists(path):
+            raise FileNotFoundError(path)
+        return self._group(folder).entries[member][2]
+
+    def modified(self, path: str) -> float:
+        """Time of the last write to the object's segment (an upper bound for the object itself)."""
+        folder, member = self._locate(path)
+        if folder is None:
+            return self.base.modified(path)
+        if not self.exists(path):
+            raise FileNotFoundError(path)
+        group = self._group(folder)
+        return os.path.getmtime(group.segment_path(group.entries[member][0]))
+
+    def delete(self, path: str) -> None:
+        folder, member = self._locate(path)
+        if folder is None:
+            self.base.delete(path)
+        else:
+            self._group(folder).delete(member)
+
+    def delete_many(self, paths) -> int:
+        """Delete several paths: one tombstone append per company folder. Space is reclaimed by `compact`."""
+        by_folder: Dict[str, list] = {}
+        plain = []
+        for path in paths:
+            folder, member = self._locate(path)
+            if folder is None:
+                plain.append(path)
+            else:
+                by_folder.setdefault(folder, []).append(member)
+        deleted = self.base.delete_many(plain) if plain else 0
+        for folder, members in by_folder.items():
+            deleted += self._group(folder).delete_many(members)
+        return deleted
+
+    def _members(self, folder: str, member_prefix: str = "") -> Iterator[str]:
+        group = self._group(folder)
+        if group.index_changed():
+            group.load()
+        for member in list(group.entries):
+            if member.startswith(member_prefix):
+                yield os.path.join(folder, *member.split("/"))
+
+    def list_files(self, prefix: str) -> Iterator[str]:
+        """Logical paths under `prefix`: members of the packed folders plus plain files not packed yet."""
+        prefix = os.path.abspath(prefix)
+        packed = set()
+        folder, member_prefix = self._locate(os.path.join(prefix, "_"))
+        if folder is not None and os.path.exists(os.path.join(folder, INDEX_FILE)):
+            # Prefix inside a company folder
+            for path in self._members(folder, member_prefix[:-1]):
+                packed.add(path)
+                yield path
+        for dirpath, _, filenames in os.walk(prefix):
+            if INDEX_FILE in filenames and dirpath != folder:  # The prefix's own folder was listed above
+                for path in self._members(dirpath):
+                    packed.add(path)
+                    yield path
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name in (INDEX_FILE, LOCK_FILE) or name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                    continue
+                if path not in packed:  # Plain copy of an object already packed (interrupted migration)
+                    yield path
+
+    def list_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(logical path, size) under `prefix`; packed sizes come from the index."""
+        for path in self.list_files(prefix):
+            try:
+                yield path, self.size(path)
+            except FileNotFoundError:
+                continue
+
+    def list_folders(self, prefix: str):
+        return self.base.list_folders(prefix)
+
+    def folders(self, prefix: Optional[str] = None) -> Iterator[str]:
+        """Packed company folders under `prefix` (the whole store by default)."""
+        for dirpath, dirnames, filenames in os.walk(prefix or self.root):
+            if INDEX_FILE in filenames:
+                dirnames[:] = []
+                yield dirpath
+
+    def compact(self, folder: str, dry_run: bool = False) -> dict:
+        """Rewrite a folder's live objects into fresh segments and drop dead bytes and index lines."""
+        group = self._group(folder)
+        with group.locked():
+            group._repair_index()
+            group.load()
+            old_segments = sorted(group._segment_names())
+            used = sum(os.path.getsize(os.path.join(folder, name)) for name in old_segments)
+            live = sum(length for _, _, length in group.entries.values())
+            stats = {"folder": folder, "objects": len(group.entries), "segments": len(old_segments),
+                     "bytes_before": used, "bytes_after": live}
+            if dry_run or used == live and len(old_segments) <= 1 + live // self.segment_max_bytes:
+                return stats
+
+            # New segments are numbered after the old ones; the index is swapped atomically at the end
+            number, size, handle = group.segment, self.segment_max_bytes, None
+            entries: Dict[str, Entry] = {}
+            tmp_index = os.path.join(folder, INDEX_FILE + ".tmp")
+            try:
+                with open(tmp_index, "w", encoding="utf-8") as index:
+                    for member, (segment, offset, length) in sorted(group.entries.items(), key=lambda kv: kv[1]):
+                        if size >= self.segment_max_bytes:
+                            if handle:
+                                handle.close()
+                            number, size = number + 1, 0
+                            handle = open(group.segment_path(number), "wb")
+                        with open(group.segment_path(segment), "rb") as source:
+                            source.seek(offset)
+                            handle.write(source.read(length))
+                        entries[member] = (number, size, length)
+                        index.write(json.dumps([member, number, size, length], ensure_ascii=False) + "\n")
+                        size += length
+            finally:
+                if handle:
+                    handle.close()
+            os.replace(tmp_index, os.path.join(folder, INDEX_FILE))
+            for name in old_segments:
+                os.remove(os.path.join(folder, name))
+            if not entries:
+                # Every object was deleted: drop the folder (a later write starts a new index)
+                os.remove(os.path.join(folder, INDEX_FILE))
+                if os.path.exists(os.path.join(folder, LOCK_FILE)):
+                    os.remove(os.path.join(folder, LOCK_FILE))  # Waiting writers notice and lock a new file
+                if not os.listdir(folder):
+                    os.rmdir(folder)
+                with self._groups_lock:
+                    self._groups.pop(folder, None)
+            group.load()
+            return stats
+
+
+def pack_existing(storage: PackedStorage, prefix: Optional[str] = None, dry_run: bool = False) -> dict:
+    """Move plain files of company folders into segments (file by file: safe to interrupt and rerun)."""
+    stats = {"files": 0, "bytes": 0, "directories_removed": 0}
+    for dirpath, dirnames, filenames in os.walk(prefix or storage.root, topdown=False):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            folder, _ = storage._locate(path)
+            if folder is None or name in (INDEX_FILE, LOCK_FILE) or (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            stats["files"] += 1
+            stats["bytes"] += os.path.getsize(path)
+            if dry_run:
+                continue
+            with open(path, "rb") as fh:
+                storage.write_stream(path, fh)
+            os.remove(path)
+        if not dry_run and dirpath != storage.root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+            stats["directories_removed"] += 1
+    print(f"Pack existing files{' (dry-run)' if dry_run else ''}: {stats}")
+    return stats
+
+
+def layout_stats(storage: PackedStorage) -> dict:
+    stats = {"packed_folders": 0, "packed_objects": 0, "segments": 0, "segment_bytes": 0, "live_bytes": 0,
+             "plain_files": 0, "directories": 0}
+    for dirpath, dirnames, filenames in os.walk(storage.root):
+        stats["directories"] += 1
+        if INDEX_FILE in filenames:
+            group = storage._group(dirpath)
+            stats["packed_folders"] += 1
+            stats["packed_objects"] += len(group.entries)
+            stats["live_bytes"] += sum(length for _, _, length in group.entries.values())
+        for name in filenames:
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                stats["segments"] += 1
+                stats["segment_bytes"] += os.path.getsize(os.path.join(dirpath, name))
+            elif name not in (INDEX_FILE, LOCK_FILE):
+                stats["plain_files"] += 1
+    print(f"Raw store layout: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from config.settings import RAW_DATA_DIR, PLATFORM, PACKED_SEGMENT_MAX_MB
+    from utils.storage import LocalStorage
+
+    parser = argparse.ArgumentParser(description="Packed raw layout tools (local raw store).")
+    parser.add_argument("--stats", action="store_true", help="count objects, segments and plain files")
+    parser.add_argument("--pack-existing", action="store_true", help="move plain files into segments")
+    parser.add_argument("--compact", nargs="?", const="", metavar="FOLDER",
+                        help="compact one company folder (name under RAW_DATA_DIR/PLATFORM) or all of them")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    packed = PackedStorage(LocalStorage(), RAW_DATA_DIR, segment_max_mb=PACKED_SEGMENT_MAX_MB)
+    if args.pack_existing:
+        pack_existing(packed, os.path.join(RAW_DATA_DIR, PLATFORM), dry_run=args.dry_run)
+    if args.compact is not None:
+        targets = [os.path.join(RAW_DATA_DIR, PLATFORM, args.compact)] if args.compact else packed.folders()
+        reclaimed = 0
+        for target in targets:
+            result = packed.compact(target, dry_run=args.dry_run)
+            reclaimed += result["bytes_before"] - result["bytes_after"]
+            if result["bytes_before"] != result["bytes_after"]:
+                print(f"  {result}")
+        print(f"Compaction: {reclaimed} bytes {'reclaimable (dry-run)' if args.dry_run else 'reclaimed'}")
+    if args.stats or not (args.pack_existing or args.compact is not None):
+        layout_stats(packed)
@@ -0,0 +1,266 @@
+"""Compressed storage of raw HTML pages with transparent reads.
+
+store_web_page writes `wp.html` (and corporate information pages) through
+`write_page`. With PAGE_COMPRESSION=gzip or zstd the object is stored as
+`wp.html.gz` / `wp.html.zst`. The `file_path` kept in MongoDB still names the
+logical page (`.../wp.html`): `read_page` finds whichever variant exists and
+returns the decompressed text, and `logical_page_path` maps a listed object back
+to its logical path.
+
+zstd can use a dictionary trained on stored pages (announcement pages are
+mostly the same boilerplate, so a dictionary gains a lot on small pages).
+Dictionaries are kept in the raw store under DICTIONARY_FOLDER, named by their
+id. Every zstd frame records the id of its dictionary, so pages written with an
+older dictionary stay readable after a new one is trained.
+
+  python src/utils/page_compression.py --report 500            # ratios of gzip / zstd / zstd+dictionary
+  python src/utils/page_compression.py --train-dictionary 2000 # train a dictionary from stored pages
+  python src/utils/page_compression.py --compress-existing     # rewrite stored plain pages compressed
+
+zstandard is only imported for zstd.
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import gzip
+import os
+import threading
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+CODEC_BY_SUFFIX = {suffix: codec for codec, suffix in SUFFIXES.items()}
+PAGE_EXTENSION = ".html"
+DICTIONARY_FOLDER = "_compression_dictionaries"
+
+_local = threading.local()  # zstd (de)compressors are not thread-safe: one per thread
+
+
+def _settings():
+    from config.settings import PAGE_COMPRESSION, PAGE_COMPRESSION_LEVEL, PAGE_ZSTD_DICTIONARY_ID
+    return (PAGE_COMPRESSION or "none").lower(), PAGE_COMPRESSION_LEVEL, PAGE_ZSTD_DICTIONARY_ID
+
+
+def _dictionary_path(dict_id: int) -> str:
+    from config.settings import RAW_DATA_DIR
+    return os.path.join(RAW_DATA_DIR, DICTIONARY_FOLDER, f"{dict_id}.zdict")
+
+
+@lru_cache(maxsize=16)
+def _load_dictionary(dict_id: int):
+    import zstandard
+    from utils.storage import get_storage
+    return zstandard.ZstdCompressionDict(get_storage().read_bytes(_dictionary_path(dict_id)))
+
+
+def _zstd_compressor(level: int, dict_id: int):
+    import zstandard
+    key = (level, dict_id)
+    compressors = _local.__dict__.setdefault("compressors", {})
+    if key not in compressors:
+        dictionary = _load_dictionary(dict_id) if dict_id else None
+        compressors[key] = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    return compressors[key]
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    import zstandard
+    dict_id = zstandard.get_frame_parameters(data).dict_id
+    decompressors = _local.__dict__.setdefault("decompressors", {})
+    if dict_id not in decompressors:
+        dictionary = _load_dictionary(dict_id) if dict_id else None
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return decompressors[dict_id].decompress(data)
+
+
+def compress(data: bytes, codec: str, level: int, dict_id: int = 0) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if codec == "zstd":
+        return _zstd_compressor(level, dict_id).compress(data)
+    return data
+
+
+def decompress(data: bytes, codec: Optional[str]) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        return _zstd_decompress(data)
+    return data
+
+
+def stored_page_path(path: str, codec: Optional[str] = None) -> str:
+    """Physical object path of a logical page for `codec` (the configured one by default)."""
+    codec = codec or _settings()[0]
+    return path + SUFFIXES.get(codec, "")
+
+
+def logical_page_path(path: str) -> str:
+    """Logical page path of a stored object (strips .gz / .zst)."""
+    root, suffix = os.path.splitext(path)
+    return root if suffix in CODEC_BY_SUFFIX else path
+
+
+def is_page(path: str) -> bool:
+    return logical_page_path(path).endswith(PAGE_EXTENSION)
+
+
+def write_page(path: str, html: str, storage=None) -> str:
+    """Store a page under its logical `path`, compressed as configured; returns the object path written.
+
+    Copies of the page in the other formats (left by a PAGE_COMPRESSION change) are deleted
+    once it is written, as in compress_existing: one object per logical page.
+    """
+    from utils.storage import get_storage
+    storage = storage or get_storage()
+    codec, level, dict_id = _settings()
+    if codec not in SUFFIXES:
+        storage.write_text(path, html)
+        stored_path = path
+    else:
+        stored_path = stored_page_path(path, codec)
+        storage.write_bytes(stored_path, compress(html.encode("utf-8"), codec, level, dict_id if codec == "zstd" else 0))
+    storage.delete_many([variant for variant in [path] + [path + suffix for suffix in SUFFIXES.values()]
+                         if variant != stored_path])
+    return stored_path
+
+
+def read_page(path: str, storage=None) -> str:
+    """Text of the logical page `path`, whichever format it was stored in.
+
+    The configured format is tried first, plain HTML for PAGE_COMPRESSION=none
+    (pages written before write_page deleted the other formats may still have an
+    older copy), then the other formats.
+    """
+    from utils.storage import get_storage
+    storage = storage or get_storage()
+    path = logical_page_path(path)
+    configured = _settings()[0]
+    order = [configured if configured in SUFFIXES else None]
+    order += [codec for codec in list(SUFFIXES) + [None] if codec not in order]
+    for codec in order:
+        try:
+            data = storage.read_bytes(path + SUFFIXES.get(codec, ""))
+        except FileNotFoundError:
+            continue
+        return decompress(data, codec).decode("utf-8")
+    raise FileNotFoundError(path)
+
+
+def page_exists(path: str, storage=None) -> bool:
+    """True when the logical page `path` is stored in any format."""
+    from utils.storage import get_storage
+    storage = storage or get_storage()
+    path = logical_page_path(path)
+    return any(storage.exists(path + suffix) for suffix in [""] + list(SUFFIXES.values()))
+
+
+def iter_pages(prefix: str, storage=None) -> Iterator[str]:
+    """Logical paths of the pages stored under `prefix`, each once whatever its formats."""
+    from utils.storage import get_storage
+    storage = storage or get_storage()
+    seen = set()
+    for path in storage.list_files(prefix):
+        if not is_page(path):
+            continue
+        logical = logical_page_path(path)
+        if logical not in seen:
+            seen.add(logical)
+            yield logical
+
+
+def _sample_pages(limit: int) -> List[bytes]:
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    pages = []
+    for path in iter_pages(os.path.join(RAW_DATA_DIR, PLATFORM)):
+        if os.path.basename(path) != "wp.html":
+            continue
+        pages.append(read_page(path).encode("utf-8"))
+        if len(pages) >= limit:
+            break
+    return pages
+
+
+def train_dictionary(limit: int = 2000, size_kb: int = 112) -> int:
+    """Train a zstd dictionary on up to `limit` stored announcement pages; returns its id (set PAGE_ZSTD_DICTIONARY_ID)."""
+    import zstandard
+    from utils.storage import get_storage
+    samples = _sample_pages(limit)
+    if not samples:
+        raise ValueError("No stored pages to train a dictionary on")
+    dictionary = zstandard.train_dictionary(size_kb * 1024, samples)
+    dict_id = dictionary.dict_id()
+    get_storage().write_bytes(_dictionary_path(dict_id), dictionary.as_bytes())
+    print(f"Trained zstd dictionary {dict_id} on {len(samples)} pages: set PAGE_ZSTD_DICTIONARY_ID={dict_id}")
+    return dict_id
+
+
+def compression_report(limit: int = 500) -> dict:
+    """Compression ratio and speed of each format on stored pages."""
+    import time
+    samples = _sample_pages(limit)
+    raw_size = sum(len(s) for s in samples)
+    _, level, dict_id = _settings()
+    formats = [("gzip", 6, 0)]
+    try:
+        import zstandard  # noqa: F401
+        formats += [("zstd", level, 0)] + ([("zstd", level, dict_id)] if dict_id else [])
+    except ImportError:
+        print("zstandard is not installed: zstd skipped.")
+    report = {"pages": len(samples), "raw_bytes": raw_size}
+    for codec, codec_level, codec_dict in formats:
+        start = time.perf_counter()
+        compressed = [compress(s, codec, codec_level, codec_dict) for s in samples]
+        seconds = time.perf_counter() - start
+        size = sum(len(c) for c in compressed)
+        name = f"{codec}-{codec_level}" + (f"+dict{codec_dict}" if codec_dict else "")
+        report[name] = {"bytes": size, "ratio": round(raw_size / size, 2) if size else None,
+                        "mb_per_second": round(raw_size / (1024 * 1024) / seconds, 1) if seconds else None}
+    print(f"Page compression: {report}")
+    return report
+
+
+def compress_existing(dry_run: bool = False) -> dict:
+    """Rewrite stored plain pages in the configured format and delete the plain copies."""
+    from config.settings import RAW_DATA_DIR, PLATFORM
+    from utils.storage import get_storage
+    codec, level, dict_id = _settings()
+    if codec not in SUFFIXES:
+        raise ValueError("Set PAGE_COMPRESSION to gzip or zstd first")
+    storage = get_storage()
+    stats = {"pages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    for path in storage.list_files(os.path.join(RAW_DATA_DIR, PLATFORM)):
+        if not path.endswith(PAGE_EXTENSION):
+            continue
+        html = storage.read_text(path)
+        stats["pages"] += 1
+        stats["raw_bytes"] += len(html.encode("utf-8"))
+        if dry_run:
+            continue
+        data = compress(html.encode("utf-8"), codec, level, dict_id if codec == "zstd" else 0)
+        storage.write_bytes(stored_page_path(path, codec), data)
+        stats["stored_bytes"] += len(data)
+        storage.delete(path)
+    print(f"Compress existing pages ({codec}{', dry-run' if dry_run else ''}): {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Raw page compression tools.")
+    parser.add_argument("--report", type=int, metavar="PAGES", help="compare formats on this many stored pages")
+    parser.add_argument("--train-dictionary", type=int, metavar="PAGES", help="train a zstd dictionary on this many pages")
+    parser.add_argument("--compress-existing", action="store_true", help="rewrite plain pages in the configured format")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.train_dictionary:
+        train_dictionary(args.train_dictionary)
+    if args.report:
+        compression_report(args.report)
+    if args.compress_existing:
+        compress_existing(dry_run=args.dry_run)
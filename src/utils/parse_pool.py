@@ -0,0 +1,129 @@
+"""CPU worker pool for HTML parsing.
+
+Network threads hand the raw page bytes to a process pool and only wait on the
+result, so BeautifulSoup no longer competes with the I/O threads for the GIL.
+PARSE_WORKERS = 0 parses inline in the calling thread. Queue depth and parse
+latency are tracked so the network and parsing sides can be sized separately.
+"""
+
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from config.settings import PARSE_WORKERS, PARSE_POOL_START_METHOD
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "in_flight": 0,        # queue depth: submitted but not completed
+    "max_in_flight": 0,
+    "parse_seconds": 0.0,  # time spent parsing in the workers
+    "wait_seconds": 0.0,   # submit-to-result time seen by the callers (queueing + parsing)
+    "max_wait_seconds": 0.0,
+}
+
+
+def _timed_attachments(html_bytes: bytes):
+    from utils.html_parsing_utils import get_attachments_url_list
+    start = time.perf_counter()
+    result = get_attachments_url_list(html_bytes.decode("utf-8"))
+    return result, time.perf_counter() - start
+
+
+def _timed_company_metadata(html_bytes: bytes):
+    from company_metadata_scraper import parse_company_metadata
+    start = time.perf_counter()
+    result = parse_company_metadata(html_bytes.decode("utf-8"))
+    return result, time.perf_counter() - start
+
+
+def get_parse_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the shared parse pool (None when parsing inline)."""
+    global _executor
+    if PARSE_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                import multiprocessing
+                _executor = ProcessPoolExecutor(
+                    max_workers=PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context(PARSE_POOL_START_METHOD),
+                )
+    return _executor
+
+
+def _run(func, html: str):
+    html_bytes = html.encode("utf-8")
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+
+    start = time.perf_counter()
+    parse_seconds = 0.0
+    failed = False
+    try:
+        executor = get_parse_executor()
+        if executor is None:
+            result, parse_seconds = func(html_bytes)
+        else:
+            result, parse_seconds = executor.submit(func, html_bytes).result()
+        return result
+    except Exception:
+        failed = True
+        raise
+    finally:
+        waited = time.perf_counter() - start
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+            _stats["completed"] += 1
+            _stats["failed"] += int(failed)
+            _stats["parse_seconds"] += parse_seconds
+            _stats["wait_seconds"] += waited
+            _stats["max_wait_seconds"] = max(_stats["max_wait_seconds"], waited)
+
+
+def parse_attachments(html: str) -> Optional[list]:
+    """Attachment URL list of an announcement page, parsed in the pool."""
+    if not html:
+        return None
+    return _run(_timed_attachments, html)
+
+
+def parse_company_metadata(html: str) -> dict:
+    """Company metadata of a corporate information page, parsed in the pool."""
+    return _run(_timed_company_metadata, html or "")
+
+
+def get_parse_stats() -> dict:
+    """Snapshot of the parse pool counters, with average latencies."""
+    with _stats_lock:
+        stats = dict(_stats)
+    done = stats["completed"] or 1
+    stats["avg_parse_ms"] = 1000 * stats["parse_seconds"] / done
+    stats["avg_wait_ms"] = 1000 * stats["wait_seconds"] / done
+    stats["workers"] = PARSE_WORKERS
+    return stats
+
+
+def format_parse_stats() -> str:
+    stats = get_parse_stats()
+    return (f"parse pool: workers={stats['workers']} parsed={stats['completed']} failed={stats['failed']} "
+            f"in_flight={stats['in_flight']} (max {stats['max_in_flight']}) "
+            f"avg_parse={stats['avg_parse_ms']:.1f}ms avg_wait={stats['avg_wait_ms']:.1f}ms "
+            f"max_wait={1000 * stats['max_wait_seconds']:.1f}ms")
+
+
+def shutdown_parse_pool(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,253 @@
+"""Selective garbage collection of the raw store.
+
+Deletes the documents stored under RAW_DATA_DIR/{PLATFORM} that match every
+given filter:
+
+  --company ID [ID ...]   company folders `{company_id}_{name}` (their corporate
+                          information page too, when no other filter is given)
+  --older-than-days N     document folders `{YYYYMMDD}_{document_id}` filed more than N days ago
+  --orphans               document folders no `file_path` / `supporting_file_paths` of the
+                          files collection points into. Documents stored in the last
+                          ORPHAN_GRACE_HOURS hours are kept: the pipeline stores a company's
+                          documents (backfilled ones with old filing dates included) before
+                          inserting their metadata. The storage time comes from the
+                          manifest (`stored_at`), else from the object (mtime, S3 LastModified).
+
+Company folders are walked in parallel (GC_WORKERS threads, one listing per
+company: a directory walk locally, a paginated listing on S3) and the
+selected objects are deleted in batches through the storage backend
+(DeleteObjects on S3, one tombstone append per folder in the packed layout,
+followed by a compaction of the folders touched). Deleted objects are removed
+from the manifest. `--dry-run` only reports what would be deleted and the bytes
+it would free.
+
+  python src/utils/raw_gc.py --orphans --dry-run
+  python src/utils/raw_gc.py --company 1234 5678
+  python src/utils/raw_gc.py --older-than-days 1825 --company 1234
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+DELETE_BATCH = 1000  # Objects per delete_many call
+ORPHAN_GRACE_HOURS = 48
+
+
+def _relative(path: str, root: str) -> str:
+    """"/"-separated path of `path` under `root` (works for s3:// paths as well)."""
+    return os.path.relpath(path, root).replace("\\", "/")
+
+
+def _filing_date(folder_name: str) -> Optional[datetime]:
+    """Filing date of a document folder `{YYYYMMDD}_{document_id}`, or None when it has none."""
+    try:
+        return datetime.strptime(folder_name.split("_", 1)[0], "%Y%m%d")
+    except ValueError:
+        return None
+
+
+def referenced_document_folders() -> Set[str]:
+    """Document folders (relative to RAW_DATA_DIR, no leading slash) holding a path of the files collection."""
+    from utils.db_utils import iter_stored_files
+    folders = set()
+    for doc in iter_stored_files({"_id": 0, "file_path": 1, "supporting_file_paths": 1}):
+        for path in [doc.get("file_path")] + list(doc.get("supporting_file_paths") or []):
+            if path:
+                folders.add(os.path.dirname(path.replace("\\", "/").lstrip("/")))
+    return folders
+
+
+class _Selection:
+    """The filters of one run, applied to the objects of one company folder."""
+
+    def __init__(self, companies: Optional[Iterable[str]] = None, older_than_days: Optional[int] = None,
+                 referenced: Optional[Set[str]] = None):
+        self.companies = {str(company_id) for company_id in companies} if companies else None
+        self.cutoff = datetime.now() - timedelta(days=older_than_days) if older_than_days is not None else None
+        self.referenced = referenced
+        self.orphan_cutoff = time.time() - ORPHAN_GRACE_HOURS * 3600
+
+    def company_selected(self, company_folder: str) -> bool:
+        if self.companies is None:
+            return True
+        return any(company_folder == company_id or company_folder.startswith(company_id + "_")
+                   for company_id in self.companies)
+
+    def document_selected(self, relative_folder: str) -> bool:
+        """`relative_folder`: {PLATFORM}/{company folder}/{file type}/{YYYYMMDD}_{document_id}."""
+        filed = _filing_date(relative_folder.rsplit("/", 1)[-1])
+        if self.cutoff is not None and (filed is None or filed >= self.cutoff):
+            return False
+        if self.referenced is not None and (relative_folder in self.referenced or filed is None):
+            return False
+        return True
+
+    def recently_stored(self, storage, manifest, relative_folder: str, path: str) -> bool:
+        """Orphan grace: the document was stored less than ORPHAN_GRACE_HOURS ago (its metadata may be pending)."""
+        if self.referenced is None:
+            return False
+        stored_at = manifest.latest_stored_at(relative_folder + "/") if manifest is not None else None
+        if stored_at is None:
+            try:
+                stored_at = storage.modified(path)
+            except FileNotFoundError:
+                return False
+        return stored_at >= self.orphan_cutoff
+
+    def only_companies(self) -> bool:
+        return self.companies is not None and self.cutoff is None and self.referenced is None
+
+
+def _collect_company(storage, company_path: str, selection: _Selection, dry_run: bool) -> dict:
+    """List one company folder, delete the selected objects in batches; returns its counters."""
+    from config.settings import RAW_DATA_DIR
+    from utils.manifest import get_manifest, relative_path
+    from utils.page_compression import logical_page_path
+
+    stats = {"objects": 0, "bytes": 0, "selected": 0, "selected_bytes": 0, "documents": 0, "deleted": 0}
+    documents = set()
+    recent: Dict[str, bool] = {}  # Document folder -> inside the orphan grace period
+    batch: List[str] = []
+    manifest = get_manifest()
+
+    def flush():
+        if not batch:
+            return
+        if not dry_run:
+            stats["deleted"] += storage.delete_many(batch)
+            if manifest is not None:
+                manifest.forget({relative_path(logical_page_path(path)) for path in batch})
+        batch.clear()
+
+    for path, size in storage.list_sizes(company_path):
+        stats["objects"] += 1
+        stats["bytes"] += size
+        relative = _relative(path, RAW_DATA_DIR)
+        parts = relative.split("/")
+        if selection.only_companies():
+            selected = True
+        else:
+            # Objects outside a document folder ({PLATFORM}/{company}/{type}/{date}_{id}/...) are kept
+            selected = len(parts) >= 5 and selection.document_selected("/".join(parts[:4]))
+            if selected:
+                folder = "/".join(parts[:4])
+                if folder not in recent:
+                    recent[folder] = selection.recently_stored(storage, manifest, folder, path)
+                selected = not recent[folder]
+        if not selected:
+            continue
+        stats["selected"] += 1
+        stats["selected_bytes"] += size
+        documents.add("/".join(parts[:4]))
+        batch.append(path)
+        if len(batch) >= DELETE_BATCH:
+            flush()
+    flush()
+    stats["documents"] = len(documents)
+
+    if not dry_run and stats["selected"]:
+        if storage.scheme == "packed":
+            for folder in storage.folders(company_path):
+                storage.compact(folder)
+        if storage.scheme in ("file", "packed"):
+            _remove_empty_folders(company_path)
+    return stats
+
+
+def _remove_empty_folders(top: str) -> None:
+    from utils.file_writer import forget_directories
+    for dirpath, _, _ in os.walk(top, topdown=False):
+        try:
+            os.rmdir(dirpath)  # Only succeeds when empty
+        except OSError:
+            pass
+    forget_directories(top)
+
+
+def collect(companies: Optional[Iterable[str]] = None, older_than_days: Optional[int] = None,
+            orphans: bool = False, dry_run: bool = False, workers: Optional[int] = None) -> dict:
+    """Delete (or with `dry_run` count) the raw documents matching every given filter."""
+    from config.settings import RAW_DATA_DIR, PLATFORM, GC_WORKERS
+    from utils.storage import get_storage
+
+    if not companies and older_than_days is None and not orphans:
+        raise ValueError("Give at least one filter: companies, older_than_days or orphans")
+    referenced = None
+    if orphans:
+        referenced = referenced_document_folders()
+        if not referenced:
+            # An empty or unreachable files collection would make every document an orphan
+            raise ValueError("The files collection references no document: refusing to collect orphans")
+    selection = _Selection(companies, older_than_days, referenced)
+
+    storage = get_storage()
+    start = time.perf_counter()
+    root = os.path.join(RAW_DATA_DIR, PLATFORM)
+    company_paths = [path for path in storage.list_folders(root)
+                     if not os.path.basename(path).startswith("_") and selection.company_selected(os.path.basename(path))]
+    totals = {"companies": len(company_paths), "objects": 0, "bytes": 0, "selected": 0, "selected_bytes": 0,
+              "documents": 0, "deleted": 0}
+
+    with ThreadPoolExecutor(max_workers=workers or GC_WORKERS) as executor:
+        futures = {executor.submit(_collect_company, storage, path, selection, dry_run): path for path in company_paths}
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"GC failed for {futures[future]}: {e}")
+                continue
+            for key, value in stats.items():
+                totals[key] += value
+
+    if selection.only_companies():
+        # Corporate information pages of the companies removed
+        from company_metadata_scraper import COMPANY_PAGES_FOLDER
+        from utils.manifest import get_manifest, relative_path
+        from utils.page_compression import stored_page_path, SUFFIXES
+        manifest = get_manifest()
+        for company_id in selection.companies:
+            page = os.path.join(root, COMPANY_PAGES_FOLDER, f"{company_id}.html")
+            for path in [page] + [stored_page_path(page, codec) for codec in SUFFIXES]:
+                try:
+                    size = storage.size(path)
+                except FileNotFoundError:
+                    continue
+                for key in ("objects", "selected"):
+                    totals[key] += 1
+                for key in ("bytes", "selected_bytes"):
+                    totals[key] += size
+                if not dry_run:
+                    storage.delete(path)
+                    totals["deleted"] += 1
+            if not dry_run and manifest is not None:
+                manifest.forget([relative_path(page)])
+
+    totals["seconds"] = round(time.perf_counter() - start, 1)
+    freed = f"{totals['selected_bytes'] / (1024 * 1024):.1f} MB"
+    print(f"Raw GC{' (dry-run)' if dry_run else ''}: {totals['selected']} of {totals['objects']} objects "
+          f"in {totals['documents']} documents, {freed} {'to free' if dry_run else 'freed'}: {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Delete raw documents by company, filing-date age or orphan status.")
+    parser.add_argument("--company", nargs="+", metavar="ID", help="company ids")
+    parser.add_argument("--older-than-days", type=int, metavar="N", help="documents filed more than N days ago")
+    parser.add_argument("--orphans", action="store_true", help="documents not referenced by the files collection")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    parser.add_argument("--workers", type=int, help="company folders walked in parallel (default GC_WORKERS)")
+    args = parser.parse_args()
+    if not (args.company or args.older_than_days is not None or args.orphans):
+        parser.error("give at least one of --company, --older-than-days, --orphans")
+    collect(args.company, args.older_than_days, args.orphans, dry_run=args.dry_run, workers=args.workers)
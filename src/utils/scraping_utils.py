@@ -27,7 +27,9 @@ sys.path.append(str(ROOT_PATH))
 sys.path.append(str(SRC_PATH))
 
 from utils.http_requests_utils import get_headers
-from config.settings import SGX_COMPANY_API_URL, SGX_RESULTS_COUNT_API_URL, COMPANY_LIST_URL, ATTACHMENTS_BASE_URL, RAW_DATA_DIR, PLATFORM, CSS_URL, BACKOFF_FACTOR, REQUEST_TIMEOUT, MAX_RETRIES, PERIOD_END, PERIOD_START, MAX_WORKERS  
+from config.settings import SGX_COMPANY_API_URL, SGX_RESULTS_COUNT_API_URL, COMPANY_LIST_URL, ATTACHMENTS_BASE_URL, RAW_DATA_DIR, PLATFORM, CSS_URL, BACKOFF_FACTOR, REQUEST_TIMEOUT, MAX_RETRIES, PERIOD_END, PERIOD_START, MAX_WORKERS
+# Parsing helpers live in html_parsing_utils (importable by worker processes without MongoDB)
+from utils.html_parsing_utils import get_attachments_url_list, _get_attachments_url_list_full_parse, _HTML_PARSER
 import utils.db_utils as db_utils
 from bs4 import BeautifulSoup
 
@@ -132,79 +134,86 @@ def get_web_page(url: str) -> Optional[str]:
        raise e
 
 def store_web_page(html_content: str, path: str) -> None:
-    """Store the fetched web page content into a local file."""
+    """Store the fetched web page content in the raw store (local folder or S3, see utils.storage).
+
+    `path` is the logical page path; with PAGE_COMPRESSION the object gets a .gz/.zst suffix.
+    """
+    from utils.storage import submit_write
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as file:
-            file.write(html_content)
-        #print(f"Web page content saved to {path}")
+        # Written by the file writer pool; the manifest records the page only once it is stored
+        submit_write(_write_web_page, html_content, path)
     except Exception as e:
         print(f"Error saving web page content: {e}")
 
-def get_attachments_url_list(html_content: Optional[str]) -> Optional[list]:
-    """Fetch attachment URLs from the provided HTML content and return them in the desired format."""
+def _write_web_page(html_content: str, path: str) -> None:
     try:
-        if not html_content:
-            print("No HTML content provided to extract the attachment URL.")
-            raise Exception("HTML content is required")
-
-        # Parse the HTML content
-        soup = BeautifulSoup(html_content, "html.parser")
-        attachment_list = soup.find("dl", class_="announcement-attachment-list")
-
-        if not attachment_list:
-            #print("No attachment list found in the HTML content.")
-            return None
-
-        attachment_links = attachment_list.find_all("a", href=True)
-        attachments = []
-
-        for link in attachment_links:
-            attachment_url = link["href"]
-            # Skip links that use JavaScript popups or are not direct file links
-            if "JavaScript:window.open" in link.get("onClick", "") or attachment_url.startswith("#") or "#" in attachment_url:
-                continue
-            # Check if the URL is relative and prepend the base URL if necessary
-            if attachment_url.startswith("/"):
-                attachment_url = f"{ATTACHMENTS_BASE_URL}{attachment_url}"
+        from utils.page_compression import write_page
+        from utils.manifest import get_manifest
+        write_page(path, html_content)
+        manifest = get_manifest()
+        if manifest is not None:
+            manifest.record_bytes(path, html_content.encode("utf-8"))
+        #print(f"Web page content saved to {path}")
+    except Exception as e:
+        print(f"Error saving web page content: {e}")
 
-            # Format the URL to match the desired format
-            formatted_url = attachment_url.replace("/FileOpen/", "").replace("?App=Announcement&FileID=", "_")
-            attachments.append(formatted_url)
+def check_attachment_parity(root_dir: str = RAW_DATA_DIR, limit: int = 0) -> dict:
+    """Compare the fast extractor with the full parse over stored `wp.html` pages.
 
-        if not attachments:
-            #print("No attachment links found in the HTML content.")
-            return None
-
-        # Check if the HTML content contains the specific string
-        if "if you are unable to view the above file, please click the link below" in html_content:
-            if len(attachments) == 2:
-                attachments.pop(0)
-        #print(f"Attachment URLs extracted: {len(attachments)}")
-        
-        ### DEBUGGING OUTPUT
-        #for url in attachments:
-        #    print(f"Attachment URL: {url}")
-        ###
-        
-        return attachments
-    
-    except requests.exceptions.RequestException as req_err:
-        print(f"HTTP request error: {req_err}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return None
+    Returns a summary dict {checked, mismatches, fast_seconds, full_seconds}; mismatching
+    paths are printed. `limit` > 0 stops after that many pages.
+    """
+    import time
+    checked = 0
+    mismatches = []
+    fast_seconds = 0.0
+    full_seconds = 0.0
+    from utils.page_compression import iter_pages, read_page
+    for path in iter_pages(root_dir):
+        if os.path.basename(path) != "wp.html":
+            continue
+        html = read_page(path)
+
+        t0 = time.perf_counter()
+        fast = get_attachments_url_list(html)
+        t1 = time.perf_counter()
+        full = _get_attachments_url_list_full_parse(html)
+        t2 = time.perf_counter()
+        fast_seconds += t1 - t0
+        full_seconds += t2 - t1
+
+        checked += 1
+        if fast != full:
+            mismatches.append(path)
+            print(f"Attachment parity mismatch: {path}\n  fast={fast}\n  full={full}")
+        if limit and checked >= limit:
+            break
+
+    print(f"Attachment parity: {checked} pages checked, {len(mismatches)} mismatches "
+          f"(fast {fast_seconds:.2f}s vs full parse {full_seconds:.2f}s, parser={_HTML_PARSER}).")
+    return {"checked": checked, "mismatches": mismatches, "fast_seconds": fast_seconds, "full_seconds": full_seconds}
 
 @retry(stop=stop_after_attempt(MAX_RETRIES), wait=wait_exponential(multiplier=BACKOFF_FACTOR, min=1, max=REQUEST_TIMEOUT), reraise=True)
-def download_attachment(attachment_url: str, save_path: str) -> None:
-    """Download an attachment from a URL and save it to a file with retries."""
+def download_attachment(attachment_url: str, save_path: str, force: bool = False) -> None:
+    """Download an attachment from a URL into the raw store with retries.
+
+    The body is streamed from the response to the storage backend (file or S3
+    multipart upload) instead of being loaded in memory first. Attachments the
+    manifest already records are not downloaded again unless `force` is set.
+    """
+    from utils.storage import get_storage
+    from utils.manifest import HashingReader, already_stored, get_manifest
+    if not force and already_stored(save_path):
+        return
     try:
-        response = requests.get(attachment_url, headers=get_headers(), timeout=10)
-        response.raise_for_status()
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "wb") as file:
-            file.write(response.content)
+        with requests.get(attachment_url, headers=get_headers(), timeout=10, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # undo gzip/deflate transfer encoding like response.content does
+            body = HashingReader(response.raw)
+            get_storage().write_stream(save_path, body, response.headers.get("Content-Type"))
+        manifest = get_manifest()
+        if manifest is not None:
+            manifest.record(save_path, body.size, body.sha256.hexdigest())
     except requests.exceptions.RequestException as e:
         print(f"Error downloading attachment: {e}")
         from utils.http_requests_utils import fetch_sgx_token
@@ -222,6 +231,11 @@ def get_document_metadata(document: dict) -> dict:
         "filing_date": document.get("submission_date", ""),
         "url": document.get("url", ""), 
         "platform": PLATFORM,
+        # Issuer identifiers, used to join SGX tickers to companies without fuzzy matching
+        "issuers": [
+            {key: issuer.get(key) for key in ("isin_code", "stock_code", "ibm_code")}
+            for issuer in (document.get("issuers") or []) if isinstance(issuer, dict)
+        ],
     }
     return metadata
 
@@ -233,10 +247,9 @@ def store_metadata_debug(metadata: dict, folder_path: str) -> None:
             if isinstance(value, datetime):
                 metadata[key] = value.isoformat()
 
-        os.makedirs(folder_path, exist_ok=True)
         metadata_path = os.path.join(folder_path, "metadata.json")
-        with open(metadata_path, "w", encoding="utf-8") as file:
-            _json.dump(metadata, file, indent=4)
+        from utils.storage import get_storage, submit_write
+        submit_write(get_storage().write_text, metadata_path, _json.dumps(metadata, indent=4))
         #print(f"Metadata saved to {metadata_path}")
     except Exception as e:
         print(f"Error saving metadata: {e}")
@@ -374,12 +387,9 @@ def download_and_store_css(css_url: str = CSS_URL) -> Optional[str]:
         relative_path = os.path.join("SGX", "_layouts", "1033", "styles", css_filename)
         full_path = os.path.join(RAW_DATA_DIR, relative_path)
 
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-
-        # Save the CSS content to the file
-        with open(full_path, "w", encoding="utf-8") as file:
-            file.write(css_content)
+        # Save the CSS content in the raw store
+        from utils.storage import get_storage
+        get_storage().write_text(full_path, css_content)
 
         print(f"CSS file saved to {full_path}")
         return relative_path
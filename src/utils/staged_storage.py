@@ -0,0 +1,278 @@
+"""Staged storage: write locally, upload to S3 in the background, evict after upload.
+
+With STORAGE_MODE=staged the download threads write to a local staging folder
+(LOCAL_STAGING_DIR, same layout as the bucket) and go back to the network. A
+small uploader pool sends each staged file to the S3 backend; once the remote
+object is confirmed (same size), the local copy is deleted.
+
+LOCAL_DISK_BUDGET_MB caps the bytes in staging: a writer blocks before
+staging a new file while the budget is used up, so a backfill slows its
+downloads down to the upload rate instead of filling the disk. (The budget
+can be exceeded by at most one file per writer thread, as sizes are only
+known once a download is complete.) Bytes are released when they leave the
+disk: a file whose upload failed keeps its share, and writers fail instead of
+waiting when only such files fill the budget.
+
+At start-up, files left in staging by an interrupted run are evicted when the
+remote copy is confirmed and queued for upload otherwise.
+`flush()` waits until everything staged so far is uploaded.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+UPLOAD_RETRIES = 5
+
+
+class DiskBudget:
+    """Bytes staged locally and not evicted yet; `reserve` blocks while the budget is used up."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.blocked_seconds = 0.0
+        self._cond = threading.Condition()
+
+    def reserve(self, can_free: Callable[[], bool] = lambda: True) -> None:
+        """Wait for room; `can_free()` False means nothing in flight will release bytes."""
+        if self.max_bytes <= 0:
+            return
+        with self._cond:
+            if self.used < self.max_bytes:
+                return
+            start = time.perf_counter()
+            try:
+                while self.used >= self.max_bytes:
+                    if not can_free():
+                        raise IOError(f"Staging disk budget ({self.max_bytes} bytes) is used by files "
+                                      f"that failed to upload")
+                    self._cond.wait(timeout=1.0)
+            finally:
+                self.blocked_seconds += time.perf_counter() - start
+
+    def add(self, size: int) -> None:
+        with self._cond:
+            self.used += size
+
+    def release(self, size: int) -> None:
+        with self._cond:
+            self.used = max(0, self.used - size)
+            self._cond.notify_all()
+
+
+class StagedStorage:
+    """Local staging folder in front of a remote backend, with background upload and eviction."""
+
+    scheme = "staged"
+
+    def __init__(self, local, remote, remote_root: str, staging_dir: str, upload_workers: int = 4,
+                 max_local_mb: int = 2048):
+        self.local = local
+        self.remote = remote
+        self.remote_root = remote_root.rstrip("/")
+        self.staging_dir = os.path.abspath(staging_dir)
+        self.budget = DiskBudget(max_local_mb * 1024 * 1024)
+        self.stats = {"staged": 0, "uploaded": 0, "evicted": 0, "failed": 0, "uploaded_bytes": 0, "recovered": 0}
+        self._stats_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[str, int]]]" = queue.Queue()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._threads = [threading.Thread(target=self._upload_loop, name=f"uploader-{i}", daemon=True)
+                         for i in range(max(1, upload_workers))]
+        for thread in self._threads:
+            thread.start()
+        self._recover()
+
+    # Path mapping: remote path <-> staging path
+    def _staging_path(self, path: str) -> str:
+        path = path.replace("\\", "/")
+        root = self.remote_root.replace("s3://", "s3:/")
+        for prefix in (self.remote_root, root):
+            if path.startswith(prefix + "/"):
+                return os.path.join(self.staging_dir, *path[len(prefix) + 1:].split("/"))
+        return os.path.join(self.staging_dir, *path.lstrip("/").split("/"))
+
+    def _remote_path(self, staging_path: str) -> str:
+        relative = os.path.relpath(staging_path, self.staging_dir).replace("\\", "/")
+        return f"{self.remote_root}/{relative}"
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _recover(self) -> None:
+        """Evict files a previous run left in staging once uploaded; queue the others."""
+        if not os.path.isdir(self.staging_dir):
+            return
+        confirmed = 0
+        for dirpath, _, filenames in os.walk(self.staging_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(".part"):
+                    os.remove(path)  # Interrupted download: fetched again by the pipeline
+                    continue
+                size = os.path.getsize(path)
+                if self._remote_size(self._remote_path(path)) == size:
+                    os.remove(path)  # Uploaded, but the run stopped before evicting it
+                    confirmed += 1
+                    continue
+                self.budget.add(size)
+                self._enqueue(path, size)
+                self._count("recovered")
+        if self.stats["recovered"] or confirmed:
+            print(f"Staged storage: {confirmed} files left by a previous run were already uploaded, "
+                  f"{self.stats['recovered']} re-queued.")
+
+    def _remote_size(self, remote_path: str) -> Optional[int]:
+        try:
+            return self.remote.size(remote_path)
+        except FileNotFoundError:
+            return None
+
+    def _enqueue(self, staging_path: str, size: int) -> None:
+        with self._pending_cond:
+            self._pending += 1
+        self._queue.put((staging_path, size))
+
+    def _upload_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            left_disk = False
+            try:
+                left_disk = self._upload(*item)
+            finally:
+                if left_disk:
+                    self.budget.release(item[1])
+                with self._pending_cond:
+                    self._pending -= 1
+                    self._pending_cond.notify_all()
+
+    def _upload(self, staging_path: str, size: int) -> bool:
+        """Upload and evict one staged file; False when it failed and stays on disk."""
+        remote_path = self._remote_path(staging_path)
+        for attempt in range(1, UPLOAD_RETRIES + 1):
+            try:
+                before = os.stat(staging_path)
+                with open(staging_path, "rb") as fh:
+                    self.remote.write_stream(remote_path, fh)
+                if self.remote.size(remote_path) != before.st_size:
+                    raise IOError(f"size mismatch after upload of {remote_path}")
+                break
+            except FileNotFoundError:
+                return True  # Deleted, or uploaded and evicted through a later write of the same path
+            except Exception as e:
+                if attempt == UPLOAD_RETRIES:
+                    # Stays in staging (and in the budget): uploaded by the next run's recovery
+                    print(f"Upload of {remote_path} failed after {attempt} attempts: {e}")
+                    self._count("failed")
+                    return False
+                time.sleep(min(30, 2 ** attempt))
+        self._count("uploaded")
+        self._count("uploaded_bytes", before.st_size)
+        try:
+            after = os.stat(staging_path)
+            # Evict only the version that was uploaded: a rewrite meanwhile is uploaded by its own queue item
+            if (after.st_ino, after.st_size, after.st_mtime_ns) == (before.st_ino, before.st_size, before.st_mtime_ns):
+                os.remove(staging_path)
+                self._count("evicted")
+        except FileNotFoundError:
+            pass
+        # Either evicted, or replaced by a rewrite that holds its own share of the budget
+        return True
+
+    def _can_free(self) -> bool:
+        """True while uploads in flight may release budget (not only failed files fill it)."""
+        with self._pending_cond:
+            return self._pending > 0
+
+    # Storage interface
+    def write_stream(self, path: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        self.budget.reserve(self._can_free)  # Backpressure on the download threads
+        staging_path = self._staging_path(path)
+        size = self.local.write_stream(staging_path, stream, content_type)
+        self.budget.add(size)
+        self._count("staged")
+        self._enqueue(staging_path, size)
+        return size
+
+    def write_bytes(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        import io
+        self.write_stream(path, io.BytesIO(data), content_type)
+
+    def write_text(self, path: str, text: str) -> None:
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def read_bytes(self, path: str) -> bytes:
+        try:
+            return self.local.read_bytes(self._staging_path(path))
+        except FileNotFoundError:
+            return self.remote.read_bytes(path)
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def exists(self, path: str) -> bool:
+        return self.local.exists(self._staging_path(path)) or self.remote.exists(path)
+
+    def delete(self, path: str) -> None:
+        self.local.delete(self._staging_path(path))
+        self.remote.delete(path)
+
+    def size(self, path: str) -> int:
+        try:
+            return self.local.size(self._staging_path(path))
+        except FileNotFoundError:
+            return self.remote.size(path)
+
+    def modified(self, path: str) -> float:
+        try:
+            return self.local.modified(self._staging_path(path))
+        except FileNotFoundError:
+            return self.remote.modified(path)
+
+    def delete_many(self, paths) -> int:
+        paths = list(paths)
+        self.local.delete_many([self._staging_path(path) for path in paths])
+        return self.remote.delete_many(paths)
+
+    def list_files(self, prefix: str) -> Iterator[str]:
+        for path, _ in self.list_sizes(prefix):
+            yield path
+
+    def list_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(path, size) of the uploaded objects and of the files still waiting in staging."""
+        seen = set()
+        for path, size in self.remote.list_sizes(prefix):
+            seen.add(path)
+            yield path, size
+        for staging_path, size in self.local.list_sizes(self._staging_path(prefix)):
+            if staging_path.endswith(".part"):
+                continue
+            path = self._remote_path(staging_path)
+            if path not in seen:
+                yield path, size
+
+    def list_folders(self, prefix: str):
+        folders = set(self.remote.list_folders(prefix))
+        folders.update(self._remote_path(path) for path in self.local.list_folders(self._staging_path(prefix)))
+        return sorted(folders)
+
+    def flush(self) -> None:
+        """Block until every file staged so far has been uploaded (or has failed)."""
+        with self._pending_cond:
+            while self._pending:
+                self._pending_cond.wait(timeout=1.0)
+        print(f"Staged storage: {self.stats}, local bytes waiting {self.budget.used}, "
+              f"downloads blocked {self.budget.blocked_seconds:.1f}s by the disk budget")
+
+    def close(self) -> None:
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
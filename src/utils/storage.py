@@ -0,0 +1,434 @@
+"""Raw storage backends: local filesystem or an S3-compatible bucket.
+
+Every writer of the raw store (announcement pages, attachments, corporate
+information pages, CSS) goes through `get_storage()` with the same paths it
+used before: `os.path.join(RAW_DATA_DIR, ...)`. With S3 enabled RAW_DATA_DIR is
+`s3://{bucket}/{base path}` and the S3 backend maps such paths to object keys,
+so the relative `file_path` stored in MongoDB is the same in both modes.
+STORAGE_MODE=staged puts a local staging folder with background uploads in
+front of the S3 backend (utils/staged_storage.py). Pages are written by a
+dedicated writer pool (`submit_write`, utils/file_writer.py).
+
+The S3 backend shares one thread-safe boto3 client across the download
+threads. Objects are uploaded with boto3's managed transfer: bodies above
+S3_MULTIPART_THRESHOLD_MB go as multipart uploads with S3_MAX_CONCURRENCY
+parts in flight, and attachments are streamed from the HTTP response into
+the upload without being held in memory. S3_ENDPOINT_URL points it at MinIO
+or another S3-compatible server (see the minio service in docker-compose.yml).
+
+boto3 is only imported when the S3 backend is used.
+"""
+
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
+import atexit
+import io
+import os
+import shutil
+import threading
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+STREAM_CHUNK_SIZE = 1024 * 1024  # Bytes copied per read when streaming to a local file
+S3_DELETE_BATCH = 1000  # Keys per DeleteObjects request (the S3 maximum)
+
+
+class LocalStorage:
+    """Raw store on the local (or mounted) filesystem."""
+
+    scheme = "file"
+
+    def _open_new(self, path: str):
+        from utils.file_writer import ensure_directory, forget_directories
+        directory = os.path.dirname(path)
+        ensure_directory(directory)
+        try:
+            return open(path, "wb")
+        except FileNotFoundError:
+            forget_directories(directory)  # Deleted since it was cached (raw_gc, reset)
+            ensure_directory(directory)
+            return open(path, "wb")
+
+    def write_bytes(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        with self._open_new(path) as fh:
+            fh.write(data)
+
+    def write_text(self, path: str, text: str) -> None:
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def write_stream(self, path: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Copy a readable binary stream to `path`; returns the bytes written.
+
+        The data goes to a temporary file renamed at the end, so an interrupted
+        download never leaves a truncated file under the final name.
+        """
+        tmp_path = f"{path}.part"
+        try:
+            with self._open_new(tmp_path) as fh:
+                shutil.copyfileobj(stream, fh, STREAM_CHUNK_SIZE)
+                size = fh.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def read_bytes(self, path: str) -> bytes:
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def exists(self, path: str) -> bool:
+        return os.path.isfile(path)
+
+    def size(self, path: str) -> int:
+        return os.path.getsize(path)
+
+    def modified(self, path: str) -> float:
+        """Unix time the object was last written."""
+        return os.path.getmtime(path)
+
+    def delete(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_many(self, paths: Iterable[str]) -> int:
+        """Delete several paths; returns how many existed."""
+        deleted = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def list_files(self, prefix: str) -> Iterator[str]:
+        """Paths of every file under the `prefix` folder."""
+        for dirpath, _, filenames in os.walk(prefix):
+            for name in filenames:
+                yield os.path.join(dirpath, name)
+
+    def list_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(path, size) of every file under the `prefix` folder."""
+        for path in self.list_files(prefix):
+            try:
+                yield path, os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+
+    def list_folders(self, prefix: str) -> List[str]:
+        """Direct subfolders of `prefix`."""
+        try:
+            with os.scandir(prefix) as entries:
+                return [entry.path for entry in entries if entry.is_dir()]
+        except FileNotFoundError:
+            return []
+
+
+class S3Storage:
+    """Raw store in an S3-compatible bucket; paths are `s3://bucket/key` or keys in the default bucket."""
+
+    scheme = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 multipart_threshold_mb: int = 8, multipart_chunksize_mb: int = 8,
+                 max_concurrency: int = 8, max_pool_connections: int = 50):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        if not bucket:
+            raise ValueError("S3 storage needs S3_BUCKET_NAME")
+        self.bucket = bucket
+        # boto3 clients are thread-safe: one client (and connection pool) for every download thread
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            config=Config(max_pool_connections=max_pool_connections, retries={"max_attempts": 5, "mode": "adaptive"}),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold_mb * 1024 * 1024,
+            multipart_chunksize=multipart_chunksize_mb * 1024 * 1024,
+            max_concurrency=max_concurrency,
+            use_threads=True,
+        )
+
+    def _split(self, path: str) -> Tuple[str, str]:
+        path = path.replace("\\", "/")
+        if path.startswith("s3:/"):
+            # os.path functions collapse "s3://" to "s3:/"
+            bucket, _, key = path[len("s3:/"):].lstrip("/").partition("/")
+            return bucket, key
+        return self.bucket, path.lstrip("/")
+
+    def _is_missing(self, error) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def write_bytes(self, path: str, data: bytes, content_type: Optional[str] = None) -> None:
+        self.write_stream(path, io.BytesIO(data), content_type)
+
+    def write_text(self, path: str, text: str) -> None:
+        self.write_bytes(path, text.encode("utf-8"), "text/html; charset=utf-8" if path.endswith(".html") else None)
+
+    def write_stream(self, path: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Upload a readable binary stream; multipart and concurrent above the threshold. Returns the bytes sent."""
+        bucket, key = self._split(path)
+        counter = _CountingReader(stream)
+        extra_args = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(counter, bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        return counter.count
+
+    def read_bytes(self, path: str) -> bytes:
+        from botocore.exceptions import ClientError
+        bucket, key = self._split(path)
+        try:
+            return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(path) from e
+            raise
+
+    def read_text(self, path: str) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def exists(self, path: str) -> bool:
+        from botocore.exceptions import ClientError
+        bucket, key = self._split(path)
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    def size(self, path: str) -> int:
+        from botocore.exceptions import ClientError
+        bucket, key = self._split(path)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(path) from e
+            raise
+
+    def modified(self, path: str) -> float:
+        from botocore.exceptions import ClientError
+        bucket, key = self._split(path)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["LastModified"].timestamp()
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(path) from e
+            raise
+
+    def delete(self, path: str) -> None:
+        bucket, key = self._split(path)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def delete_many(self, paths: Iterable[str]) -> int:
+        """Delete several objects with one DeleteObjects request per S3_DELETE_BATCH keys; returns how many were deleted."""
+        keys_by_bucket = {}
+        for path in paths:
+            bucket, key = self._split(path)
+            keys_by_bucket.setdefault(bucket, []).append(key)
+        deleted = 0
+        for bucket, keys in keys_by_bucket.items():
+            for start in range(0, len(keys), S3_DELETE_BATCH):
+                chunk = keys[start:start + S3_DELETE_BATCH]
+                response = self.client.delete_objects(
+                    Bucket=bucket, Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True})
+                errors = response.get("Errors", [])
+                for error in errors[:5]:
+                    print(f"Failed to delete s3://{bucket}/{error.get('Key')}: {error.get('Message')}")
+                deleted += len(chunk) - len(errors)
+        return deleted
+
+    def list_files(self, prefix: str) -> Iterator[str]:
+        for path, _ in self.list_sizes(prefix):
+            yield path
+
+    def list_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """(path, size) of every object under `prefix`, from the listing itself (no request per object)."""
+        bucket, key = self._split(prefix)
+        key = key.rstrip("/") + "/" if key else ""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=key):
+            for obj in page.get("Contents", []):
+                yield f"s3://{bucket}/{obj['Key']}", obj["Size"]
+
+    def list_folders(self, prefix: str) -> List[str]:
+        """Direct "subfolders" (common prefixes) of `prefix`."""
+        bucket, key = self._split(prefix)
+        key = key.rstrip("/") + "/" if key else ""
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [f"s3://{bucket}/{common['Prefix'].rstrip('/')}"
+                for page in paginator.paginate(Bucket=bucket, Prefix=key, Delimiter="/")
+                for common in page.get("CommonPrefixes", [])]
+
+
+class _CountingReader(io.RawIOBase):
+    """Non-seekable reader over a stream that counts the bytes read (boto3 then uploads it part by part)."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size) if size is not None and size >= 0 else self._stream.read()
+        self.count += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def storage_mode() -> str:
+    """"staged" when STORAGE_MODE=staged, "s3" when STORAGE_MODE=s3 or S3_ENABLED, otherwise "local"."""
+    from config.settings import STORAGE_MODE, S3_ENABLED
+    mode = (STORAGE_MODE or "").lower()
+    if mode == "staged":
+        return "staged"
+    return "s3" if mode == "s3" or S3_ENABLED else "local"
+
+
+def get_storage():
+    """Shared storage backend for the configured mode (created on first use, in each process)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                mode = storage_mode()
+                if mode in ("s3", "staged"):
+                    from config.settings import (S3_BUCKET_NAME, S3_ENDPOINT_URL, S3_REGION, S3_MULTIPART_THRESHOLD_MB,
+                                                 S3_MULTIPART_CHUNKSIZE_MB, S3_MAX_CONCURRENCY, S3_MAX_POOL_CONNECTIONS)
+                    _storage = S3Storage(S3_BUCKET_NAME, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION,
+                                         multipart_threshold_mb=S3_MULTIPART_THRESHOLD_MB,
+                                         multipart_chunksize_mb=S3_MULTIPART_CHUNKSIZE_MB,
+                                         max_concurrency=S3_MAX_CONCURRENCY,
+                                         max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+                    if mode == "staged":
+                        from config.settings import RAW_DATA_DIR, LOCAL_STAGING_DIR, UPLOAD_WORKERS, LOCAL_DISK_BUDGET_MB
+                        from utils.staged_storage import StagedStorage
+                        _storage = StagedStorage(LocalStorage(), _storage, RAW_DATA_DIR, LOCAL_STAGING_DIR,
+                                                 upload_workers=UPLOAD_WORKERS, max_local_mb=LOCAL_DISK_BUDGET_MB)
+                else:
+                    _storage = LocalStorage()
+                from config.settings import STORAGE_LAYOUT
+                if STORAGE_LAYOUT.lower() == "packed":
+                    if not isinstance(_storage, LocalStorage):
+                        raise ValueError("STORAGE_LAYOUT=packed needs the local storage backend")
+                    from config.settings import RAW_DATA_DIR, PACKED_SEGMENT_MAX_MB
+                    from utils.packed_storage import PackedStorage
+                    _storage = PackedStorage(_storage, RAW_DATA_DIR, segment_max_mb=PACKED_SEGMENT_MAX_MB)
+    return _storage
+
+
+_file_writer = None
+_file_writer_lock = threading.Lock()
+
+
+def get_file_writer():
+    """Shared writer pool for raw-store writes (started on first use)."""
+    global _file_writer
+    if _file_writer is None:
+        with _file_writer_lock:
+            if _file_writer is None:
+                from config.settings import FILE_WRITE_WORKERS, FILE_WRITE_QUEUE_SIZE
+                from utils.file_writer import FileWriteExecutor
+                _file_writer = FileWriteExecutor(workers=FILE_WRITE_WORKERS, max_pending=FILE_WRITE_QUEUE_SIZE)
+    return _file_writer
+
+
+def submit_write(fn, *args) -> None:
+    """Run a raw-store write in the writer pool; synchronously when FILE_WRITE_WORKERS is 0."""
+    from config.settings import FILE_WRITE_WORKERS
+    if FILE_WRITE_WORKERS <= 0:
+        fn(*args)
+        return
+    get_file_writer().submit(fn, *args)
+
+
+def close_file_writes(timeout: Optional[float] = None) -> None:
+    """Finish queued writes and stop the writer pool."""
+    global _file_writer
+    if _file_writer is not None:
+        _file_writer.close(timeout=timeout)
+        _file_writer = None
+
+
+atexit.register(close_file_writes)
+
+
+def flush_storage() -> None:
+    """Barrier: wait for queued writes, then for background uploads (staged mode)."""
+    if _file_writer is not None:
+        _file_writer.flush()
+    if _storage is not None and hasattr(_storage, "flush"):
+        _storage.flush()
+
+
+def close_storage() -> None:
+    """Finish queued writes and stop the background uploaders (staged mode) at shutdown."""
+    close_file_writes()
+    if _storage is not None and hasattr(_storage, "close"):
+        _storage.close()
+
+
+def check_storage(prefix: Optional[str] = None, size_mb: int = 20) -> dict:
+    """Round trip against the configured backend: small text, a streamed multipart-sized body, list, delete.
+
+    Run it against MinIO (docker compose up minio) with STORAGE_MODE=s3 and S3_ENDPOINT_URL=http://localhost:9000.
+    """
+    import time
+    from config.settings import RAW_DATA_DIR
+
+    storage = get_storage()
+    prefix = prefix or os.path.join(RAW_DATA_DIR, "_storage_check")
+    text_path = os.path.join(prefix, "page", "wp.html")
+    blob_path = os.path.join(prefix, "page", "attachment.bin")
+    blob = os.urandom(1024 * 1024) * size_mb
+
+    storage.write_text(text_path, "<html>storage check</html>")
+    start = time.perf_counter()
+    written = storage.write_stream(blob_path, io.BytesIO(blob), "application/octet-stream")
+    flush_storage()  # Staged mode: upload before checking the remote copies
+    seconds = time.perf_counter() - start
+    listed = sorted(storage.list_files(prefix))
+    result = {
+        "backend": type(storage).__name__,
+        "text_ok": storage.read_text(text_path) == "<html>storage check</html>",
+        "stream_ok": written == len(blob) and storage.read_bytes(blob_path) == blob,
+        "listed": len(listed),
+        "upload_mb_per_second": round(len(blob) / (1024 * 1024) / seconds, 1) if seconds else None,
+    }
+    for path in listed:
+        storage.delete(path)
+    result["deleted_ok"] = not storage.exists(text_path) and not storage.exists(blob_path)
+    if storage.scheme in ("file", "packed"):
+        shutil.rmtree(prefix, ignore_errors=True)
+    print(f"Storage check: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    check_storage()
@@ -1,71 +1,104 @@
+from pathlib import Path
+import sys
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+SRC_PATH = ROOT_PATH / "src"
+sys.path.append(str(ROOT_PATH))
+sys.path.append(str(SRC_PATH))
+
 from cleanco import basename 
 from thefuzz import fuzz
+from functools import lru_cache
+from typing import NamedTuple, Tuple
 import re
-import nltk
-nltk.download('punkt')
-nltk.download('brown')
-nltk.download('stopwords')
-nltk.download('punkt_tab')
-from nltk.tokenize import word_tokenize 
-from nltk.corpus import stopwords 
+from config.settings import STRING_MATCHING_TOKENIZER, NAME_CACHE_SIZE
+from utils.name_tokenizer import get_stop_words, get_tokenizer
+
+
+class NormalizedName(NamedTuple):
+    """A company name normalized once for matching.
+
+    key           -> cleaned tokens without stopwords, joined (the fuzzy comparison key)
+    tokens        -> the cleaned tokens themselves
+    metric_tokens -> lowercased tokens of the basename, used for token-count lookups
+    """
+    raw: str
+    key: str
+    tokens: Tuple[str, ...]
+    metric_tokens: Tuple[str, ...]
+
+
+def word_tokenize(text: str):
+    # Regex port of nltk's word tokenizer by default; nltk itself is only loaded with STRING_MATCHING_TOKENIZER=nltk
+    return get_tokenizer(STRING_MATCHING_TOKENIZER)(text)
+
+
+def _get_stop_words() -> frozenset:
+    return get_stop_words(STRING_MATCHING_TOKENIZER)
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(name: str, official: bool = False, clean: bool = True) -> NormalizedName:
+    """Normalize a company name (memoized). `official` applies the official-name rules (drop "/..." suffix).
+
+    `clean` applies the matching clean-up ("&" and "'s" removed); the standalone
+    entity metric works on the name as given (clean=False).
+    """
+    cleaned = (name or "").replace("&", "").replace("'s", "").strip() if clean else (name or "")
+    if official:
+        cleaned = cleaned.split("/")[0]
+    base = basename(basename(cleaned))
+    transformed = re.sub(r'[^\w\s]', " ", base.lower())
+    stop_words = _get_stop_words()
+    tokens = tuple(token for token in word_tokenize(transformed) if token not in stop_words)
+    metric_tokens = tuple(token.lower() for token in word_tokenize(base))
+    return NormalizedName(name, "".join(tokens), tokens, metric_tokens)
+
+
+def count_metric(normalized: NormalizedName, count_dict) -> list:
+    """Token frequencies (from `count_dict`) of a normalized name's metric tokens."""
+    return [count_dict.get(token, 0) for token in normalized.metric_tokens]
+
+
+def count_score(normalized: NormalizedName, count_dict, SINGLE_TOKEN_THRESHOLD) -> int:
+    """100 if the name has a rare token (count below the threshold), 0 otherwise."""
+    count_lst = count_metric(normalized, count_dict)
+    if len(count_lst) == 1:
+        return 100 if count_lst[0] < SINGLE_TOKEN_THRESHOLD else 0
+    for count in count_lst:
+        if count < SINGLE_TOKEN_THRESHOLD:
+            return 100
+    return 0
 
 
 # GET VALIDITIY OF SCRAPED ENTITY
 # IF VALID  = 1, then can insert into public private collections; and if the official name already dont exist
 def get_entity_metric(entity_name, count_dict):
-    processed_entity_name = basename(basename(entity_name))
-    tokenized_entity_name_lst_ = word_tokenize(processed_entity_name)
-    tokenized_entity_name_lst = [token.lower() for token in tokenized_entity_name_lst_]
-    count_lst = []
-    for token in tokenized_entity_name_lst:
-        if token in count_dict.keys():
-            count_lst.append(count_dict[token])
-        else:
-            count_lst.append(0)
-    return count_lst
+    return count_metric(normalize_name(entity_name, clean=False), count_dict)
 
 def get_entity_count_scores(entity_name, count_dict, SINGLE_TOKEN_THRESHOLD):
-    count_lst = get_entity_metric(entity_name, count_dict)
-    if len(count_lst) == 1:
-        if count_lst[0] < SINGLE_TOKEN_THRESHOLD:
-            return 100
-        else:
-            return 0
-    else:
-        for count in count_lst:
-            if count < SINGLE_TOKEN_THRESHOLD:
-                return 100
-    return 0
+    return count_score(normalize_name(entity_name, clean=False), count_dict, SINGLE_TOKEN_THRESHOLD)
 
-def get_label_and_confidence(entity_name, official_name, count_dict, SINGLE_TOKEN_THRESHOLD):
-    entity_name = entity_name.replace("&", "").replace("'s", "").strip()
-    official_name = official_name.replace("&", "").replace("'s", "").strip()
-    # print("ENTITY NAME: ", entity_name)
-    # print("OFFICIAL NAME: ", official_name)
-    official_name = official_name.split("/")[0]
-    stop_words = set(stopwords.words('english'))
-    entity_name_transformed = basename(basename(entity_name)).lower()
-    official_name_transformed = basename(basename(official_name)).lower()
-    entity_name_transformed = re.sub(r'[^\w\s]', " ", entity_name_transformed)
-    official_name_transformed = re.sub(r'[^\w\s]', " ", official_name_transformed)
-    # print(entity_name_transformed,"->",official_name_transformed)
-    entity_name_transformed_tokens = word_tokenize(entity_name_transformed)
-    official_name_transformed_tokens = word_tokenize(official_name_transformed)
-    entity_name_transformed_tokens = [token for token in entity_name_transformed_tokens if token not in stop_words]
-    official_name_transformed_tokens = [token for token in official_name_transformed_tokens if token not in stop_words]
-    entity_name_transformed_tokens = "".join(entity_name_transformed_tokens)
-    official_name_transformed_tokens = "".join(official_name_transformed_tokens)
-    if entity_name_transformed_tokens == official_name_transformed_tokens:
+def get_label_and_confidence_normalized(entity: NormalizedName, official: NormalizedName, count_dict, SINGLE_TOKEN_THRESHOLD):
+    """Same as get_label_and_confidence, on names already passed through normalize_name."""
+    if entity.key == official.key:
         return 1, 100
-    confidence_score = fuzz.partial_ratio(entity_name_transformed_tokens, official_name_transformed_tokens)
+    confidence_score = fuzz.partial_ratio(entity.key, official.key)
     if confidence_score != 100:
         return 0, confidence_score
-    count_score = get_entity_count_scores(entity_name, count_dict, SINGLE_TOKEN_THRESHOLD)
-    if count_score == 0:
+    if count_score(entity, count_dict, SINGLE_TOKEN_THRESHOLD) == 0:
         return 0, confidence_score * 0.5
     else:
         return 1, 100
 
+def get_label_and_confidence(entity_name, official_name, count_dict, SINGLE_TOKEN_THRESHOLD):
+    # Names are normalized once and memoized: repeated calls with the same names are cheap
+    return get_label_and_confidence_normalized(
+        normalize_name(entity_name),
+        normalize_name(official_name, official=True),
+        count_dict,
+        SINGLE_TOKEN_THRESHOLD,
+    )
+
 
 def _demo_examples():
     """Small demo runner used when executing this module as a script.
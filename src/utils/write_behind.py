@@ -0,0 +1,224 @@
+"""Background write-behind channel for company status/metadata updates.
+
+Worker threads enqueue per-company updates instead of issuing one blocking
+``update_one`` per collection. A background thread coalesces updates that
+target the same (collection, company_id) and flushes them as ``bulk_write``
+batches when the batch size or the flush interval is reached. ``flush()`` is a
+barrier: it returns once everything enqueued before the call has been written,
+and False when some of it could not be: a bulk that fails (connection loss,
+failover) is retried ``max_retries`` times before its updates are dropped.
+"""
+
+import copy
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+def _merge_set(target: dict, new_fields: dict) -> None:
+    """Merge ``$set`` fields, keeping dotted paths consistent with their parents.
+
+    Mongo rejects an update that sets both ``metadata`` and ``metadata.code``,
+    so a later whole-subdocument set replaces pending dotted keys and a later
+    dotted key is folded into a pending whole-subdocument value. A dotted key
+    under a pending non-document value (``metadata: None``) is dropped: applied
+    in order, Mongo could not create the field inside it either.
+    """
+    for key, value in new_fields.items():
+        # Drop pending children of the key being replaced (e.g. metadata.code when setting metadata)
+        for pending_key in [k for k in target if k.startswith(key + ".")]:
+            del target[pending_key]
+
+        parts = key.split(".")
+        parent = next((".".join(parts[:i]) for i in range(1, len(parts)) if ".".join(parts[:i]) in target), None)
+        if parent is None:
+            target[key] = value
+            continue
+        if not isinstance(target[parent], dict):
+            continue
+        # Copy before folding so the caller's subdocument is never mutated
+        node = target[parent] = copy.deepcopy(target[parent])
+        child = parts[parent.count(".") + 1:]
+        for part in child[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        node[child[-1]] = value
+
+
+def merge_updates(current: dict, new: dict) -> dict:
+    """Coalesce two Mongo update documents for the same target document."""
+    for op, fields in new.items():
+        if op == "$set":
+            _merge_set(current.setdefault("$set", {}), fields)
+        elif op == "$inc":
+            pending = current.setdefault("$inc", {})
+            for key, value in fields.items():
+                pending[key] = pending.get(key, 0) + value
+        else:
+            current.setdefault(op, {}).update(fields)
+    return current
+
+
+class WriteBehindWriter:
+    """Coalescing, batching background writer for company documents."""
+
+    def __init__(self,
+                 get_db: Callable,
+                 batch_size: int = 100,
+                 flush_interval: float = 2.0,
+                 key_field: str = "company_id",
+                 max_retries: int = 3):
+        self._get_db = get_db
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.key_field = key_field
+        self.max_retries = max(0, int(max_retries))
+
+        # (collection_name, company_id) -> merged update document, in arrival order
+        self._pending: Dict[Tuple[str, object], dict] = {}
+        self._cond = threading.Condition()
+        self._enqueued_seq = 0
+        self._written_seq = 0
+        self._flush_requested = False
+        self._closed = False
+        # (first, last) enqueue sequence numbers of the batches that dropped updates, until every
+        # thread that flushes has flushed past them
+        self._failures: List[Tuple[int, int]] = []
+        self.dropped = 0
+        self._flushed: "weakref.WeakKeyDictionary[threading.Thread, int]" = weakref.WeakKeyDictionary()
+        self._acknowledged_seq = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, collection_name: str, company_id, update: dict) -> None:
+        """Queue an update document (``{"$set": {...}}``) for one company."""
+        if not update:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-behind writer is closed")
+            key = (collection_name, company_id)
+            if key in self._pending:
+                merge_updates(self._pending[key], update)
+            else:
+                self._pending[key] = merge_updates({}, update)
+            self._enqueued_seq += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every update enqueued before this call is written.
+
+        Returns False on timeout, or when updates enqueued since this thread's
+        previous flush (for a first flush: since every flushing thread's last
+        flush) were dropped after their retries.
+        """
+        with self._cond:
+            target_seq = self._enqueued_seq
+            thread = threading.current_thread()
+            since = self._flushed.get(thread, self._acknowledged_seq)
+            if self._written_seq < target_seq:
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._written_seq >= target_seq or not self._thread.is_alive(),
+                                    timeout=timeout)
+                if self._written_seq < target_seq:
+                    return False
+            failed = any(last > since and first <= target_seq for first, last in self._failures)
+            self._flushed[thread] = target_seq
+            # Ranges every flushing thread has passed cannot be reported again
+            floor = min(self._flushed.values())
+            if floor > self._acknowledged_seq:
+                self._acknowledged_seq = floor
+                self._failures = [(first, last) for first, last in self._failures if last > floor]
+            return not failed
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush pending updates and stop the background thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        batch_start = 1
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._cond:
+                while (not self._closed and not self._flush_requested
+                       and len(self._pending) < self.batch_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                batch = self._pending
+                self._pending = {}
+                batch_seq = self._enqueued_seq
+                self._flush_requested = False
+                closing = self._closed
+
+            dropped = self._write_batch(batch) if batch else 0
+
+            with self._cond:
+                if dropped:
+                    self.dropped += dropped
+                    if self._failures and self._failures[-1][1] + 1 == batch_start:
+                        self._failures[-1] = (self._failures[-1][0], batch_seq)  # Same outage: one range
+                    else:
+                        self._failures.append((batch_start, batch_seq))
+                self._written_seq = batch_seq
+                batch_start = batch_seq + 1
+                self._cond.notify_all()
+            deadline = time.monotonic() + self.flush_interval
+
+            if closing:
+                with self._cond:
+                    if not self._pending:
+                        return
+
+    def _write_batch(self, batch: Dict[Tuple[str, object], dict]) -> int:
+        """Write one batch, retrying failed bulks; returns the number of updates dropped."""
+        by_collection: Dict[str, list] = {}
+        for (collection_name, company_id), update in batch.items():
+            by_collection.setdefault(collection_name, []).append(UpdateOne({self.key_field: company_id}, update))
+
+        def _write(item):
+            collection_name, ops = item
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = self._get_db()[collection_name].bulk_write(ops, ordered=False)
+                    missing = len(ops) - result.matched_count
+                    if missing > 0:
+                        print(f"Write-behind: {missing}/{len(ops)} companies not found in {collection_name}.")
+                    return 0
+                except BulkWriteError as bwe:
+                    # Rejected updates (the others were applied): a retry would be rejected again
+                    errors = bwe.details.get("writeErrors", []) or []
+                    print(f"Write-behind: {len(errors)} write errors in {collection_name}: "
+                          f"{errors[0].get('errmsg') if errors else bwe}")
+                    return len(errors)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        print(f"Write-behind: dropping {len(ops)} updates to {collection_name} "
+                              f"after {attempt + 1} attempts: {e}")
+                        return len(ops)
+                    print(f"Write-behind: error writing {len(ops)} updates to {collection_name}, retrying: {e}")
+                    time.sleep(min(2 ** attempt, 30))
+
+        # One bulk per collection; queue, UAT and PROD bulks are sent in parallel
+        if len(by_collection) == 1:
+            return _write(next(iter(by_collection.items())))
+        with ThreadPoolExecutor(max_workers=len(by_collection)) as executor:
+            return sum(executor.map(_write, by_collection.items()))